@@ -1,4 +1,13 @@
+from array import array
+from collections import namedtuple
+import hashlib
+import json
 import logging
+import math
+import os
+import struct
+import sys
+import tempfile
 
 from django.contrib.gis.geos import GEOSGeometry
 from django.utils.translation import ugettext as _
@@ -9,9 +18,52 @@ from django.db import connection
 import pygal
 from pygal.style import LightSolarizedStyle
 
+from .sampler import get_sampler
+
+try:
+    import cairosvg
+except ImportError:
+    cairosvg = None
+
 
 logger = logging.getLogger(__name__)
 
+# Settings changing the aspect of elevation charts
+CHART_SETTINGS = ('BACKGROUND', 'COLOR', 'HEIGHT', 'WIDTH', 'FONTSIZE', 'FONT', 'MIN_YSCALE', 'POINTS')
+
+# Struct formats of raster pixel types (see PostGIS raster WKB format)
+RASTER_PIXEL_TYPES = {0: 'B', 1: 'B', 2: 'B', 3: 'b', 4: 'B', 5: 'h', 6: 'H',
+                      7: 'i', 8: 'I', 10: 'f', 11: 'd'}
+
+
+def render_chart(svg, path):
+    """Converts SVG chart to PNG file in-process (requires CairoSVG). File is
+    renamed once written, so that concurrent renderings do not conflict.
+    Defined at module-level, to be run in a process pool.
+    """
+    folder, name = os.path.split(path)
+    output = tempfile.NamedTemporaryFile(dir=folder, prefix=name, delete=False)
+    with output:
+        cairosvg.svg2png(bytestring=svg, write_to=output)
+    os.rename(output.name, path)
+
+
+class RasterBand(namedtuple('RasterBand', ['scalex', 'scaley', 'upperleftx', 'upperlefty',
+                                           'width', 'height', 'nodata', 'values'])):
+    __slots__ = ()
+
+    def value(self, x, y):
+        """Elevation of the pixel at given coordinates, None if no data.
+        """
+        column = int(math.floor((x - self.upperleftx) / self.scalex))
+        row = int(math.floor((y - self.upperlefty) / self.scaley))
+        if not (0 <= column < self.width and 0 <= row < self.height):
+            return None
+        value = self.values[row * self.width + column]
+        if value == self.nodata:
+            return None
+        return int(round(value))
+
 
 class AltimetryHelper(object):
     @classmethod
@@ -26,9 +78,9 @@ class AltimetryHelper(object):
             profile = []
             for subcoords in geometry3d.coords:
                 subline = LineString(subcoords, srid=geometry3d.srid)
-                offset += subline.length
                 subprofile = AltimetryHelper.elevation_profile(subline, precision, offset)
                 profile.extend(subprofile)
+                offset += subline.length
             return profile
 
         # Add measure to 2D version of geometry3d
@@ -48,6 +100,33 @@ class AltimetryHelper(object):
         dxyz = [pointsm[i] + v for i, v in enumerate(geom3dapi.coords)]
         return dxyz
 
+    @classmethod
+    def simplify_profile(cls, profile, points):
+        """Downsample profile to the given number of steps, keeping its shape.
+
+        Uses Largest-Triangle-Three-Buckets on distance and elevation: each
+        bucket keeps the step forming the largest triangle with the step kept
+        in previous bucket and the average of next bucket.
+        """
+        points = max(points, 3)
+        if len(profile) <= points:
+            return profile
+        every = float(len(profile) - 2) / (points - 2)
+        sampled = [profile[0]]
+        previous = profile[0]
+        for i in range(points - 2):
+            start = int(i * every) + 1
+            end = int((i + 1) * every) + 1
+            next_bucket = profile[end:min(int((i + 2) * every) + 1, len(profile))]
+            avg_d = sum(step[0] for step in next_bucket) / len(next_bucket)
+            avg_z = sum(step[3] for step in next_bucket) / len(next_bucket)
+            d, z = previous[0], previous[3]
+            previous = max(profile[start:end],
+                           key=lambda step: abs((d - avg_d) * (step[3] - z) - (d - step[0]) * (avg_z - z)))
+            sampled.append(previous)
+        sampled.append(profile[-1])
+        return sampled
+
     @classmethod
     def altimetry_limits(cls, profile):
         elevations = [int(v[3]) for v in profile]
@@ -97,6 +176,14 @@ class AltimetryHelper(object):
         line_chart.add('', [(int(v[0]), int(v[3])) for v in profile])
         return line_chart.render()
 
+    @classmethod
+    def profile_chart_hash(cls, version, language):
+        """Identifies the chart of a profile, from its ``version`` (any values
+        changing along with the profile) and the settings it is drawn with.
+        """
+        chart_settings = [getattr(settings, 'ALTIMETRIC_PROFILE_%s' % name) for name in CHART_SETTINGS]
+        return hashlib.sha1(json.dumps([version, language, chart_settings])).hexdigest()
+
     @classmethod
     def _nice_extent(cls, geom):
         xmin, ymin, xmax, ymax = geom.extent
@@ -119,6 +206,24 @@ class AltimetryHelper(object):
                                   int(ycenter + height / 2.0))
         return (xmin, ymin, xmax, ymax)
 
+    @classmethod
+    def _raster_band(cls, wkb):
+        """Parse first band of a raster in WKB format.
+        """
+        endian = '<' if ord(wkb[0]) == 1 else '>'
+        header = struct.unpack_from(endian + 'HHddddddiHH', wkb, 1)
+        scalex, scaley, upperleftx, upperlefty = header[2:6]
+        width, height = header[9:11]
+        offset = 61  # Header size
+        bandtype = ord(wkb[offset])
+        pixeltype = RASTER_PIXEL_TYPES[bandtype & 0x0F]
+        nodata = None
+        if bandtype & 0x40:
+            nodata = struct.unpack_from(endian + pixeltype, wkb, offset + 1)[0]
+        offset += 1 + struct.calcsize(pixeltype)
+        values = struct.unpack_from('%s%d%s' % (endian, width * height, pixeltype), wkb, offset)
+        return RasterBand(scalex, scaley, upperleftx, upperlefty, width, height, nodata, values)
+
     @classmethod
     def elevation_area(cls, geom):
         xmin, ymin, xmax, ymax = cls._nice_extent(geom)
@@ -130,75 +235,69 @@ class AltimetryHelper(object):
             precision = int(width / max_resolution)
         if height / precision > 10000:
             precision = int(width / max_resolution)
+        sampler = get_sampler()
         cursor = connection.cursor()
-        cursor.execute("SELECT 1 FROM information_schema.tables WHERE table_name='mnt'")
-        if cursor.rowcount == 0:
-            logger.warn("No DEM present")
-            return {}
+        if sampler is None:
+            cursor.execute("SELECT 1 FROM information_schema.tables WHERE table_name='mnt'")
+            if cursor.rowcount == 0:
+                logger.warn("No DEM present")
+                return {}
+
+        resolution_w = len(xrange(xmin, xmax + 1, precision))
+        resolution_h = len(xrange(ymin, ymax + 1, precision))
+        # Grid of sampled points (last ones may not reach extent)
+        xmax = xmin + (resolution_w - 1) * precision
+        ymax = ymin + (resolution_h - 1) * precision
 
+        if sampler is not None:
+            cursor.execute("SELECT geom, ST_Transform(geom, 4326) FROM "
+                           "(SELECT ST_MakeEnvelope(%s, %s, %s, %s, %s) AS geom) AS extent",
+                           [xmin, ymin, xmax, ymax, settings.SRID])
+            envelop_native, envelop = cursor.fetchone()
+            elevations = sampler.sample_grid(xmin, ymin, precision, resolution_w, resolution_h)
+            return cls._elevation_area(envelop_native, envelop, elevations,
+                                       resolution_w, resolution_h, precision)
+
+        # Clip DEM tiles, merge them and resample them in one north-up raster,
+        # whose pixels are centered on the sampled points, and fetch it at once.
         sql = """
-            -- Author: Celian Garcia
-            WITH columns AS (
-                    SELECT generate_series({xmin}::int, {xmax}::int, {precision}) AS x
-                ),
-                lines AS (
-                    SELECT generate_series({ymin}::int, {ymax}::int, {precision}) AS y
-                ),
-                resolution AS (
-                    SELECT x, y
-                    FROM (SELECT COUNT(x) AS x FROM columns) AS col,
-                         (SELECT COUNT(y) AS y FROM lines)   AS lin
-                ),
-                points2d AS (
-                    SELECT row_number() OVER () AS id,
-                           ST_SetSRID(ST_MakePoint(x, y), {srid}) AS geom,
-                           ST_Transform(ST_SetSRID(ST_MakePoint(x, y), {srid}), 4326) AS geomll
-                    FROM lines, columns
-                ),
-                draped AS (
-                    SELECT id, ST_Value(mnt.rast, p.geom)::int AS altitude
-                    FROM mnt, points2d AS p
-                    WHERE ST_Intersects(mnt.rast, p.geom)
-                ),
-                all_draped AS (
-                    SELECT geomll, geom, altitude
-                    FROM points2d LEFT JOIN draped ON (points2d.id = draped.id)
-                    ORDER BY points2d.id
-                ),
-                extent_latlng AS (
-                    SELECT ST_Envelope(ST_Union(geom)) AS extent,
-                           MIN(altitude) AS min_z,
-                           MAX(altitude) AS max_z,
-                           AVG(altitude) AS center_z
-                    FROM all_draped
-                )
-            SELECT extent,
-                   ST_transform(extent, 4326),
-                   center_z,
-                   min_z,
-                   max_z,
-                   resolution.x AS resolution_w,
-                   resolution.y AS resolution_h,
-                   altitude
-            FROM extent_latlng, resolution, all_draped;
-        """.format(xmin=xmin, ymin=ymin, xmax=xmax, ymax=ymax,
-                   srid=settings.SRID, precision=precision)
+            WITH extent AS (
+                SELECT ST_MakeEnvelope({xmin}, {ymin}, {xmax}, {ymax}, {srid}) AS geom
+            )
+            SELECT extent.geom,
+                   ST_Transform(extent.geom, 4326),
+                   ST_AsBinary(ST_Resample(ST_Union(ST_Clip(mnt.rast, ST_Expand(extent.geom, {precision}))),
+                                           {precision}, -{precision}, {gridx}, {gridy}, 0, 0,
+                                           'NearestNeighbour'))
+            FROM extent LEFT JOIN mnt ON ST_Intersects(mnt.rast, extent.geom)
+            GROUP BY extent.geom;
+        """.format(xmin=xmin, ymin=ymin, xmax=xmax, ymax=ymax, srid=settings.SRID,
+                   precision=precision, gridx=xmin - precision / 2.0, gridy=ymin - precision / 2.0)
         cursor.execute(sql)
-        result = cursor.fetchall()
-        first = result[0]
-        envelop_native, envelop, center_z, min_z, max_z, resolution_w, resolution_h, a = first
+        envelop_native, envelop, raster = cursor.fetchone()
+        elevations = []
+        if raster is not None:
+            band = cls._raster_band(str(raster))
+            for y in xrange(ymin, ymax + 1, precision):
+                elevations.extend([band.value(x, y) for x in xrange(xmin, xmax + 1, precision)])
+        else:
+            elevations = [None] * (resolution_w * resolution_h)
+        return cls._elevation_area(envelop_native, envelop, elevations,
+                                   resolution_w, resolution_h, precision)
+
+    @classmethod
+    def _elevation_area(cls, envelop_native, envelop, elevations, resolution_w, resolution_h, precision):
         envelop = GEOSGeometry(envelop, srid=4326)
         envelop_native = GEOSGeometry(envelop_native, srid=settings.SRID)
 
+        known = [elevation for elevation in elevations if elevation is not None] or [0]
+        min_z, max_z = min(known), max(known)
+        center_z = float(sum(known)) / len(known)
+
         altitudes = []
-        row = []
-        for i, record in enumerate(result):
-            if i > 0 and i % resolution_w == 0:
-                altitudes.append(row)
-                row = []
-            elevation = (record[7] or 0.0) - min_z
-            row.append(elevation)
-        altitudes.append(row)
+        for j in range(resolution_h):
+            row = elevations[j * resolution_w:(j + 1) * resolution_w]
+            altitudes.append([(elevation or 0.0) - min_z for elevation in row])
 
         area = {
             'center': {
@@ -244,3 +343,16 @@ class AltimetryHelper(object):
             'altitudes': altitudes
         }
         return area
+
+    @classmethod
+    def elevation_area_grid(cls, area):
+        """Pack altitudes of area (see ``elevation_area()``), as a header of
+        width and height (unsigned shorts), followed by altitudes relative to
+        minimum (signed shorts), row by row from south-west, little-endian.
+        """
+        if not area:
+            return ''
+        altitudes = array('h', [int(altitude) for row in area['altitudes'] for altitude in row])
+        if sys.byteorder == 'big':
+            altitudes.byteswap()
+        return struct.pack('<HH', area['resolution']['x'], area['resolution']['y']) + altitudes.tostring()
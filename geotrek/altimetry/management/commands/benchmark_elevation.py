@@ -0,0 +1,362 @@
+import time
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+
+# Former implementation of elevation functions (arrays built in loops),
+# created as temporary functions for comparison.
+LEGACY_SQL = """
+CREATE OR REPLACE FUNCTION pg_temp.legacy_ft_smooth_line(
+    linegeom geometry,
+    step integer)
+  RETURNS SETOF geometry AS $$
+-- function moving average on altitude lines with specified step
+
+DECLARE
+
+    points geometry[];
+    points_output geometry[];
+    current_values float;
+    count_values integer;
+    val geometry;
+    element geometry;
+
+BEGIN
+    IF step <= 0
+    THEN
+        RETURN QUERY SELECT * FROM geotrek.ft_smooth_line(linegeom);
+    END IF;
+
+    FOR element in SELECT (ST_DumpPoints(linegeom)).geom LOOP
+        points := array_append(points, element);
+    END LOOP;
+
+    FOR i IN 0 .. array_length(points, 1) LOOP
+
+        current_values := 0.0;
+        count_values := 0;
+
+        FOREACH val in ARRAY points[i-step:i+step] LOOP
+            -- val is null when out of array
+            IF val IS NOT NULL
+            THEN
+                count_values := count_values + 1;
+                current_values := current_values + ST_Z(val);
+            END IF;
+        END LOOP;
+
+        points_output := array_append(points_output, ST_MAKEPOINT(ST_X(points[i]), ST_Y(points[i]), (current_values / count_values)::integer));
+
+
+    END LOOP;
+
+    RETURN QUERY SELECT (ST_DumpPoints(ST_SetSRID(ST_MakeLine(points_output), ST_SRID(linegeom)))).geom as geom;
+
+END;
+
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION pg_temp.legacy_ft_drape_line(linegeom geometry, step integer)
+    RETURNS SETOF geometry AS $$
+DECLARE
+    points geometry[];
+result geometry[];
+BEGIN
+    -- Use sampling steps for draping geometry on DEM
+    -- http://blog.mathieu-leplatre.info/drape-lines-on-a-dem-with-postgis.html
+    -- But make sure to keep original points so 2D geometry and length is preserved
+    -- Step is the maximal distance between two points
+
+    IF ST_ZMin(linegeom) < 0 OR ST_ZMax(linegeom) > 0 THEN
+        -- Already 3D, do not need to drape.
+        -- (Use-case is when assembling paths geometries to build topologies)
+        RETURN QUERY SELECT (ST_DumpPoints(ST_Force_3D(linegeom))).geom AS geom;
+
+    ELSE
+        RETURN QUERY
+            WITH -- Get endings of each segment of the line
+                 r1 AS (SELECT ST_PointN(linegeom, generate_series(1, ST_NPoints(linegeom)-1)) as p1,
+                               ST_PointN(linegeom, generate_series(2, ST_NPoints(linegeom))) as p2,
+                               generate_series(2, ST_NPoints(linegeom)) = ST_NPoints(linegeom) as is_last),
+                 -- Get the number of sub-segments
+                 r2 AS (SELECT p1, p2, is_last, trunc(ST_Distance(p1, p2) / step)::integer + 1 AS n FROM r1),
+                 -- Get relative positions of new points along the segment (without last point, except for last segment)
+                 r3 AS (SELECT p1, p2, generate_series(0, CASE WHEN is_last THEN n ELSE n - 1 END)/n::double precision AS f FROM r2),
+                 -- Create new points
+                 r4 AS (SELECT ST_MakePoint(ST_X(p1) + (ST_X(p2) - ST_X(p1)) * f,
+                                            ST_Y(p1) + (ST_Y(p2) - ST_Y(p1)) * f) as p,
+                               ST_SRID(p1) AS srid FROM r3),
+                 -- Set SRID of new points
+                 r5 AS (SELECT ST_SetSRID(p, srid) as p FROM r4)
+            SELECT add_point_elevation(p) FROM r5;
+
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION pg_temp.legacy_ft_elevation_infos(geom geometry) RETURNS elevation_infos AS $$
+DECLARE
+    num_points integer;
+    current geometry;
+    points3d geometry[];
+    ele integer;
+    last_ele integer;
+    last_last_ele integer;
+    result elevation_infos;
+BEGIN
+    -- Skip if no DEM (speed-up tests)
+    PERFORM * FROM raster_columns WHERE r_table_name = 'mnt';
+    IF NOT FOUND THEN
+        SELECT ST_Force_3DZ(geom), 0.0, 0, 0, 0, 0 INTO result;
+        RETURN result;
+    END IF;
+
+    -- Ensure parameter is a point or a line
+    IF ST_GeometryType(geom) NOT IN ('ST_Point', 'ST_LineString') THEN
+        SELECT ST_Force_3DZ(geom), 0.0, 0, 0, 0, 0 INTO result;
+        RETURN result;
+    END IF;
+
+    -- Specific case for points
+    IF ST_GeometryType(geom) = 'ST_Point' THEN
+        current := add_point_elevation(geom);
+        SELECT current, 0.0, ST_Z(current), ST_Z(current), 0, 0 INTO result;
+        RETURN result;
+    END IF;
+
+    -- Now geom is LineString only.
+
+    -- Compute gain and elevation using (higher resolution)
+    result.positive_gain := 0;
+    result.negative_gain := 0;
+    last_ele := NULL;
+    last_last_ele := NULL;
+    points3d := ARRAY[]::geometry[];
+
+    FOR current IN SELECT * FROM pg_temp.legacy_ft_drape_line(geom, {precision}) LOOP
+        -- Smooth the elevation profile
+        ele := ST_Z(current);
+        -- Create the 3d points
+        points3d := array_append(points3d, current);
+        -- Add positive only if ele - last_ele > 0
+        result.positive_gain := result.positive_gain + greatest(ele - coalesce(last_ele, ele), 0);
+        -- Add negative only if ele - last_ele < 0
+        result.negative_gain := result.negative_gain + least(ele - coalesce(last_ele, ele), 0);
+        last_ele := ele;
+        last_last_ele := last_ele;
+    END LOOP;
+    result.draped := ST_SetSRID(ST_MakeLine(points3d), ST_SRID(geom));
+
+    result.min_elevation := ST_ZMin(result.draped)::integer;
+    result.max_elevation := ST_ZMax(result.draped)::integer;
+
+    -- Compute slope
+    result.slope := 0.0;
+    IF ST_Length2D(geom) > 0 THEN
+        result.slope := (result.max_elevation - result.min_elevation) / ST_Length2D(geom);
+    END IF;
+
+    RETURN result;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION pg_temp.legacy_ft_elevation_infos(geom geometry, epsilon float) RETURNS elevation_infos AS $$
+DECLARE
+    num_points integer;
+    current geometry;
+    points3d geometry[];
+    points3d_smoothed geometry[];
+    points3d_simplified geometry[];
+    result elevation_infos;
+    previous_geom geometry;
+BEGIN
+    -- Skip if no DEM (speed-up tests)
+    PERFORM * FROM raster_columns WHERE r_table_name = 'mnt';
+    IF NOT FOUND THEN
+        SELECT ST_Force_3DZ(geom), 0.0, 0, 0, 0, 0 INTO result;
+        RETURN result;
+    END IF;
+
+    -- Ensure parameter is a point or a line
+    IF ST_GeometryType(geom) NOT IN ('ST_Point', 'ST_LineString') THEN
+        SELECT ST_Force_3DZ(geom), 0.0, 0, 0, 0, 0 INTO result;
+        RETURN result;
+    END IF;
+
+    -- Specific case for points
+    IF ST_GeometryType(geom) = 'ST_Point' THEN
+        current := add_point_elevation(geom);
+        SELECT current, 0.0, ST_Z(current), ST_Z(current), 0, 0 INTO result;
+        RETURN result;
+    END IF;
+
+    -- Case of epsilon <= 0:
+    IF epsilon <= 0
+    THEN
+        SELECT * FROM pg_temp.legacy_ft_elevation_infos(geom) INTO result;
+        RETURN result;
+    END IF;
+
+    -- Now geom is LineString only.
+
+
+    result.positive_gain := 0;
+    result.negative_gain := 0;
+    points3d := ARRAY[]::geometry[];
+    points3d_smoothed := ARRAY[]::geometry[];
+    points3d_simplified := ARRAY[]::geometry[];
+
+    FOR current IN SELECT * FROM pg_temp.legacy_ft_drape_line(geom, {precision}) LOOP
+        -- Create the 3d points
+        points3d := array_append(points3d, current);
+    END LOOP;
+
+    -- smoothing line
+    FOR current IN SELECT * FROM pg_temp.legacy_ft_smooth_line(St_MakeLine(points3d), {average}) LOOP
+        -- Create the 3d points
+        points3d_smoothed := array_append(points3d_smoothed, current);
+    END LOOP;
+
+    -- simplify gain calculs
+
+    previous_geom := NULL;
+
+    -- Compute gain using simplification
+    -- see http://www.postgis.org/docs/ST_Simplify.html
+    FOR current IN SELECT (ST_DUMPPOINTS(ST_SIMPLIFYPRESERVETOPOLOGY(ST_MAKELINE(points3d_smoothed), epsilon))).geom
+    LOOP
+        -- Add positive only if current - previous_geom > 0
+    result.positive_gain := result.positive_gain + greatest(ST_Z(current) - coalesce(ST_Z(previous_geom),
+                                ST_Z(current)), 0);
+    -- Add negative only if current - previous_geom < 0
+    result.negative_gain := result.negative_gain + least(ST_Z(current) - coalesce(ST_Z(previous_geom),
+                                 ST_Z(current)), 0);
+    previous_geom := current;
+    END LOOP;
+
+    result.draped := ST_SetSRID(ST_MakeLine(points3d_smoothed), ST_SRID(geom));
+
+    -- Compute elevation using (higher resolution)
+    result.min_elevation := ST_ZMin(result.draped)::integer;
+    result.max_elevation := ST_ZMax(result.draped)::integer;
+
+
+    -- Compute slope
+    result.slope := 0.0;
+
+    IF ST_Length2D(geom) > 0 THEN
+        result.slope := (result.max_elevation - result.min_elevation) / ST_Length2D(geom);
+    END IF;
+
+    RETURN result;
+END;
+
+$$ LANGUAGE plpgsql;
+"""
+
+# Synthetic DEM: tiles of 100x100 pixels of 25m, with hills and valleys, and
+# a band without data in each tile
+DEM_SQL = """
+CREATE TEMPORARY TABLE mnt (rid serial PRIMARY KEY, rast raster);
+INSERT INTO mnt (rast)
+SELECT ST_MapAlgebraExpr(ST_AddBand(ST_MakeEmptyRaster(100, 100, %(x0)s + i * 2500, %(y0)s - j * 2500,
+                                                       25, -25, 0, 0, %(srid)s), '16BSI'),
+                         '16BSI',
+                         'CASE WHEN [rast.x] BETWEEN 60 AND 62 THEN NULL'
+                         ' ELSE 1000 + 300 * sin(([rast.x] + ' || i * 100 || ') / 40.0)'
+                         ' + 200 * cos(([rast.y] + ' || j * 100 || ') / 25.0) END',
+                         -9999)
+FROM generate_series(0, %(tiles)s - 1) AS i, generate_series(0, %(tiles)s - 1) AS j;
+CREATE INDEX ON mnt USING gist (ST_ConvexHull(rast));
+CREATE TEMPORARY TABLE benchmark_lines (size integer, geom geometry);
+"""
+
+# Sinusoidal line across the DEM, with given number of vertices
+LINE_SQL = """
+INSERT INTO benchmark_lines (size, geom)
+SELECT %(size)s, ST_SetSRID(ST_MakeLine(ST_MakePoint(%(x0)s + 100 + (%(width)s - 200.0) * k / (%(size)s - 1),
+                                                     %(y0)s - %(width)s / 2.0 + %(width)s / 3.0 * sin(k * 62.83 / (%(size)s - 1)))
+                                        ORDER BY k), %(srid)s)
+FROM generate_series(0, %(size)s - 1) AS k;
+"""
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ("Compare speed and results of elevation functions with their former "
+            "implementation, on a synthetic DEM and synthetic lines. Nothing is kept in database.")
+
+    option_list = BaseCommand.option_list + (
+        make_option('--sizes', dest='sizes', default='100,1000,10000,100000',
+                    help='Numbers of vertices of synthetic lines, comma-separated'),
+        make_option('--repeat', dest='repeat', type='int', default=3,
+                    help='Number of runs per line (best one is kept)'),
+        make_option('--dem-tiles', dest='dem_tiles', type='int', default=5,
+                    help='Width of synthetic DEM, in tiles of 2500m'),
+    )
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        if min(sizes) < 2:
+            raise CommandError("Lines have at least 2 vertices")
+        repeat = options['repeat']
+        params = {
+            'x0': settings.SPATIAL_EXTENT[0],
+            'y0': settings.SPATIAL_EXTENT[3],
+            'srid': settings.SRID,
+            'tiles': options['dem_tiles'],
+            'width': options['dem_tiles'] * 2500,
+        }
+
+        differences = []
+        try:
+            with transaction.atomic():
+                self.compare(sizes, repeat, params, differences)
+                raise Rollback
+        except Rollback:
+            pass
+
+        if differences:
+            raise CommandError("Results differ for lines of %s vertices" % ', '.join(map(str, sorted(set(differences)))))
+
+    def compare(self, sizes, repeat, params, differences):
+        cursor = connection.cursor()
+        cursor.execute(DEM_SQL, params)
+        cursor.execute(LEGACY_SQL.format(precision=settings.ALTIMETRIC_PROFILE_PRECISION,
+                                         average=settings.ALTIMETRIC_PROFILE_AVERAGE))
+        for size in sizes:
+            cursor.execute(LINE_SQL, dict(params, size=size))
+            # Without epsilon (raw gains), and with ALTIMETRIC_PROFILE_STEP (smoothed gains)
+            for epsilon in (None, settings.ALTIMETRIC_PROFILE_STEP):
+                legacy, legacy_time = self.run(cursor, 'pg_temp.legacy_ft_elevation_infos', size, repeat, epsilon)
+                result, result_time = self.run(cursor, 'ft_elevation_infos', size, repeat, epsilon)
+                identical = legacy == result
+                if not identical:
+                    differences.append(size)
+                self.stdout.write('%7d vertices, epsilon %4s: legacy %8.3f s, set-based %8.3f s (x%.1f), %s' % (
+                    size, epsilon, legacy_time, result_time, legacy_time / max(result_time, 0.001),
+                    'identical results' if identical else 'DIFFERENT RESULTS'))
+
+    def run(self, cursor, function, size, repeat, epsilon=None):
+        arguments = 'geom' if epsilon is None else 'geom, %s'
+        sql = """
+            SELECT encode(ST_AsEWKB((infos).draped), 'hex'), (infos).slope,
+                   (infos).min_elevation, (infos).max_elevation,
+                   (infos).positive_gain, (infos).negative_gain
+            FROM (SELECT %s(%s) AS infos FROM benchmark_lines WHERE size = %%s OFFSET 0) AS result
+        """ % (function, arguments)
+        params = [size] if epsilon is None else [epsilon, size]
+        best = None
+        for i in range(repeat):
+            start = time.time()
+            cursor.execute(sql, params)
+            result = cursor.fetchone()
+            duration = time.time() - start
+            best = duration if best is None else min(best, duration)
+        return result, best
@@ -1,12 +1,51 @@
 from django.core.management.base import BaseCommand, CommandError
-from django.db import connection
+from django.db import connection, transaction
 from django.conf import settings
 from optparse import make_option
+from StringIO import StringIO
+import collections
+import itertools
+import multiprocessing
 import os.path
-from subprocess import call
+import re
+from subprocess import call, Popen, PIPE
 import tempfile
 
 
+# Number of tiles copied at once
+TILES_BATCH_SIZE = 50
+# DEM is loaded apart, and replaces the current one once complete
+STAGING_TABLE = 'mnt_new'
+
+
+def raster_tiles(lines):
+    """Yields tiles (hex-encoded) from raster2pgsql output in append mode.
+    """
+    for line in lines:
+        if line.startswith('INSERT INTO'):
+            yield line.split("'")[1]
+
+
+def copy_tiles(tiles, table='mnt'):
+    with transaction.atomic():
+        cursor = connection.cursor()
+        cursor.copy_from(StringIO('\n'.join(tiles) + '\n'), table, columns=('rast',))
+    return len(tiles)
+
+
+def replace_dem_table(table):
+    """Replaces the DEM table (if any) with the given one, in a single
+    transaction: other connections keep reading the former DEM until then.
+    """
+    with transaction.atomic():
+        cursor = connection.cursor()
+        cursor.execute('DROP TABLE IF EXISTS mnt')
+        cursor.execute('ALTER TABLE %s RENAME TO mnt' % table)
+        cursor.execute('ALTER SEQUENCE %s_rid_seq RENAME TO mnt_rid_seq' % table)
+        cursor.execute('ALTER INDEX %s_pkey RENAME TO mnt_pkey' % table)
+        cursor.execute('ALTER INDEX %s_rast_gist RENAME TO mnt_rast_gist' % table)
+
+
 class Command(BaseCommand):
     args = '<dem_path>'
     help = 'Load DEM data (projecting and clipping it if necessary).\n'
@@ -19,9 +58,26 @@ class Command(BaseCommand):
                     action='store_true',
                     default=False,
                     help='Replace existing DEM if any.'),
+        make_option('--export-array',
+                    action='store_true',
+                    default=False,
+                    help='Also export DEM as array for in-process sampling '
+                         '(see ALTIMETRIC_DEM_ARRAY setting, requires NumPy).'),
+        make_option('--tile-size',
+                    default='100x100',
+                    help='Size of raster tiles, in pixels (default: 100x100).'),
+        make_option('--processes', '-p',
+                    type='int',
+                    default=1,
+                    help='Number of processes (and database connections) loading tiles.'),
     )
 
     def handle(self, *args, **options):
+        self.options = options
+        tile_size = options['tile_size']
+        if not re.match(r'^\d+x\d+$', tile_size):
+            raise CommandError('Tile size should be given as WIDTHxHEIGHT (e.g. 100x100).')
+        processes = options['processes'] or 1
 
         try:
             from osgeo import gdal, ogr, osr
@@ -29,6 +85,15 @@ class Command(BaseCommand):
             msg = 'GDAL Python bindings are not available. Can not proceed.'
             raise CommandError(msg)
 
+        if options['export_array']:
+            try:
+                import numpy  # NOQA
+            except ImportError:
+                msg = 'NumPy is not available. Can not export DEM as array.'
+                raise CommandError(msg)
+            if not settings.ALTIMETRIC_DEM_ARRAY:
+                raise CommandError('ALTIMETRIC_DEM_ARRAY setting is not defined.')
+
         try:
             ret = call('raster2pgsql -G', shell=True)
             if ret != 0:
@@ -107,14 +172,8 @@ class Command(BaseCommand):
         # Obtain replace mode
         replace = options['replace']
 
-        # What to do with existing DEM (if any)
-        if dem_exists and replace:
-            # Drop table
-            cur = connection.cursor()
-            sql = 'DROP TABLE mnt'
-            cur.execute(sql)
-            cur.close()
-        elif dem_exists and not replace:
+        # Existing DEM (if any) is replaced only once the new one is loaded
+        if dem_exists and not replace:
             raise CommandError('DEM file exists, use --replace to overwrite')
 
         self.stdout.write('Everything looks fine, we can start loading DEM\n')
@@ -144,30 +203,87 @@ class Command(BaseCommand):
             raise CommandError(msg)
         self.stdout.write('DEM successfully clipped/projected.\n')
 
-        # Step 2: Convert to PostGISRaster format
-        output = tempfile.NamedTemporaryFile()  # SQL code for raster creation
-        cmd = 'raster2pgsql -c -C -I -M -t 100x100 %s mnt' % new_dem.name
+        # Step 1b: export as array for in-process sampling
+        if options['export_array']:
+            from geotrek.altimetry.sampler import export_dem
+            self.stdout.write('\n-- Exporting DEM as array --------------\n')
+            try:
+                export_dem(gdal.Open(new_dem.name), settings.ALTIMETRIC_DEM_ARRAY)
+            except Exception as e:
+                new_dem.close()
+                msg = 'Caught %s: %s' % (e.__class__.__name__, e,)
+                raise CommandError(msg)
+            self.stdout.write('DEM successfully exported to %s.\n' % settings.ALTIMETRIC_DEM_ARRAY)
+
+        # Step 2: Convert to PostGISRaster format, and stream tiles into
+        # database, in a staging table (left over by a failed run if it exists)
+        cur = connection.cursor()
+        cur.execute('DROP TABLE IF EXISTS %s' % STAGING_TABLE)
+        cur.execute('CREATE TABLE %s (rid serial PRIMARY KEY, rast raster)' % STAGING_TABLE)
+        cur.close()
+        cmd = ['raster2pgsql', '-a', '-s', str(settings.SRID), '-t', tile_size, new_dem.name, STAGING_TABLE]
         try:
             self.stdout.write('\n-- Relaying to raster2pgsql ------------\n')
-            self.stdout.write(cmd)
-            ret = call(cmd, stdout=output.file, shell=True)
+            self.stdout.write(' '.join(cmd))
+            self.stdout.write('\n-- Loading DEM into database -----------\n')
+            process = Popen(cmd, stdout=PIPE)
+            count = self.load_tiles(raster_tiles(process.stdout), processes)
+            ret = process.wait()
             if ret != 0:
                 raise Exception('raster2pgsql failed with exit code %d' % ret)
+
+            # Step 3: Index and constraints, once tiles are loaded
+            cur = connection.cursor()
+            cur.execute('CREATE INDEX {0}_rast_gist ON {0} USING gist (ST_ConvexHull(rast))'.format(STAGING_TABLE))
+            cur.execute("SELECT AddRasterConstraints(%s::name, 'rast'::name)", [STAGING_TABLE])
+            cur.execute('ANALYZE %s' % STAGING_TABLE)
+            cur.close()
         except Exception as e:
-            output.close()
+            cur = connection.cursor()
+            cur.execute('DROP TABLE IF EXISTS %s' % STAGING_TABLE)
+            cur.close()
             msg = 'Caught %s: %s' % (e.__class__.__name__, e,)
             raise CommandError(msg)
         finally:
             new_dem.close()
-        self.stdout.write('DEM successfully converted to SQL.\n')
+        self.stdout.write('%d tiles loaded.\n' % count)
 
-        # Step 3: Dump SQL code into database
-        self.stdout.write('\n-- Loading DEM into database -----------\n')
-        cur = connection.cursor()
-        output.file.seek(0)
-        for sql_line in output.file:
-            cur.execute(sql_line)
-        cur.close()
-        output.close()
+        # Step 4: Replace former DEM at once
+        replace_dem_table(STAGING_TABLE)
         self.stdout.write('DEM successfully loaded.\n')
+        if dem_exists:
+            self.stdout.write('Run update_altimetry command to compute elevation of existing objects again.\n')
         return
+
+    def load_tiles(self, tiles, processes):
+        """Copy tiles by batches, in parallel if several processes. A few
+        batches only are pending, so that tiles are not all kept in memory.
+        """
+        verbosity = int(self.options.get('verbosity', 1))
+        batches = iter(lambda: list(itertools.islice(tiles, TILES_BATCH_SIZE)), [])
+        pool = None
+        if processes > 1:
+            # Each process opens its own connection
+            connection.close()
+            pool = multiprocessing.Pool(processes)
+        pending = collections.deque()
+        count = 0
+        try:
+            for batch in batches:
+                if pool:
+                    pending.append(pool.apply_async(copy_tiles, (batch, STAGING_TABLE)))
+                    if len(pending) < 2 * processes:
+                        continue
+                    loaded = pending.popleft().get()
+                else:
+                    loaded = copy_tiles(batch, STAGING_TABLE)
+                count += loaded
+                if verbosity >= 1:
+                    self.stdout.write('%d tiles loaded\n' % count)
+            while pending:
+                count += pending.popleft().get()
+        finally:
+            if pool:
+                pool.terminate()
+                pool.join()
+        return count
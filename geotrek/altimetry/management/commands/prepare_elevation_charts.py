@@ -1,10 +1,14 @@
 import logging
+import multiprocessing
+import os
+from optparse import make_option
 
 from django.conf import settings
 from django.core.urlresolvers import NoReverseMatch
 
 from geotrek.common.management.commands.prepare_map_images import Command as PrepareImageCommand
 
+from geotrek.altimetry.helpers import cairosvg, render_chart
 from geotrek.altimetry.models import AltimetryMixin
 
 
@@ -16,6 +20,11 @@ class Command(PrepareImageCommand):
 
     start_model_msg = "Generate all elevation charts model %s"
 
+    option_list = PrepareImageCommand.option_list + (
+        make_option('--processes', '-p', action='store', dest='processes', type='int',
+                    default=1, help='Number of processes rendering charts (requires CairoSVG)'),
+    )
+
     def get_models(self):
         with_profiles = []
         models = super(Command, self).get_models()
@@ -31,9 +40,31 @@ class Command(PrepareImageCommand):
                 pass
         return with_profiles
 
+    def handle(self, *args, **options):
+        processes = options.get('processes') or 1
+        self.pool = None
+        self.pending = []
+        if processes > 1 and cairosvg is not None:
+            # Charts are built here, only their rendering is spread
+            self.pool = multiprocessing.Pool(processes)
+        try:
+            super(Command, self).handle(*args, **options)
+            for result in self.pending:
+                result.get()
+        finally:
+            if self.pool:
+                self.pool.terminate()
+                self.pool.join()
+
     def handle_instance(self, instance):
         rooturl = self.options.get('url', self.DEFAULT_URL)
         for language, name in settings.MAPENTITY_CONFIG['TRANSLATED_LANGUAGES']:
-            refreshed = instance.prepare_elevation_chart(language, rooturl)
-            if not refreshed:
-                logger.info('%s profile up-to-date.' % instance.get_elevation_chart_path(language))
+            path = instance.get_elevation_chart_path(language)
+            if os.path.exists(path):
+                logger.info('%s profile up-to-date.' % path)
+            elif self.pool:
+                instance.remove_superseded_elevation_charts(language)
+                svg = instance.get_elevation_chart_svg(language)
+                self.pending.append(self.pool.apply_async(render_chart, (svg, path)))
+            else:
+                instance.prepare_elevation_chart(language, rooturl)
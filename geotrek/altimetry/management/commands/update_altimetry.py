@@ -0,0 +1,115 @@
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from geotrek.core.models import Path, Topology
+from geotrek.maintenance.models import Intervention
+
+
+# In order of dependency: topologies are built from 3D geometry of paths,
+# interventions copy altimetry of their topology. Geometries are left
+# untouched, so that the topology triggers cascade is not fired.
+MODELS = [
+    ('path', Path.include_invisible,
+     "SELECT update_altimetry_of_troncons(%s)"),
+    ('topology', Topology.objects.existing(),
+     "SELECT update_altimetry_of_evenement(id) FROM e_t_evenement WHERE id = ANY(%s)"),
+    ('intervention', Intervention.objects.existing(),
+     "UPDATE m_t_intervention SET topology_id = topology_id WHERE id = ANY(%s)"),
+]
+UPDATES = dict((name, sql) for name, queryset, sql in MODELS)
+
+
+def update_chunk(args):
+    name, pks = args
+    with transaction.atomic():
+        cursor = connection.cursor()
+        cursor.execute(UPDATES[name], [pks])
+    return name, pks[0], pks[-1], len(pks)
+
+
+class Command(BaseCommand):
+    help = "Compute again elevation of paths, topologies and interventions (e.g. after DEM was replaced)"
+
+    option_list = BaseCommand.option_list + (
+        make_option('--model', '-m', action='append', dest='models', default=None,
+                    help='Model to compute (%s), all of them by default' % ', '.join(name for name, q, s in MODELS)),
+        make_option('--chunk-size', '-c', action='store', dest='chunk_size', type='int',
+                    default=100, help='Number of objects computed per transaction'),
+        make_option('--processes', '-p', action='store', dest='processes', type='int',
+                    default=1, help='Number of processes (and database connections) computing chunks'),
+        make_option('--state', '-s', action='store', dest='state', default=None,
+                    help='File keeping track of computed chunks: an interrupted run can be resumed with '
+                         'the same file. It is removed once everything is computed.'),
+    )
+
+    def handle(self, *args, **options):
+        names = options.get('models') or [name for name, queryset, sql in MODELS]
+        for name in names:
+            if name not in UPDATES:
+                raise CommandError("Unknown model '%s'" % name)
+        chunk_size = options.get('chunk_size') or 100
+        processes = options.get('processes') or 1
+        self.verbosity = int(options.get('verbosity', 1))
+        self.state_path = options.get('state')
+        self.state = {}
+        if self.state_path and os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                self.state = json.load(f)
+
+        start = time.time()
+        for name, queryset, sql in MODELS:
+            if name not in names:
+                continue
+            done = self.state.setdefault(name, [])
+            pks = [pk for pk in queryset.order_by('pk').values_list('pk', flat=True)
+                   if not any(first <= pk <= last for first, last in done)]
+            chunks = [(name, pks[i:i + chunk_size]) for i in range(0, len(pks), chunk_size)]
+            self.update(name, chunks, processes, len(pks))
+
+        if self.state_path and os.path.exists(self.state_path):
+            os.remove(self.state_path)
+        if self.verbosity >= 1:
+            self.stdout.write('Elevation computed in %.1f s' % (time.time() - start))
+
+    def update(self, name, chunks, processes, total):
+        pool = None
+        if processes > 1 and len(chunks) > 1:
+            # Each process opens its own connection
+            connection.close()
+            pool = multiprocessing.Pool(processes)
+            results = pool.imap_unordered(update_chunk, chunks)
+        else:
+            results = itertools.imap(update_chunk, chunks)
+
+        count = 0
+        try:
+            for name, first, last, chunk_count in results:
+                self.state[name].append([first, last])
+                self.save_state()
+                count += chunk_count
+                if self.verbosity >= 1:
+                    self.stdout.write('%s/%s %ss processed' % (count, total, name))
+        except Exception as e:
+            if pool:
+                pool.terminate()
+            msg = 'Caught %s: %s' % (e.__class__.__name__, e,)
+            if self.state_path:
+                msg += ' (run again with the same state file to resume)'
+            raise CommandError(msg)
+        if pool:
+            pool.close()
+            pool.join()
+
+    def save_state(self):
+        if not self.state_path:
+            return
+        with open(self.state_path + '.tmp', 'w') as f:
+            json.dump(self.state, f)
+        os.rename(self.state_path + '.tmp', self.state_path)
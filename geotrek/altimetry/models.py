@@ -1,12 +1,16 @@
+import glob
 import os
 
 from django.conf import settings
 from django.contrib.gis.db import models
+from django.core.cache import get_cache
+from django.db import connection
+from django.utils import translation
 from django.utils.translation import get_language, ugettext_lazy as _
 from django.template.defaultfilters import floatformat
 
-from mapentity.helpers import is_file_newer, convertit_download, smart_urljoin
-from .helpers import AltimetryHelper
+from mapentity.helpers import convertit_download, smart_urljoin
+from .helpers import AltimetryHelper, cairosvg, render_chart
 
 
 class AltimetryMixin(models.Model):
@@ -49,17 +53,73 @@ class AltimetryMixin(models.Model):
         self.slope = fromdb.slope
         return self
 
-    def get_elevation_profile(self):
-        return AltimetryHelper.elevation_profile(self.geom_3d)
+    @classmethod
+    def elevation_profile_column(cls):
+        """Column of the profile stored at DB-level (triggers), to be used
+        in ``extra(select=...)`` as ``_elevation_profile``.
+        """
+        table = cls._meta.get_field('geom_3d').model._meta.db_table
+        return '%s.profil' % connection.ops.quote_name(table)
+
+    def get_elevation_profile(self, points=None):
+        """Returns (distance, x, y, z) steps, as stored when geom_3d changed.
+        If ``points`` is given, the profile is simplified to this number of
+        steps (and kept in cache until the object is modified).
+        """
+        if points is not None:
+            return self._get_simplified_elevation_profile(points)
+        profile = getattr(self, '_elevation_profile', None)
+        if profile is None and self.pk:
+            model = self._meta.get_field('geom_3d').model
+            cursor = connection.cursor()
+            cursor.execute('SELECT profil FROM %s WHERE %s = %%s' % (
+                connection.ops.quote_name(model._meta.db_table),
+                connection.ops.quote_name(model._meta.pk.column)), [self.pk])
+            row = cursor.fetchone()
+            profile = row[0] if row else None
+        if profile is None:
+            return AltimetryHelper.elevation_profile(self.geom_3d)
+        return [tuple(profile[i:i + 4]) for i in range(0, len(profile), 4)]
+
+    def _get_simplified_elevation_profile(self, points):
+        if not self.pk:
+            return AltimetryHelper.simplify_profile(self.get_elevation_profile(), points)
+        cache = get_cache('default')
+        key = 'altimetry_profile_%s_%s_%s' % (self._meta.model_name, self.pk, points)
+        date_update = getattr(self, 'date_update', None)
+        cached = cache.get(key)
+        if cached and cached[0] == date_update:
+            return cached[1]
+        profile = AltimetryHelper.simplify_profile(self.get_elevation_profile(), points)
+        cache.set(key, (date_update, profile))
+        return profile
 
     def get_elevation_area(self):
-        return AltimetryHelper.elevation_area(self.geom)
+        """Returns DEM around object (kept in cache until the object is modified).
+        """
+        if not self.pk:
+            return AltimetryHelper.elevation_area(self.geom)
+        cache = get_cache('default')
+        key = 'altimetry_area_%s_%s' % (self._meta.model_name, self.pk)
+        date_update = getattr(self, 'date_update', None)
+        cached = cache.get(key)
+        if cached and cached[0] == date_update:
+            return cached[1]
+        area = AltimetryHelper.elevation_area(self.geom)
+        cache.set(key, (date_update, area))
+        return area
+
+    def get_elevation_area_grid(self):
+        """Returns DEM altitudes around object as a packed binary grid.
+        """
+        return AltimetryHelper.elevation_area_grid(self.get_elevation_area())
 
     def get_elevation_limits(self):
         return AltimetryHelper.altimetry_limits(self.get_elevation_profile())
 
     def get_elevation_profile_svg(self):
-        return AltimetryHelper.profile_svg(self.get_elevation_profile())
+        profile = self.get_elevation_profile(points=settings.ALTIMETRIC_PROFILE_POINTS)
+        return AltimetryHelper.profile_svg(profile)
 
     @models.permalink
     def get_elevation_chart_url(self):
@@ -70,22 +130,53 @@ class AltimetryMixin(models.Model):
         model_name = self._meta.model_name
         return ('%s:%s_profile_svg' % (app_label, model_name), [], {'lang': get_language(), 'pk': self.pk})
 
+    def _elevation_chart_prefix(self, language):
+        return '%s-%s-%s-' % (self._meta.model_name, self.pk, language)
+
     def get_elevation_chart_path(self, language):
-        """Path to the PNG version of elevation chart.
+        """Path to the PNG version of elevation chart. It is named after the
+        object, its last update and altimetry, so that unchanged charts are
+        not rendered again.
         """
         basefolder = os.path.join(settings.MEDIA_ROOT, 'profiles')
         if not os.path.exists(basefolder):
             os.mkdir(basefolder)
-        return os.path.join(basefolder, '%s-%s-%s.png' % (self._meta.model_name, self.pk, language))
+        date_update = getattr(self, 'date_update', None)
+        version = [date_update.isoformat() if date_update else None] + \
+            [getattr(self, column) for column in self.COLUMNS]
+        name = self._elevation_chart_prefix(language) + AltimetryHelper.profile_chart_hash(version, language)
+        return os.path.join(basefolder, '%s.png' % name)
+
+    def remove_superseded_elevation_charts(self, language):
+        """Removes the charts rendered before the last changes of the object.
+        """
+        path = self.get_elevation_chart_path(language)
+        prefix = os.path.join(os.path.dirname(path), self._elevation_chart_prefix(language))
+        for other in glob.glob('%s*.png' % prefix):
+            if other != path:
+                try:
+                    os.remove(other)
+                except OSError:
+                    # Removed by another process meanwhile
+                    pass
+
+    def get_elevation_chart_svg(self, language):
+        with translation.override(language):
+            return self.get_elevation_profile_svg()
 
     def prepare_elevation_chart(self, language, rooturl):
-        """Converts SVG elevation URI to PNG on disk.
+        """Converts SVG elevation chart to PNG on disk, in-process if CairoSVG
+        is available, using convertit otherwise.
         """
         from .views import HttpSVGResponse
         path = self.get_elevation_chart_path(language)
-        # Do nothing if image is up-to-date
-        if is_file_newer(path, self.date_update):
+        # Do nothing if same chart was already rendered
+        if os.path.exists(path):
             return False
+        self.remove_superseded_elevation_charts(language)
+        if cairosvg is not None:
+            render_chart(self.get_elevation_chart_svg(language), path)
+            return True
         # Download converted chart as png using convertit
         source = smart_urljoin(rooturl, self.get_elevation_chart_url())
         convertit_download(source,
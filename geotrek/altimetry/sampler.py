@@ -0,0 +1,99 @@
+"""
+In-process DEM sampling, from the DEM exported as an array by
+``loaddem --export-array`` (see ``ALTIMETRIC_DEM_ARRAY`` setting).
+
+Requires NumPy: without it (or without exported DEM), ``get_sampler()``
+returns None and elevations are computed by the database.
+"""
+import json
+import os
+
+from django.conf import settings
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def export_dem(dataset, path, rows=1024):
+    """Export first band of GDAL dataset as a NumPy array on disk, along with
+    its georeferencing. Band is copied by blocks of rows, and files are
+    replaced at once, so that running processes keep their mapping.
+    """
+    band = dataset.GetRasterBand(1)
+    width, height = dataset.RasterXSize, dataset.RasterYSize
+    first = band.ReadAsArray(0, 0, width, min(rows, height))
+    values = numpy.lib.format.open_memmap(path + '.tmp', mode='w+', dtype=first.dtype,
+                                          shape=(height, width))
+    values[:len(first)] = first
+    for y in range(len(first), height, rows):
+        block = band.ReadAsArray(0, y, width, min(rows, height - y))
+        values[y:y + len(block)] = block
+    values.flush()
+    del values
+
+    originx, scalex, skewx, originy, skewy, scaley = dataset.GetGeoTransform()
+    with open(path + '.json.tmp', 'w') as f:
+        json.dump({'origin': [originx, originy],
+                   'scale': [scalex, scaley],
+                   'nodata': band.GetNoDataValue()}, f)
+    os.rename(path + '.tmp', path)
+    os.rename(path + '.json.tmp', path + '.json')
+
+
+class DEMSampler(object):
+    """Elevations of a memory-mapped DEM, taken from the pixel containing
+    each point, like ``ST_Value()`` does in database.
+    Only pages of the DEM around sampled points are read from disk.
+    """
+    def __init__(self, path):
+        with open(path + '.json') as f:
+            metadata = json.load(f)
+        self.values = numpy.load(path, mmap_mode='r')
+        self.originx, self.originy = metadata['origin']
+        self.scalex, self.scaley = metadata['scale']
+        self.nodata = metadata['nodata']
+
+    def sample(self, xs, ys):
+        """Elevations at given coordinates (in ``settings.SRID``), as an array
+        with NaN outside DEM or where there is no data.
+        """
+        height, width = self.values.shape
+        columns = numpy.floor((numpy.asarray(xs, dtype=float) - self.originx) / self.scalex).astype(int)
+        rows = numpy.floor((numpy.asarray(ys, dtype=float) - self.originy) / self.scaley).astype(int)
+        inside = (columns >= 0) & (columns < width) & (rows >= 0) & (rows < height)
+        values = self.values[numpy.clip(rows, 0, height - 1), numpy.clip(columns, 0, width - 1)]
+        valid = inside
+        if self.nodata is not None:
+            valid = valid & (values != self.nodata)
+        result = values.astype(float)
+        result[~valid] = numpy.nan
+        return result
+
+    def sample_grid(self, xmin, ymin, step, width, height):
+        """Elevations of a regular grid, row by row from south-west, as
+        integers (None where there is no data).
+        """
+        xs, ys = numpy.meshgrid(xmin + step * numpy.arange(width),
+                                ymin + step * numpy.arange(height))
+        elevations = self.sample(xs.ravel(), ys.ravel())
+        return [None if numpy.isnan(elevation) else int(round(elevation))
+                for elevation in elevations]
+
+
+_samplers = {}
+
+
+def get_sampler():
+    """Returns the sampler of exported DEM, or None if NumPy is missing or if
+    DEM was not exported. Sampler is renewed if DEM is exported again.
+    """
+    path = settings.ALTIMETRIC_DEM_ARRAY
+    if numpy is None or not path or not os.path.exists(path + '.json'):
+        return None
+    key = (path, os.path.getmtime(path + '.json'))
+    if key not in _samplers:
+        _samplers.clear()
+        _samplers[key] = DEMSampler(path)
+    return _samplers[key]
@@ -48,57 +48,46 @@ CREATE OR REPLACE FUNCTION geotrek.ft_smooth_line(
     step integer)
   RETURNS SETOF geometry AS $$
 -- function moving average on altitude lines with specified step
-
-DECLARE
-
-    points geometry[];
-    points_output geometry[];
-    current_values float;
-    count_values integer;
-    val geometry;
-    element geometry;
-
 BEGIN
     IF step <= 0
     THEN
         RETURN QUERY SELECT * FROM ft_smooth_line(linegeom);
+        RETURN;
     END IF;
 
-    FOR element in SELECT (ST_DumpPoints(linegeom)).geom LOOP
-		points := array_append(points, element);
-    END LOOP;
-
-    FOR i IN 0 .. array_length(points, 1) LOOP
-
-        current_values := 0.0;
-		count_values := 0;
-		
-		FOREACH val in ARRAY points[i-step:i+step] LOOP
-			-- val is null when out of array
-			IF val IS NOT NULL
-			THEN
-				count_values := count_values + 1;
-				current_values := current_values + ST_Z(val);
-			END IF;
-		END LOOP;
-
-		points_output := array_append(points_output, ST_MAKEPOINT(ST_X(points[i]), ST_Y(points[i]), (current_values / count_values)::integer));
-		
-
-    END LOOP;
-    --RAISE EXCEPTION 'Nonexistent ID --> %', ST_ASEWKT(ST_SetSRID(ST_MakeLine(points_output), ST_SRID(linegeom)));
-    
-    RETURN QUERY SELECT (ST_DumpPoints(ST_SetSRID(ST_MakeLine(points_output), ST_SRID(linegeom)))).geom as geom;
-
+    RETURN QUERY
+        WITH points AS (SELECT (ST_DumpPoints(linegeom)).*)
+        SELECT ST_SetSRID(ST_MakePoint(ST_X(geom), ST_Y(geom),
+                                       (AVG(ST_Z(geom)) OVER (ORDER BY path
+                                                              ROWS BETWEEN step PRECEDING AND step FOLLOWING))::integer),
+                          ST_SRID(linegeom))
+        FROM points
+        ORDER BY path;
 END;
 
 $$ LANGUAGE plpgsql;
 
+CREATE OR REPLACE FUNCTION geotrek.ft_sample_line(linegeom geometry, step integer)
+    RETURNS SETOF geometry AS $$
+    -- 2D points of line, at most step apart (original points are kept)
+    WITH -- Get endings of each segment of the line
+         r1 AS (SELECT ST_PointN($1, generate_series(1, ST_NPoints($1)-1)) as p1,
+                       ST_PointN($1, generate_series(2, ST_NPoints($1))) as p2,
+                       generate_series(2, ST_NPoints($1)) = ST_NPoints($1) as is_last),
+         -- Get the number of sub-segments
+         r2 AS (SELECT p1, p2, is_last, trunc(ST_Distance(p1, p2) / $2)::integer + 1 AS n FROM r1),
+         -- Get relative positions of new points along the segment (without last point, except for last segment)
+         r3 AS (SELECT p1, p2, generate_series(0, CASE WHEN is_last THEN n ELSE n - 1 END)/n::double precision AS f FROM r2),
+         -- Create new points
+         r4 AS (SELECT ST_MakePoint(ST_X(p1) + (ST_X(p2) - ST_X(p1)) * f,
+                                    ST_Y(p1) + (ST_Y(p2) - ST_Y(p1)) * f) as p,
+                       ST_SRID(p1) AS srid FROM r3)
+    -- Set SRID of new points
+    SELECT ST_SetSRID(p, srid) as p FROM r4;
+$$ LANGUAGE sql;
+
 CREATE OR REPLACE FUNCTION geotrek.ft_drape_line(linegeom geometry, step integer)
     RETURNS SETOF geometry AS $$
-DECLARE
-    points geometry[];
-result geometry[];
 BEGIN
     -- Use sampling steps for draping geometry on DEM
     -- http://blog.mathieu-leplatre.info/drape-lines-on-a-dem-with-postgis.html
@@ -109,26 +98,27 @@ BEGIN
         -- Already 3D, do not need to drape.
         -- (Use-case is when assembling paths geometries to build topologies)
         RETURN QUERY SELECT (ST_DumpPoints(ST_Force_3D(linegeom))).geom AS geom;
+        RETURN;
+    END IF;
 
-    ELSE
-        RETURN QUERY
-            WITH -- Get endings of each segment of the line
-                 r1 AS (SELECT ST_PointN(linegeom, generate_series(1, ST_NPoints(linegeom)-1)) as p1,
-                               ST_PointN(linegeom, generate_series(2, ST_NPoints(linegeom))) as p2,
-                               generate_series(2, ST_NPoints(linegeom)) = ST_NPoints(linegeom) as is_last),
-                 -- Get the number of sub-segments
-                 r2 AS (SELECT p1, p2, is_last, trunc(ST_Distance(p1, p2) / step)::integer + 1 AS n FROM r1),
-                 -- Get relative positions of new points along the segment (without last point, except for last segment)
-                 r3 AS (SELECT p1, p2, generate_series(0, CASE WHEN is_last THEN n ELSE n - 1 END)/n::double precision AS f FROM r2),
-                 -- Create new points
-                 r4 AS (SELECT ST_MakePoint(ST_X(p1) + (ST_X(p2) - ST_X(p1)) * f,
-                                            ST_Y(p1) + (ST_Y(p2) - ST_Y(p1)) * f) as p,
-                               ST_SRID(p1) AS srid FROM r3),
-                 -- Set SRID of new points
-                 r5 AS (SELECT ST_SetSRID(p, srid) as p FROM r4)
-            SELECT add_point_elevation(p) FROM r5;
-
+    -- Ensure we have a DEM
+    PERFORM * FROM raster_columns WHERE r_table_name = 'mnt';
+    IF NOT FOUND THEN
+        RETURN QUERY SELECT ST_SetSRID(ST_MakePoint(ST_X(p), ST_Y(p), 0), ST_SRID(p))
+                     FROM ft_sample_line(linegeom, step) AS p;
+        RETURN;
     END IF;
+
+    -- Sample all points at once (first tile if on tiles border, NULL if no data)
+    RETURN QUERY
+        WITH points AS (SELECT row_number() OVER () AS n, p FROM ft_sample_line(linegeom, step) AS p),
+             draped AS (SELECT DISTINCT ON (n) n, p, mnt.rast IS NOT NULL AS on_dem,
+                                               ST_Value(mnt.rast, 1, p)::integer AS ele
+                        FROM points LEFT JOIN mnt ON ST_Intersects(mnt.rast, p)
+                        ORDER BY n)
+        SELECT ST_SetSRID(ST_MakePoint(ST_X(p), ST_Y(p), CASE WHEN on_dem THEN ele ELSE 0 END), ST_SRID(p))
+        FROM draped
+        ORDER BY n;
 END;
 $$ LANGUAGE plpgsql;
 
@@ -164,12 +154,7 @@ $$ LANGUAGE plpgsql;
 
 CREATE OR REPLACE FUNCTION geotrek.ft_elevation_infos(geom geometry) RETURNS elevation_infos AS $$
 DECLARE
-    num_points integer;
     current geometry;
-    points3d geometry[];
-    ele integer;
-    last_ele integer;
-    last_last_ele integer;
     result elevation_infos;
 BEGIN
     -- Skip if no DEM (speed-up tests)
@@ -195,25 +180,16 @@ BEGIN
     -- Now geom is LineString only.
 
     -- Compute gain and elevation using (higher resolution)
-    result.positive_gain := 0;
-    result.negative_gain := 0;
-    last_ele := NULL;
-    last_last_ele := NULL;
-    points3d := ARRAY[]::geometry[];
-
-    FOR current IN SELECT * FROM ft_drape_line(geom, {{ALTIMETRIC_PROFILE_PRECISION}}) LOOP
-        -- Smooth the elevation profile
-        ele := ST_Z(current);
-        -- Create the 3d points
-        points3d := array_append(points3d, current);
-        -- Add positive only if ele - last_ele > 0
-        result.positive_gain := result.positive_gain + greatest(ele - coalesce(last_ele, ele), 0);
-        -- Add negative only if ele - last_ele < 0
-        result.negative_gain := result.negative_gain + least(ele - coalesce(last_ele, ele), 0);
-        last_ele := ele;
-        last_last_ele := last_ele;
-    END LOOP;
-    result.draped := ST_SetSRID(ST_MakeLine(points3d), ST_SRID(geom));
+    -- Points without data in DEM are NULL: gains next to them are NULL
+    -- too, hence ignored, and ST_MakeLine() skips them.
+    WITH points AS (SELECT row_number() OVER () AS n, p
+                    FROM ft_drape_line(geom, {{ALTIMETRIC_PROFILE_PRECISION}}) AS p),
+         gains AS (SELECT n, p, ST_Z(p)::integer - lag(ST_Z(p)::integer) OVER (ORDER BY n) AS gain FROM points)
+    SELECT ST_SetSRID(ST_MakeLine(p ORDER BY n), ST_SRID(geom)),
+           coalesce(sum(greatest(gain, 0)), 0),
+           coalesce(sum(least(gain, 0)), 0)
+    INTO result.draped, result.positive_gain, result.negative_gain
+    FROM gains;
 
     result.min_elevation := ST_ZMin(result.draped)::integer;
     result.max_elevation := ST_ZMax(result.draped)::integer;
@@ -230,13 +206,8 @@ $$ LANGUAGE plpgsql;
 
 CREATE OR REPLACE FUNCTION geotrek.ft_elevation_infos(geom geometry, epsilon float) RETURNS elevation_infos AS $$
 DECLARE
-    num_points integer;
     current geometry;
-    points3d geometry[];
-    points3d_smoothed geometry[];
-    points3d_simplified geometry[];
     result elevation_infos;
-    previous_geom geometry;
 BEGIN
     -- Skip if no DEM (speed-up tests)
     PERFORM * FROM raster_columns WHERE r_table_name = 'mnt';
@@ -267,49 +238,31 @@ BEGIN
 
     -- Now geom is LineString only.
 
-
-    result.positive_gain := 0;
-    result.negative_gain := 0;
-    points3d := ARRAY[]::geometry[];
-    points3d_smoothed := ARRAY[]::geometry[];
-    points3d_simplified := ARRAY[]::geometry[];
-
-    FOR current IN SELECT * FROM ft_drape_line(geom, {{ALTIMETRIC_PROFILE_PRECISION}}) LOOP
-        -- Create the 3d points
-        points3d := array_append(points3d, current);
-    END LOOP;
-
-    -- smoothing line
-    FOR current IN SELECT * FROM ft_smooth_line(St_MakeLine(points3d), {{ALTIMETRIC_PROFILE_AVERAGE}}) LOOP
-        -- Create the 3d points
-        points3d_smoothed := array_append(points3d_smoothed, current);
-    END LOOP;
-
-    -- simplify gain calculs
-
-    previous_geom := NULL;
+    -- Drape and smooth line (moving average), skipping points without data in DEM
+    WITH points AS (SELECT row_number() OVER () AS n, p
+                    FROM ft_drape_line(geom, {{ALTIMETRIC_PROFILE_PRECISION}}) AS p
+                    WHERE p IS NOT NULL)
+    SELECT ST_SetSRID(ST_MakeLine(p ORDER BY n), ST_SRID(geom))
+    INTO result.draped
+    FROM (SELECT n, ST_MakePoint(ST_X(p), ST_Y(p),
+                                 (AVG(ST_Z(p)) OVER (ORDER BY n ROWS BETWEEN {{ALTIMETRIC_PROFILE_AVERAGE}} PRECEDING
+                                                                      AND {{ALTIMETRIC_PROFILE_AVERAGE}} FOLLOWING))::integer) AS p
+          FROM points) AS smoothed;
 
     -- Compute gain using simplification
     -- see http://www.postgis.org/docs/ST_Simplify.html
-    --     https://en.wikipedia.org/wiki/Ramer%E2%80%93Douglas%E2%80%93Peucker_algorithm
-    FOR current IN SELECT (ST_DUMPPOINTS(ST_SIMPLIFYPRESERVETOPOLOGY(ST_MAKELINE(points3d_smoothed), epsilon))).geom
-    LOOP
-        -- Add positive only if current - previous_geom > 0
-	result.positive_gain := result.positive_gain + greatest(ST_Z(current) - coalesce(ST_Z(previous_geom),
-								ST_Z(current)), 0);
-	-- Add negative only if current - previous_geom < 0
-	result.negative_gain := result.negative_gain + least(ST_Z(current) - coalesce(ST_Z(previous_geom),
-							     ST_Z(current)), 0);
-	previous_geom := current;
-    END LOOP;
-
-    result.draped := ST_SetSRID(ST_MakeLine(points3d_smoothed), ST_SRID(geom));
+    --     https://en.wikipedia.org/wiki/Ramer-Douglas-Peucker_algorithm
+    WITH points AS (SELECT (dumped).path AS n, (dumped).geom AS p
+                    FROM (SELECT ST_DumpPoints(ST_SimplifyPreserveTopology(result.draped, epsilon)) AS dumped) AS d),
+         gains AS (SELECT ST_Z(p) - lag(ST_Z(p)) OVER (ORDER BY n) AS gain FROM points)
+    SELECT coalesce(sum(greatest(gain, 0)), 0), coalesce(sum(least(gain, 0)), 0)
+    INTO result.positive_gain, result.negative_gain
+    FROM gains;
 
     -- Compute elevation using (higher resolution)
     result.min_elevation := ST_ZMin(result.draped)::integer;
     result.max_elevation := ST_ZMax(result.draped)::integer;
 
-
     -- Compute slope
     result.slope := 0.0;
 
@@ -0,0 +1,64 @@
+-------------------------------------------------------------------------------
+-- Elevation profiles, computed once when 3D geometry changes.
+-- Stored flat as (distance, x, y, z) steps, x and y in API_SRID.
+-------------------------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION geotrek.ft_elevation_profile(geom3d geometry) RETURNS double precision[] AS $$
+    -- Vertices are numbered by part and position in ST_DumpPoints() path,
+    -- distances are cumulated along 2D lines, across parts.
+    SELECT array_agg(step.value[k] ORDER BY step.part, step.vertex, k)
+    FROM (
+        SELECT part, vertex,
+               ARRAY[sum(coalesce(ST_Distance(previous, point), 0.0)) OVER (ORDER BY part, vertex),
+                     ST_X(projected), ST_Y(projected), ST_Z(projected)] AS value
+        FROM (
+            SELECT part, vertex, point,
+                   ST_Transform(point, {{API_SRID}}) AS projected,
+                   lag(point) OVER (PARTITION BY part ORDER BY vertex) AS previous
+            FROM (
+                SELECT CASE WHEN array_upper(d.path, 1) = 2 THEN d.path[1] ELSE 1 END AS part,
+                       d.path[array_upper(d.path, 1)] AS vertex,
+                       d.geom AS point
+                FROM ST_DumpPoints($1) AS d
+                WHERE ST_GeometryType($1) IN ('ST_LineString', 'ST_MultiLineString')
+            ) AS vertices
+        ) AS points
+    ) AS step, generate_series(1, 4) AS k;
+$$ LANGUAGE sql STABLE;
+
+
+CREATE OR REPLACE FUNCTION geotrek.elevation_profile_iu() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        IF ST_OrderingEquals(NEW.geom_3d, OLD.geom_3d) AND OLD.profil IS NOT NULL THEN
+            RETURN NEW;
+        END IF;
+    END IF;
+    NEW.profil := ft_elevation_profile(NEW.geom_3d);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- Adds the profile column to the table (not part of Django models), fills it,
+-- and keeps it up-to-date. Its trigger runs after those computing geom_3d.
+
+CREATE OR REPLACE FUNCTION geotrek.ft_add_elevation_profile(tablename text) RETURNS void AS $$
+BEGIN
+    PERFORM * FROM information_schema.columns
+    WHERE table_name = tablename AND column_name = 'profil';
+    IF NOT FOUND THEN
+        EXECUTE 'ALTER TABLE ' || quote_ident(tablename) || ' ADD COLUMN profil double precision[]';
+        -- Do not bump modification dates
+        EXECUTE 'ALTER TABLE ' || quote_ident(tablename) || ' DISABLE TRIGGER USER';
+        EXECUTE 'UPDATE ' || quote_ident(tablename) || ' SET profil = ft_elevation_profile(geom_3d)';
+        EXECUTE 'ALTER TABLE ' || quote_ident(tablename) || ' ENABLE TRIGGER USER';
+    END IF;
+
+    EXECUTE 'DROP TRIGGER IF EXISTS ' || quote_ident(tablename || '_profil_iu_tgr')
+         || ' ON ' || quote_ident(tablename);
+    EXECUTE 'CREATE TRIGGER ' || quote_ident(tablename || '_profil_iu_tgr')
+         || ' BEFORE INSERT OR UPDATE ON ' || quote_ident(tablename)
+         || ' FOR EACH ROW EXECUTE PROCEDURE elevation_profile_iu()';
+END;
+$$ LANGUAGE plpgsql;
@@ -1,11 +1,23 @@
+import json
+import os
+import shutil
+from StringIO import StringIO
+import struct
+import tempfile
+
 from django.conf import settings
+from django.core.management import call_command
 from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils.unittest import skipIf
 from django.db import connections, DEFAULT_DB_ALIAS
 from django.contrib.gis.geos import MultiLineString, LineString
 
-from geotrek.core.models import Path
+from geotrek.core.models import Path, Topology
 from geotrek.core.factories import TopologyFactory
-from geotrek.altimetry.helpers import AltimetryHelper
+from geotrek.altimetry.helpers import AltimetryHelper, cairosvg
+from geotrek.altimetry.management.commands.loaddem import copy_tiles, raster_tiles, replace_dem_table, STAGING_TABLE
+from geotrek.altimetry.sampler import DEMSampler, get_sampler, numpy
 
 
 class ElevationTest(TestCase):
@@ -44,11 +56,76 @@ class ElevationTest(TestCase):
         self.assertEqual(profile[5][3], 20.0)
         self.assertEqual(profile[6][3], 22.0)
 
+    def test_elevation_profile_is_stored(self):
+        stored = self.path.get_elevation_profile()
+        computed = AltimetryHelper.elevation_profile(self.path.geom_3d)
+        self.assertEqual(len(stored), len(computed))
+        for step, expected in zip(stored, computed):
+            for value, expected_value in zip(step, expected):
+                self.assertAlmostEqual(value, expected_value, places=6)
+
+    def test_elevation_profile_is_fetched_along_with_object(self):
+        path = Path.objects.extra(select={'_elevation_profile': Path.elevation_profile_column()}).get(pk=self.path.pk)
+        with self.assertNumQueries(0):
+            profile = path.get_elevation_profile()
+        self.assertEqual(len(profile), 7)
+
+    def test_elevation_profile_follows_geometry(self):
+        self.path.geom = LineString((78, 117), (40, 67))
+        self.path.save()
+        profile = Path.objects.get(pk=self.path.pk).get_elevation_profile()
+        self.assertAlmostEqual(profile[-1][0], self.path.geom.length)
+        self.assertEqual(profile[0][3], 6.0)
+
+    def test_simplified_elevation_profile(self):
+        profile = self.path.get_elevation_profile(points=4)
+        self.assertEqual(len(profile), 4)
+        self.assertEqual(profile[0][0], 0.0)
+        self.assertEqual(profile[-1][0], 125.0)
+
     def test_elevation_limits(self):
         limits = self.path.get_elevation_limits()
         self.assertEqual(limits[0], 1106)
         self.assertEqual(limits[1], -94)
 
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp('geotrek_test'))
+    def test_elevation_chart_is_named_after_its_version(self):
+        path = self.path.get_elevation_chart_path('en')
+        with self.assertNumQueries(0):
+            self.assertEqual(path, self.path.get_elevation_chart_path('en'))
+        self.assertNotEqual(path, self.path.get_elevation_chart_path('fr'))
+        other = Path.objects.create(geom=LineString((10, 110), (40, 110)))
+        self.assertNotEqual(path, other.get_elevation_chart_path('en'))
+        open(path, 'w').close()
+        self.assertFalse(self.path.prepare_elevation_chart('en', 'http://localhost:8000'))
+        self.path.geom = LineString((78, 117), (40, 67))
+        self.path.save()
+        self.assertNotEqual(path, self.path.get_elevation_chart_path('en'))
+        shutil.rmtree(settings.MEDIA_ROOT)
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp('geotrek_test'))
+    def test_superseded_elevation_charts_are_removed(self):
+        superseded = self.path.get_elevation_chart_path('en')
+        other_language = self.path.get_elevation_chart_path('fr')
+        open(superseded, 'w').close()
+        open(other_language, 'w').close()
+        self.path.save()
+        path = self.path.get_elevation_chart_path('en')
+        open(path, 'w').close()
+        self.path.remove_superseded_elevation_charts('en')
+        self.assertFalse(os.path.exists(superseded))
+        self.assertTrue(os.path.exists(path))
+        self.assertTrue(os.path.exists(other_language))
+        shutil.rmtree(settings.MEDIA_ROOT)
+
+    @skipIf(cairosvg is None, 'CairoSVG is not available')
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp('geotrek_test'))
+    def test_elevation_chart_is_rendered_in_process(self):
+        self.assertTrue(self.path.prepare_elevation_chart('en', 'http://localhost:8000'))
+        with open(self.path.get_elevation_chart_path('en'), 'rb') as f:
+            self.assertEqual(f.read(8), '\x89PNG\r\n\x1a\n')
+        shutil.rmtree(settings.MEDIA_ROOT)
+
     def test_elevation_topology_line(self):
         topo = TopologyFactory.create(no_path=True)
         topo.add_path(self.path, start=0.2, end=0.8)
@@ -92,6 +169,55 @@ class ElevationTest(TestCase):
         self.assertEqual(topo.min_elevation, 0)
         self.assertEqual(topo.max_elevation, 0)
 
+    def test_gains_next_to_dem_nodata_are_ignored(self):
+        sql = "SELECT (ft_elevation_infos(ST_GeomFromText('LINESTRING(10 87, 90 87)', %s))).*"
+        cur = connections[DEFAULT_DB_ALIAS].cursor()
+        cur.execute(sql, [settings.SRID])
+        draped, slope, min_elevation, max_elevation, ascent, descent = cur.fetchone()
+        self.assertEqual(ascent, 13)
+        # Pixel of 10 (between 2 and 15) has no data
+        cur.execute('UPDATE mnt SET rast = ST_SetBandNoDataValue(rast, 1, 10)')
+        cur.execute(sql, [settings.SRID])
+        draped, slope, min_elevation, max_elevation, ascent, descent = cur.fetchone()
+        self.assertEqual(ascent, 0)
+        self.assertEqual(descent, 0)
+        self.assertEqual((min_elevation, max_elevation), (2, 15))
+
+    def _raise_dem(self, height):
+        cur = connections[DEFAULT_DB_ALIAS].cursor()
+        cur.execute('UPDATE mnt SET rast = ST_MapAlgebraExpr(rast, NULL, %s)', ['[rast] + %s' % height])
+
+    def test_update_altimetry_after_dem_change(self):
+        topo = TopologyFactory.create(no_path=True)
+        topo.add_path(self.path, start=0.2, end=0.8)
+        topo.save()
+        self._raise_dem(100)
+        call_command('update_altimetry', chunk_size=1, stdout=StringIO())
+
+        path = Path.objects.get(pk=self.path.pk)
+        self.assertEqual(path.ascent, 16)
+        self.assertEqual(path.min_elevation, 106)
+        self.assertEqual(path.max_elevation, 122)
+        self.assertEqual(path.get_elevation_profile()[0][3], 106.0)
+        topo = Topology.objects.get(pk=topo.pk)
+        self.assertEqual(topo.ascent, 7)
+        self.assertEqual(topo.min_elevation, 110)
+        self.assertEqual(topo.max_elevation, 117)
+
+    def test_update_altimetry_resumes_from_state(self):
+        other = Path.objects.create(geom=LineString((10, 110), (40, 110)))
+        self._raise_dem(100)
+        state = tempfile.NamedTemporaryFile(suffix='.json', delete=False)
+        json.dump({'path': [[self.path.pk, self.path.pk]]}, state)
+        state.close()
+        output = StringIO()
+        call_command('update_altimetry', models=['path'], state=state.name, stdout=output)
+
+        self.assertIn('1/1 paths processed', output.getvalue())
+        self.assertEqual(Path.objects.get(pk=self.path.pk).min_elevation, 6)
+        self.assertTrue(Path.objects.get(pk=other.pk).min_elevation >= 100)
+        self.assertFalse(os.path.exists(state.name))
+
 
 class ElevationProfileTest(TestCase):
     def test_elevation_profile_wrong_geom(self):
@@ -102,6 +228,34 @@ class ElevationProfileTest(TestCase):
         profile = AltimetryHelper.elevation_profile(geom)
         self.assertEqual(len(profile), 4)
 
+    def test_stored_profile_of_multilinestring(self):
+        geom = MultiLineString(LineString((1.5, 2.5, 8), (2.5, 2.5, 10), (2.5, 5.5, 9)),
+                               LineString((2.5, 2.5, 6), (2.5, 0, 7)),
+                               srid=settings.SRID)
+        cursor = connections[DEFAULT_DB_ALIAS].cursor()
+        cursor.execute('SELECT ft_elevation_profile(%s::geometry)', [geom.ewkt])
+        values = cursor.fetchone()[0]
+        stored = [tuple(values[i:i + 4]) for i in range(0, len(values), 4)]
+        computed = AltimetryHelper.elevation_profile(geom)
+        self.assertEqual([step[0] for step in stored], [0.0, 1.0, 4.0, 4.0, 6.5])
+        self.assertEqual([step[3] for step in stored], [8.0, 10.0, 9.0, 6.0, 7.0])
+        for step, expected in zip(stored, computed):
+            for value, expected_value in zip(step, expected):
+                self.assertAlmostEqual(value, expected_value, places=6)
+
+    def test_simplify_profile_keeps_ends_and_peaks(self):
+        profile = [(float(i), 0.0, 0.0, 100.0 if i == 37 else float(i % 10)) for i in range(100)]
+        simplified = AltimetryHelper.simplify_profile(profile, 10)
+        self.assertEqual(len(simplified), 10)
+        self.assertEqual(simplified[0], profile[0])
+        self.assertEqual(simplified[-1], profile[-1])
+        self.assertIn(profile[37], simplified)
+        self.assertEqual(simplified, sorted(simplified))
+
+    def test_simplify_short_profile(self):
+        profile = [(0.0, 0.0, 0.0, 1.0), (1.0, 0.0, 0.0, 2.0)]
+        self.assertEqual(AltimetryHelper.simplify_profile(profile, 10), profile)
+
     def test_elevation_svg_output(self):
         geom = LineString((1.5, 2.5, 8), (2.5, 2.5, 10),
                           srid=settings.SRID)
@@ -195,6 +349,113 @@ class ElevationAreaTest(TestCase):
         self.assertEqual(extent['altitudes']['max'], 45)
         self.assertEqual(extent['altitudes']['min'], 0)
 
+    def test_area_altitudes_are_sampled_from_dem(self):
+        # Point (75, 19) is in south-east pixel of DEM, (0, 119) in north-west one
+        self.assertEqual(self.area['altitudes'][2][5], 45)
+        self.assertEqual(self.area['altitudes'][6][2], 0)
+
+    def test_area_altitudes_are_not_flipped(self):
+        # DEM is asymmetric: north-east pixel is 5, south-west one is 30
+        altitudes = self.area['altitudes']
+        self.assertEqual(altitudes[6][5], 5)  # (75, 119)
+        self.assertEqual(altitudes[5][4], 10)  # (50, 94)
+        self.assertEqual(altitudes[2][2], 30)  # (0, 19)
+
+    @skipIf(numpy is None, "NumPy is not available")
+    def test_area_altitudes_are_the_same_with_sampler(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'dem.npy')
+        values = numpy.array([[0, 0, 3, 5], [2, 2, 10, 15], [5, 15, 20, 25], [20, 25, 30, 35], [30, 35, 40, 45]],
+                             dtype=numpy.int16)
+        numpy.save(path, values)
+        with open(path + '.json', 'w') as f:
+            json.dump({'origin': [0, 125], 'scale': [25, -25], 'nodata': None}, f)
+        with override_settings(ALTIMETRIC_DEM_ARRAY=path):
+            area = AltimetryHelper.elevation_area(self.geom)
+        self.assertEqual(area['altitudes'], self.area['altitudes'])
+        self.assertEqual(area['extent']['altitudes'], self.area['extent']['altitudes'])
+
+    def test_area_grid_packs_altitudes(self):
+        grid = AltimetryHelper.elevation_area_grid(self.area)
+        self.assertEqual(len(grid), 4 + 2 * 53 * 33)
+        self.assertEqual(struct.unpack_from('<HH', grid), (53, 33))
+        altitudes = struct.unpack_from('<%dh' % (53 * 33), grid, 4)
+        self.assertEqual(altitudes[2 * 53 + 5], 45)
+
+
+@skipIf(numpy is None, "NumPy is not available")
+class DEMSamplerTest(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'dem.npy')
+        # Same DEM as database tests: 4x5 pixels of 25m, origin at (0, 125)
+        values = numpy.array([[0, 0, 3, 5], [2, 2, 10, 15], [5, 15, 20, 25], [20, 25, 30, 35], [30, 35, 40, 45]],
+                             dtype=numpy.int16)
+        numpy.save(self.path, values)
+        with open(self.path + '.json', 'w') as f:
+            json.dump({'origin': [0, 125], 'scale': [25, -25], 'nodata': None}, f)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_sample_takes_value_of_containing_pixel(self):
+        sampler = DEMSampler(self.path)
+        elevations = sampler.sample([12.5, 49, 51, 87.5], [112.5, 112.5, 99, 12.5])
+        self.assertEqual(list(elevations), [0, 0, 10, 45])
+
+    def test_sample_outside_dem(self):
+        sampler = DEMSampler(self.path)
+        self.assertTrue(numpy.isnan(sampler.sample([200], [200])[0]))
+
+    def test_elevation_area_uses_sampler(self):
+        with override_settings(ALTIMETRIC_DEM_ARRAY=self.path):
+            self.assertTrue(get_sampler() is not None)
+            geom = LineString((100, 370), (1100, 370), srid=settings.SRID)
+            area = AltimetryHelper.elevation_area(geom)
+        self.assertEqual(area['resolution']['x'], 53)
+        self.assertEqual(area['extent']['altitudes']['min'], 0)
+        self.assertTrue(area['extent']['altitudes']['max'] > 0)
+
+
+class BenchmarkElevationTest(TestCase):
+    def test_set_based_functions_give_same_results_than_former_ones(self):
+        output = StringIO()
+        call_command('benchmark_elevation', sizes='10,200', repeat=1, dem_tiles=1, stdout=output)
+        self.assertEqual(output.getvalue().count('identical results'), 4)
+
+
+class LoadDemTest(TestCase):
+    def test_tiles_are_read_from_raster2pgsql_output(self):
+        output = ['BEGIN;\n',
+                  'INSERT INTO "mnt" ("rast") VALUES (\'0100000100\'::raster);\n',
+                  'INSERT INTO "mnt" ("rast") VALUES (\'0100000200\'::raster);\n',
+                  'END;\n']
+        self.assertEqual(list(raster_tiles(output)), ['0100000100', '0100000200'])
+
+    def test_tiles_are_copied_into_dem_table(self):
+        cur = connections[DEFAULT_DB_ALIAS].cursor()
+        cur.execute('CREATE TABLE mnt (rid serial primary key, rast raster)')
+        cur.execute('SELECT encode(ST_AsBinary(ST_AddBand(ST_MakeEmptyRaster(10, 10, 0, 10, 1, -1, 0, 0, %s), \'16BSI\', 5)), \'hex\')',
+                    [settings.SRID])
+        tile = cur.fetchone()[0]
+        self.assertEqual(copy_tiles([tile, tile]), 2)
+        cur.execute('SELECT ST_Value(rast, 1, 1), ST_SRID(rast) FROM mnt')
+        self.assertEqual(cur.fetchall(), [(5, settings.SRID), (5, settings.SRID)])
+
+    def test_dem_table_is_replaced_at_once(self):
+        cur = connections[DEFAULT_DB_ALIAS].cursor()
+        for table, value in (('mnt', 1), (STAGING_TABLE, 2)):
+            cur.execute('CREATE TABLE %s (rid serial primary key, rast raster)' % table)
+            cur.execute('CREATE INDEX {0}_rast_gist ON {0} USING gist (ST_ConvexHull(rast))'.format(table))
+            cur.execute('INSERT INTO %s (rast) VALUES (ST_AddBand(ST_MakeEmptyRaster(10, 10, 0, 10, 1, -1, 0, 0, %%s), \'16BSI\', %%s))' % table,
+                        [settings.SRID, value])
+        replace_dem_table(STAGING_TABLE)
+        cur.execute('SELECT ST_Value(rast, 1, 1) FROM mnt')
+        self.assertEqual(cur.fetchall(), [(2,)])
+        cur.execute('SELECT COUNT(*) FROM pg_class WHERE relname LIKE %s', [STAGING_TABLE + '%'])
+        self.assertEqual(cur.fetchone()[0], 0)
+
 
 class LengthTest(TestCase):
 
@@ -3,7 +3,8 @@ from django.conf.urls import patterns, url
 from mapentity.registry import MapEntityOptions
 
 from geotrek.altimetry.views import (ElevationProfile, ElevationChart,
-                                     ElevationArea, serve_elevation_chart)
+                                     ElevationArea, ElevationAreaGrid,
+                                     serve_elevation_chart)
 
 
 urlpatterns = patterns(
@@ -15,6 +16,7 @@ urlpatterns = patterns(
 class AltimetryEntityOptions(MapEntityOptions):
     elevation_profile_view = ElevationProfile
     elevation_area_view = ElevationArea
+    elevation_area_grid_view = ElevationAreaGrid
     elevation_chart_view = ElevationChart
 
     def scan_views(self, *args, **kwargs):
@@ -29,6 +31,9 @@ class AltimetryEntityOptions(MapEntityOptions):
             url(r'^api/(?P<lang>\w+)/{modelname}s/(?P<pk>\d+)/dem.json$'.format(modelname=self.modelname),
                 self.elevation_area_view.as_view(model=self.model),
                 name="%s_elevation_area" % self.modelname),
+            url(r'^api/(?P<lang>\w+)/{modelname}s/(?P<pk>\d+)/dem.bin$'.format(modelname=self.modelname),
+                self.elevation_area_grid_view.as_view(model=self.model),
+                name="%s_elevation_area_grid" % self.modelname),
             url(r'^api/(?P<lang>\w+)/{modelname}s/(?P<pk>\d+)/profile.svg$'.format(modelname=self.modelname),
                 self.elevation_chart_view.as_view(model=self.model),
                 name='%s_profile_svg' % self.modelname),
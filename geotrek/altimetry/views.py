@@ -15,6 +15,7 @@ from mapentity.views import JSONResponseMixin, LastModifiedMixin
 
 from geotrek.common.views import PublicOrReadPermMixin
 
+from .helpers import AltimetryHelper
 from .models import AltimetryMixin
 
 
@@ -26,32 +27,50 @@ class HttpSVGResponse(HttpResponse):
         super(HttpSVGResponse, self).__init__(content, **kwargs)
 
 
-class ElevationChart(LastModifiedMixin, BaseDetailView):
+class StoredProfileMixin(object):
+    """Fetch the stored elevation profile along with the object"""
+
+    def get_queryset(self):
+        queryset = super(StoredProfileMixin, self).get_queryset()
+        return queryset.extra(select={'_elevation_profile': self.model.elevation_profile_column()})
+
+
+class ElevationChart(LastModifiedMixin, StoredProfileMixin, BaseDetailView):
 
     @method_decorator(login_required)
     def dispatch(self, *args, **kwargs):
         return super(ElevationChart, self).dispatch(*args, **kwargs)
 
     def render_to_response(self, context, **response_kwargs):
-        return HttpSVGResponse(self.get_object().get_elevation_profile_svg(),
+        return HttpSVGResponse(self.object.get_elevation_profile_svg(),
                                **response_kwargs)
 
 
-class ElevationProfile(LastModifiedMixin, JSONResponseMixin,
+class ElevationProfile(LastModifiedMixin, JSONResponseMixin, StoredProfileMixin,
                        PublicOrReadPermMixin, BaseDetailView):
-    """Extract elevation profile from a path and return it as JSON"""
+    """Extract elevation profile from a path and return it as JSON.
+    Use ``?points=N`` to get a simplified profile of N steps.
+    """
 
     def get_context_data(self, **kwargs):
         """
         Put elevation profile into response context.
         """
         data = {}
+        try:
+            points = int(self.request.GET['points'])
+        except (KeyError, ValueError):
+            points = None
         elevation_profile = self.object.get_elevation_profile()
+        # Limits of the whole profile, not only of its remaining steps
+        limits = AltimetryHelper.altimetry_limits(elevation_profile)
+        data['limits'] = dict(zip(['ceil', 'floor'], limits))
+        if points is not None:
+            elevation_profile = self.object.get_elevation_profile(points=points)
         # Formatted as distance, elevation, [lng, lat]
         for step in elevation_profile:
             formatted = step[0], step[3], step[1:3]
             data.setdefault('profile', []).append(formatted)
-        data['limits'] = dict(zip(['ceil', 'floor'], self.object.get_elevation_limits()))
         return data
 
 
@@ -79,6 +98,18 @@ class ElevationArea(LastModifiedMixin, JSONResponseMixin, PublicOrReadPermMixin,
         return self.object.get_elevation_area()
 
 
+class ElevationAreaGrid(ElevationArea):
+    """Extract elevation on an area and return it as a packed binary grid"""
+
+    def dispatch(self, *args, **kwargs):
+        # Response content cache is JSON-only, area is cached by model anyway
+        return super(ElevationArea, self).dispatch(*args, **kwargs)
+
+    def render_to_response(self, context, **response_kwargs):
+        return HttpResponse(self.object.get_elevation_area_grid(),
+                            content_type='application/octet-stream')
+
+
 def serve_elevation_chart(request, model_name, pk, from_command=False):
     try:
         model = ContentType.objects.get(model=model_name).model_class()
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 import os
+import re
 import logging
+import mimetypes
 import shutil
 import datetime
 
@@ -10,12 +12,10 @@ from django.db import models
 from django.utils.translation import ugettext_lazy as _
 from django.template.defaultfilters import slugify
 
-from easy_thumbnails.alias import aliases
-from easy_thumbnails.exceptions import InvalidImageFormatError
-from easy_thumbnails.files import get_thumbnailer
 from embed_video.backends import detect_backend, VideoDoesntExistException
 
 from geotrek.common.utils import classproperty
+from geotrek.common.utils.thumbnails import get_thumbnail, get_thumbnail_name
 
 logger = logging.getLogger(__name__)
 
@@ -73,6 +73,23 @@ class NoDeleteMixin(models.Model):
         return NoDeleteManager
 
 
+PICTURES_CHUNK_SIZE = 1000
+
+
+def picture_attachments(attachments):
+    """
+    Filter images among attachments in SQL, from the mimetype of their file
+    extension (like ``Attachment.is_image``), except map screenshots.
+    """
+    if not mimetypes.inited:
+        mimetypes.init()
+    extensions = set(ext[1:] for ext, mimetype in mimetypes.types_map.items()
+                     if mimetype.startswith('image/'))
+    regex = r'\.(%s)$' % '|'.join(re.escape(ext) for ext in sorted(extensions))
+    attachments = attachments.filter(attachment_file__iregex=regex).exclude(title='mapimage')
+    return attachments.order_by('-starred', 'attachment_file')
+
+
 class PicturesMixin(object):
     """A common class to share code between Trek and POI regarding
     attached pictures"""
@@ -86,22 +103,49 @@ class PicturesMixin(object):
         """
         if hasattr(self, '_pictures'):
             return self._pictures
-        all_attachments = self.attachments.order_by('-starred', 'attachment_file').all()
-        return [a for a in all_attachments if a.is_image and a.title != 'mapimage']
+        prefetched = getattr(self, '_prefetched_properties', {})
+        if 'pictures' in prefetched:
+            return prefetched['pictures']
+        return list(picture_attachments(self.attachments.all()))
 
     @pictures.setter
     def pictures(self, values):
         self._pictures = values
 
+    @classmethod
+    def _pictures_bulk(cls, objects):
+        """
+        Bulk loader of ``pictures``, used by ``prefetch_properties()``.
+        Attachments are fetched for chunks of objects.
+        """
+        from django.contrib.contenttypes.models import ContentType
+        from paperclip.models import Attachment
+
+        objects = list(objects)
+        result = dict((obj.pk, []) for obj in objects)
+        if not objects:
+            return result
+        content_type = ContentType.objects.get_for_model(objects[0])
+        pks = result.keys()
+        for i in range(0, len(pks), PICTURES_CHUNK_SIZE):
+            attachments = Attachment.objects.filter(content_type=content_type,
+                                                    object_id__in=pks[i:i + PICTURES_CHUNK_SIZE])
+            for attachment in picture_attachments(attachments):
+                result[attachment.object_id].append(attachment)
+        return result
+
     @property
     def serializable_pictures(self):
         serialized = []
-        for picture, thdetail in self.resized_pictures:
+        for picture in self.pictures:
+            name = get_thumbnail_name(picture.attachment_file, 'medium')
+            if name is None:
+                continue
             serialized.append({
                 'author': picture.author,
                 'title': picture.title,
                 'legend': picture.legend,
-                'url': os.path.join(settings.MEDIA_URL, thdetail.name),
+                'url': os.path.join(settings.MEDIA_URL, name),
             })
         return serialized
 
@@ -109,23 +153,16 @@ class PicturesMixin(object):
     def resized_pictures(self):
         resized = []
         for picture in self.pictures:
-            thumbnailer = get_thumbnailer(picture.attachment_file)
-            try:
-                thdetail = thumbnailer.get_thumbnail(aliases.get('medium'))
-            except InvalidImageFormatError:
-                logger.info(_("Image %s invalid or missing from disk.") % picture.attachment_file)
-            else:
+            thdetail = get_thumbnail(picture.attachment_file, 'medium')
+            if thdetail is not None:
                 resized.append((picture, thdetail))
         return resized
 
     @property
     def picture_print(self):
         for picture in self.pictures:
-            thumbnailer = get_thumbnailer(picture.attachment_file)
-            try:
-                thumbnail = thumbnailer.get_thumbnail(aliases.get('print'))
-            except InvalidImageFormatError:
-                logger.info(_("Image %s invalid or missing from disk.") % picture.attachment_file)
+            thumbnail = get_thumbnail(picture.attachment_file, 'print')
+            if thumbnail is None:
                 continue
             thumbnail.author = picture.author
             thumbnail.legend = picture.legend
@@ -135,38 +172,47 @@ class PicturesMixin(object):
     @property
     def thumbnail(self):
         for picture in self.pictures:
-            thumbnailer = get_thumbnailer(picture.attachment_file)
-            try:
-                thumbnail = thumbnailer.get_thumbnail(aliases.get('small-square'))
-            except InvalidImageFormatError:
-                logger.info(_("Image %s invalid or missing from disk.") % picture.attachment_file)
+            thumbnail = get_thumbnail(picture.attachment_file, 'small-square')
+            if thumbnail is None:
                 continue
             thumbnail.author = picture.author
             thumbnail.legend = picture.legend
             return thumbnail
         return None
 
+    @property
+    def thumbnail_name(self):
+        """
+        Name of the thumbnail, read from cache when generated ahead of time
+        """
+        for picture in self.pictures:
+            name = get_thumbnail_name(picture.attachment_file, 'small-square')
+            if name is not None:
+                return name
+        return None
+
     @classproperty
     def thumbnail_verbose_name(cls):
         return _("Thumbnail")
 
     @property
     def thumbnail_display(self):
-        thumbnail = self.thumbnail
-        if thumbnail is None:
+        name = self.thumbnail_name
+        if name is None:
             return _("None")
-        return '<img height="20" width="20" src="%s"/>' % os.path.join(settings.MEDIA_URL, thumbnail.name)
+        return '<img height="20" width="20" src="%s"/>' % os.path.join(settings.MEDIA_URL, name)
 
     @property
     def thumbnail_csv_display(self):
-        return '' if self.thumbnail is None else os.path.join(settings.MEDIA_URL, self.thumbnail.name)
+        name = self.thumbnail_name
+        return '' if name is None else os.path.join(settings.MEDIA_URL, name)
 
     @property
     def serializable_thumbnail(self):
-        th = self.thumbnail
-        if not th:
+        name = self.thumbnail_name
+        if name is None:
             return None
-        return os.path.join(settings.MEDIA_URL, th.name)
+        return os.path.join(settings.MEDIA_URL, name)
 
     @property
     def videos(self):
@@ -396,8 +442,117 @@ OptionalPictogramMixin._meta.get_field('pictogram').blank = True
 
 class AddPropertyMixin(object):
     @classmethod
-    def add_property(cls, name, func, verbose_name):
-        if hasattr(cls, name):
+    def add_property(cls, name, func, verbose_name, bulk=None, queryset=None):
+        """
+        Add a computed property. ``bulk`` can be given to compute it for many
+        objects at once: it receives a list of objects, and returns a dict of
+        lists of values by primary key (see ``prefetch_properties()``), in the
+        same order as ``func``. When ``func`` returns a queryset, ``queryset``
+        is its model: prefetched values are then returned as a queryset too.
+        Subclasses can override a property of their parents.
+        """
+        if name in cls.__dict__ or (hasattr(cls, name) and not isinstance(getattr(cls, name), property)):
             raise AttributeError("%s has already an attribute %s" % (cls, name))
-        setattr(cls, name, property(func))
+
+        def getter(self):
+            prefetched = getattr(self, '_prefetched_properties', {})
+            if name not in prefetched:
+                return func(self)
+            if queryset is not None:
+                # Querysets are built lazily, they only get prefetched results
+                objects = prefetched[name]
+                base = queryset._default_manager.filter(pk__in=[obj.pk for obj in objects])
+                return prefetched_queryset(base, objects)
+            return prefetched[name]
+
+        setattr(cls, name, property(getter))
         setattr(cls, '%s_verbose_name' % name, verbose_name)
+        if bulk is not None:
+            setattr(cls, '_%s_bulk' % name, staticmethod(bulk))
+        elif hasattr(cls, '_%s_bulk' % name):
+            # Do not compute overridden property with loader of parents
+            setattr(cls, '_%s_bulk' % name, None)
+
+    @classmethod
+    def get_property_loader(cls, name):
+        return getattr(cls, '_%s_bulk' % name, None)
+
+
+class PrefetchPropertiesQuerySetMixin(object):
+    """
+    Compute properties of objects once the queryset is evaluated.
+    """
+    def _clone(self, *args, **kwargs):
+        clone = super(PrefetchPropertiesQuerySetMixin, self)._clone(*args, **kwargs)
+        if '_prefetch_properties' not in kwargs:
+            clone._prefetch_properties = self._prefetch_properties
+        return clone
+
+    def _fetch_all(self):
+        fetched = self._result_cache is not None
+        super(PrefetchPropertiesQuerySetMixin, self)._fetch_all()
+        if not fetched:
+            for name in self._prefetch_properties:
+                loader = self.model.get_property_loader(name)
+                values = loader(self._result_cache)
+                for obj in self._result_cache:
+                    if not hasattr(obj, '_prefetched_properties'):
+                        obj._prefetched_properties = {}
+                    obj._prefetched_properties[name] = values.get(obj.pk, [])
+
+    def prefetch_properties(self, *names):
+        return prefetch_properties(self, *names)
+
+
+class PrefetchedQuerySetMixin(object):
+    """
+    Queryset whose results were computed in bulk (see ``prefetched_queryset()``).
+    """
+    def all(self):
+        clone = super(PrefetchedQuerySetMixin, self).all()
+        clone._result_cache = self._result_cache
+        clone._prefetch_done = self._prefetch_done
+        return clone
+
+
+_mixed_querysets = {}
+
+
+def _mixed_queryset_class(mixin, klass):
+    if issubclass(klass, mixin):
+        return klass
+    if (mixin, klass) not in _mixed_querysets:
+        name = '%s%s' % (mixin.__name__.replace('QuerySetMixin', ''), klass.__name__)
+        _mixed_querysets[(mixin, klass)] = type(name, (mixin, klass), {})
+    return _mixed_querysets[(mixin, klass)]
+
+
+def prefetched_queryset(queryset, objects):
+    """
+    Returns a copy of the queryset, whose results are the specified objects:
+    it is evaluated without querying the database (so are its copies made
+    with ``all()``), while other methods (``filter()``, ``values()``...)
+    still build new querysets.
+    """
+    clone = queryset._clone(klass=_mixed_queryset_class(PrefetchedQuerySetMixin, queryset.__class__))
+    clone._result_cache = list(objects)
+    clone._prefetch_done = True
+    return clone
+
+
+def prefetch_properties(queryset, *names):
+    """
+    Returns a copy of the queryset computing properties added with a bulk
+    loader (see ``AddPropertyMixin.add_property()``) for all objects at once,
+    when evaluated. Other names are ignored (e.g. columns of a list).
+    """
+    model = queryset.model
+    if not issubclass(model, AddPropertyMixin):
+        return queryset
+    prefetched = getattr(queryset, '_prefetch_properties', ())
+    names = [name for name in names if name not in prefetched and model.get_property_loader(name) is not None]
+    if not names:
+        return queryset
+    names = tuple(prefetched) + tuple(names)
+    klass = _mixed_queryset_class(PrefetchPropertiesQuerySetMixin, queryset.__class__)
+    return queryset._clone(klass=klass, _prefetch_properties=names)
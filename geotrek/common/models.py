@@ -1,14 +1,21 @@
 import os
+import logging
 from PIL import Image
 
 from django.conf import settings
 from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.utils.translation import ugettext_lazy as _
 
-from paperclip.models import FileType as BaseFileType
+from paperclip.models import Attachment, FileType as BaseFileType
 
 from geotrek.authent.models import StructureRelated
 from geotrek.common.mixins import PictogramMixin, OptionalPictogramMixin
+from geotrek.common.tasks import generate_thumbnails
+from geotrek.common.utils.thumbnails import forget_thumbnails
+
+logger = logging.getLogger(__name__)
 
 
 class Organism(StructureRelated):
@@ -105,3 +112,24 @@ class TargetPortal(models.Model):
 
     def __unicode__(self):
         return self.name
+
+
+@receiver(post_save, sender=Attachment, dispatch_uid="on_attachment_saved")
+def on_attachment_saved(sender, instance, **kwargs):
+    """ Generate thumbnails of pictures ahead of time, instead of during requests.
+    """
+    if not instance.attachment_file:
+        return
+    forget_thumbnails(instance.attachment_file)
+    try:
+        generate_thumbnails.delay(instance.pk)
+    except Exception as e:
+        # Thumbnails will be generated on first access
+        logger.warning('Thumbnails generation could not be queued.')
+        logger.exception(e)
+
+
+@receiver(post_delete, sender=Attachment, dispatch_uid="on_attachment_deleted")
+def on_attachment_deleted(sender, instance, **kwargs):
+    if instance.attachment_file:
+        forget_thumbnails(instance.attachment_file)
@@ -104,3 +104,23 @@ def import_datas_from_web(class_name, module_name="bulkimport.parsers"):
         'report': parser.report(output_format='html').replace('$celery_id', current_task.request.id),
         'name': current_task.name
     }
+
+
+@shared_task(bind=True, ignore_result=True, name='geotrek.thumbnails.generate')
+def generate_thumbnails(self, attachment_pk):
+    """
+    Generate thumbnails of attached picture ahead of time, so that serializers
+    find their names in cache.
+    """
+    from paperclip.models import Attachment
+    from geotrek.common.utils.thumbnails import PREGENERATED_ALIASES, get_thumbnail
+
+    try:
+        attachment = Attachment.objects.get(pk=attachment_pk)
+    except Attachment.DoesNotExist as e:
+        # Transaction of upload may not be committed yet
+        raise self.retry(exc=e, countdown=10, max_retries=3)
+    if not attachment.is_image:
+        return
+    for alias in PREGENERATED_ALIASES:
+        get_thumbnail(attachment.attachment_file, alias)
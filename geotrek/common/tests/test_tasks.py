@@ -1,9 +1,16 @@
 # -*- encoding: utf-8 -*-
 
 import os
+
+import mock
+from django.core.cache import get_cache
 from django.test import TestCase
+from django.test.utils import override_settings
+from geotrek.common.factories import AttachmentFactory, ThemeFactory
 from geotrek.common.tasks import import_datas
 from geotrek.common.models import FileType
+from geotrek.common.utils.testdata import get_dummy_uploaded_image
+from geotrek.common.utils.thumbnails import thumbnail_cache_key, get_thumbnail_name, FAILURE_TIMEOUT
 
 
 class TasksTest(TestCase):
@@ -34,3 +41,43 @@ class TasksTest(TestCase):
         self.assertEqual(task.result['current'], 100)
         self.assertEqual(task.result['total'], 100)
         self.assertEqual(task.result['name'], 'geotrek.common.import-file')
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+                           'fat': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+                           'thumbnails': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ThumbnailsTaskTest(TestCase):
+    def setUp(self):
+        self.theme = ThemeFactory()
+
+    def tearDown(self):
+        get_cache('thumbnails').clear()
+
+    def test_thumbnails_are_generated_when_picture_is_attached(self):
+        attachment = AttachmentFactory.create(obj=self.theme, attachment_file=get_dummy_uploaded_image())
+        cache = get_cache('thumbnails')
+        for alias in ('medium', 'small-square', 'print'):
+            name = cache.get(thumbnail_cache_key(attachment.attachment_file, alias))
+            self.assertTrue(name.endswith('.png'))
+        with self.assertNumQueries(0):
+            self.assertEqual(get_thumbnail_name(attachment.attachment_file, 'medium'),
+                             cache.get(thumbnail_cache_key(attachment.attachment_file, 'medium')))
+
+    def test_thumbnails_are_not_generated_for_other_files(self):
+        attachment = AttachmentFactory.create(obj=self.theme)
+        cache = get_cache('thumbnails')
+        self.assertIsNone(cache.get(thumbnail_cache_key(attachment.attachment_file, 'medium')))
+
+    def test_thumbnails_are_forgotten_when_attachment_is_deleted(self):
+        attachment = AttachmentFactory.create(obj=self.theme, attachment_file=get_dummy_uploaded_image())
+        attachment.delete()
+        cache = get_cache('thumbnails')
+        self.assertIsNone(cache.get(thumbnail_cache_key(attachment.attachment_file, 'medium')))
+
+    def test_invalid_pictures_are_tried_again(self):
+        attachment = AttachmentFactory.create(obj=self.theme)
+        with mock.patch('geotrek.common.utils.thumbnails.thumbnail_cache') as thumbnail_cache:
+            thumbnail_cache.return_value.get.return_value = None
+            self.assertIsNone(get_thumbnail_name(attachment.attachment_file, 'medium'))
+            thumbnail_cache.return_value.set.assert_called_once_with(
+                thumbnail_cache_key(attachment.attachment_file, 'medium'), '', FAILURE_TIMEOUT)
@@ -129,6 +129,74 @@ def intersecting(cls, obj, distance=None):
     return qs
 
 
+def intersecting_many(cls, objects, **filters):
+    """ Bulk version of ``intersecting()``: returns a dict with the list of ``cls``
+    instances intersecting each of the objects, in two queries. Lists are
+    ordered like ``intersecting()`` querysets. ``filters`` are applied to ``cls``
+    instances (e.g. ``published=True``).
+    """
+    objects = list(objects)
+    result = dict((obj.pk, []) for obj in objects)
+    if not objects:
+        return result
+
+    qs = cls.objects
+    if hasattr(qs, 'existing'):
+        qs = qs.existing()
+    qs = qs.filter(**filters)
+    candidates, candidates_params = qs.order_by().values('pk').query.sql_with_params()
+
+    params = []
+    for obj in objects:
+        params += [obj.pk, obj.distance(cls) or 0]
+    params += list(candidates_params)
+
+    # Geometries are read from tables where they are defined (e.g. topologies)
+    source_field = objects[0]._meta.get_field('geom')
+    target_field = cls._meta.get_field('geom')
+    condition = ''
+    if objects[0].__class__ == cls:
+        # Prevent self intersection
+        condition = 'AND target.{target_pk} != src.id'
+
+    sql = """
+    SELECT src.id, target.{target_pk},
+           CASE WHEN src.distance = 0 AND GeometryType(source.{source_geom}) = 'LINESTRING' THEN
+             (SELECT MIN(ST_Line_Locate_Point(source.{source_geom}, ST_StartPoint(d.geom)))
+              FROM ST_Dump(ST_Intersection(source.{source_geom}, target.{target_geom})) AS d)
+           END AS position
+    FROM (VALUES {values}) AS src(id, distance)
+    JOIN {source_table} source ON source.{source_pk} = src.id
+    JOIN {target_table} target ON ST_DWithin(source.{source_geom}, target.{target_geom}, src.distance)
+    WHERE target.{target_pk} IN ({candidates}) """ + condition
+    sql = sql.format(values=', '.join(['(%s, %s::float)'] * len(objects)),
+                     source_table=source_field.model._meta.db_table,
+                     source_pk=source_field.model._meta.pk.column,
+                     source_geom=source_field.column,
+                     target_table=target_field.model._meta.db_table,
+                     target_pk=target_field.model._meta.pk.column,
+                     target_geom=target_field.column,
+                     candidates=candidates)
+    cursor = connection.cursor()
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+
+    # Without position, keep the default ordering of instances
+    instances = list(qs.filter(pk__in=set(row[1] for row in rows)))
+    rank = dict((instance.pk, i) for i, instance in enumerate(instances))
+    instances = dict((instance.pk, instance) for instance in instances)
+    for source, pk, position in sorted(rows, key=lambda row: (row[2] is None, row[2], rank[row[1]])):
+        result[source].append(instances[pk])
+    return result
+
+
+def intersecting_bulk(cls, **filters):
+    """ Returns the bulk version of ``intersecting()`` for ``add_property()``
+    (see ``intersecting_many()``).
+    """
+    return lambda objects: intersecting_many(cls, objects, **filters)
+
+
 def plain_text_preserve_linebreaks(value):
     value = re.sub(ur'\s*<br\s*/?>\s*', u'##~~~~~~##', value)
     value = re.sub(ur'\s*<p>\s*', u'##~~~~~~####~~~~~~##', value)
@@ -0,0 +1,64 @@
+import hashlib
+import logging
+
+from django.core.cache import get_cache
+from django.utils.translation import ugettext as _
+
+from easy_thumbnails.alias import aliases
+from easy_thumbnails.exceptions import InvalidImageFormatError
+from easy_thumbnails.files import get_thumbnailer
+
+
+logger = logging.getLogger(__name__)
+
+# Generated ahead of time when attachments are saved
+PREGENERATED_ALIASES = ('medium', 'small-square', 'print')
+# Invalid or missing pictures are tried again after this delay (seconds)
+FAILURE_TIMEOUT = 5 * 60
+
+
+def thumbnail_cache():
+    """
+    Names of thumbnails are kept in their own cache, which must be persistent
+    (see ``CACHES`` setting).
+    """
+    return get_cache('thumbnails')
+
+
+def thumbnail_cache_key(attachment_file, alias):
+    name = u'%s:%s' % (attachment_file.name, alias)
+    return 'thumbnail-%s' % hashlib.md5(name.encode('utf-8')).hexdigest()
+
+
+def get_thumbnail(attachment_file, alias):
+    """
+    Returns the thumbnail of the picture, generated if missing or outdated,
+    or None if the picture is invalid or missing from disk. Its name is kept
+    in cache for ``get_thumbnail_name()``, failures only for a short while.
+    """
+    thumbnailer = get_thumbnailer(attachment_file)
+    key = thumbnail_cache_key(attachment_file, alias)
+    try:
+        thumbnail = thumbnailer.get_thumbnail(aliases.get(alias))
+    except InvalidImageFormatError:
+        logger.info(_("Image %s invalid or missing from disk.") % attachment_file)
+        thumbnail_cache().set(key, '', FAILURE_TIMEOUT)
+        return None
+    thumbnail_cache().set(key, thumbnail.name)
+    return thumbnail
+
+
+def get_thumbnail_name(attachment_file, alias):
+    """
+    Returns the name of the thumbnail of the picture, or None if the picture is
+    invalid. The filesystem is not reached unless it is missing from cache.
+    """
+    name = thumbnail_cache().get(thumbnail_cache_key(attachment_file, alias))
+    if name is None:
+        thumbnail = get_thumbnail(attachment_file, alias)
+        name = thumbnail.name if thumbnail else ''
+    return name or None
+
+
+def forget_thumbnails(attachment_file):
+    thumbnail_cache().delete_many([thumbnail_cache_key(attachment_file, alias) for alias in PREGENERATED_ALIASES])
@@ -4,6 +4,7 @@ from django.utils.decorators import method_decorator
 from django.conf import settings
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required, user_passes_test
+from django.db.models.query import QuerySet
 from django.db.utils import DatabaseError
 from django.http import HttpResponse
 from django.utils.translation import ugettext as _
@@ -12,6 +13,7 @@ from mapentity.helpers import api_bbox
 from mapentity import views as mapentity_views
 
 from geotrek.celery import app as celery_app
+from geotrek.common.mixins import prefetch_properties
 from geotrek.common.utils import sql_extent
 from geotrek import __version__
 
@@ -89,6 +91,26 @@ class DocumentPublic(PublicOrReadPermMixin, mapentity_views.MapEntityDocumentWea
         context['mapimage_ratio'] = settings.EXPORT_MAP_IMAGE_SIZE[modelname]
         return context
 
+
+class PrefetchPropertiesMixin(object):
+    """
+    Compute properties listed in columns for all objects at once, when they
+    have a bulk loader (see ``AddPropertyMixin.add_property()``).
+    """
+    def get_queryset(self):
+        qs = super(PrefetchPropertiesMixin, self).get_queryset()
+        if isinstance(qs, QuerySet):
+            qs = prefetch_properties(qs, *self.columns)
+        return qs
+
+
+class MapEntityJsonList(PrefetchPropertiesMixin, mapentity_views.MapEntityJsonList):
+    pass
+
+
+class MapEntityFormat(PrefetchPropertiesMixin, mapentity_views.MapEntityFormat):
+    pass
+
 #
 # Concrete views
 # ..............................
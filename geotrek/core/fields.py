@@ -10,6 +10,7 @@ from django.contrib.gis.forms.fields import LineStringField
 from django.contrib.gis.geos import fromstr, Point, LineString
 
 from .models import Topology, Path
+from .helpers import PathHelper
 from .widgets import PointLineTopologyWidget, SnappedLineStringWidget
 
 
@@ -80,13 +81,15 @@ class SnappedLineStringField(LineStringField):
             snaplist = value.get('snap', [])
             if geom.num_coords != len(snaplist):
                 raise ValueError("Snap list length != %s (%s)" % (geom.num_coords, snaplist))
-            paths = [Path.objects.get(pk=pk) if pk is not None else None
-                     for pk in snaplist]
+            snaplist = [int(pk) if pk is not None else None for pk in snaplist]
             coords = list(geom.coords)
-            for i, (vertex, path) in enumerate(zip(coords, paths)):
-                if path:
-                    # Snap vertex on path
-                    snap = path.snap(Point(*vertex, srid=geom.srid))
+            # Snap vertices on paths, all at once
+            snapped = PathHelper.snap_many([Point(*vertex, srid=geom.srid) for vertex in coords],
+                                           snaplist)
+            for i, (pk, snap) in enumerate(zip(snaplist, snapped)):
+                if pk is not None:
+                    if snap is None:
+                        raise Path.DoesNotExist("Path %s does not exist" % pk)
                     coords[i] = snap.coords
             return LineString(*coords, srid=settings.SRID)
         except (TypeError, Path.DoesNotExist, ValueError) as e:
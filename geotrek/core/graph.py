@@ -1,57 +1,677 @@
+import sys
+import json
 import math
+import uuid
+import heapq
+import struct
+from array import array
+from bisect import bisect_left
 from collections import defaultdict
 
+from django.core.cache import get_cache
+
 
 def path_modifier(path):
     l = 0.0 if math.isnan(path.length) else path.length
     return {"id": path.pk, "length": l}
 
 
-def get_key_optimizer():
-    next_id = iter(xrange(1, 1000000)).next
-    mapping = defaultdict(next_id)
-    return lambda x: mapping[x]
-
-
 def graph_edges_nodes_of_qs(qs):
     """
     return a graph on the form:
     nodes {
-        coord_point_a {
-            coord_point_b: edge_id
+        node_a {
+            node_b: edge_id
         }
     }
     edges {
         edge_id: {
-            nodes: [point_a, point_b, ...]
+            nodes_id: [node_a, node_b]
             ** extra settings (length etc.)
         }
     }
 
 
-    coord_point are tuple of float
+    nodes are integer ids, starting from 1: the shortest edge is kept
+    between two nodes
     """
+    return CompactGraph.from_queryset(qs).as_dict()
 
-    key_modifier = get_key_optimizer()
-    value_modifier = path_modifier
 
-    edges = defaultdict(dict)
-    nodes = defaultdict(dict)
+class NoRouteError(ValueError):
+    pass
+
+
+class RoutingMixin(object):
+    """
+    Shortest path computations, for graphs providing ``edge()``,
+    ``neighbours()`` and ``distance()``.
+    """
+    def shortest_path(self, start, end):
+        """
+        Returns the shortest way between two positions on the network, using
+        A* with the euclidean distance as heuristic.
+
+        ``start`` and ``end`` are ``(path_id, position)`` tuples, ``position``
+        being a fraction ([0.0-1.0]) of the path length.
+
+        Result is a tuple ``(length, [(path_id, start_position, end_position), ...])``.
+        """
+        start_edge, start_pos = start
+        end_edge, end_pos = end
+        try:
+            start_a, start_b, start_length = self.edge(start_edge)
+            end_a, end_b, end_length = self.edge(end_edge)
+        except KeyError as e:
+            raise NoRouteError("Unknown path %s" % e)
+
+        def heuristic(node):
+            return min(self.distance(node, end_a), self.distance(node, end_b))
+
+        # Virtual edges from the last nodes to the end position
+        targets = {}
+        for node, cost, position in ((end_a, end_pos * end_length, 0.0),
+                                     (end_b, (1.0 - end_pos) * end_length, 1.0)):
+            if cost < targets.get(node, (float('inf'),))[0]:
+                targets[node] = (cost, position)
+
+        costs = {}
+        previous = {}
+        queue = []
+        # Virtual edges from the start position to the first nodes
+        for node, cost, position in ((start_a, start_pos * start_length, 0.0),
+                                     (start_b, (1.0 - start_pos) * start_length, 1.0)):
+            if cost < costs.get(node, float('inf')):
+                costs[node] = cost
+                previous[node] = position
+                heapq.heappush(queue, (cost + heuristic(node), cost, node))
+
+        best_cost, best_node = float('inf'), None
+        if start_edge == end_edge:
+            best_cost = abs(end_pos - start_pos) * start_length
+
+        visited = set()
+        while queue:
+            estimate, cost, node = heapq.heappop(queue)
+            if estimate >= best_cost:
+                break
+            if node in visited:
+                continue
+            visited.add(node)
+            if node in targets and cost + targets[node][0] < best_cost:
+                best_cost, best_node = cost + targets[node][0], node
+            for other, edge_id, length in self.neighbours(node):
+                other_cost = cost + length
+                if other_cost < costs.get(other, float('inf')):
+                    costs[other] = other_cost
+                    previous[other] = (node, edge_id)
+                    heapq.heappush(queue, (other_cost + heuristic(other), other_cost, other))
+
+        if best_cost == float('inf'):
+            raise NoRouteError("No route between path %s and path %s" % (start_edge, end_edge))
+        if best_node is None:
+            # Straight along the same path
+            return best_cost, [(start_edge, start_pos, end_pos)]
+
+        # Walk back from last node to first node
+        steps = []
+        node = best_node
+        while isinstance(previous[node], tuple):
+            node, edge_id = previous[node]
+            edge_a = self.edge(edge_id)[0]
+            steps.insert(0, (edge_id, 0.0, 1.0) if node == edge_a else (edge_id, 1.0, 0.0))
+        first = (start_edge, start_pos, previous[node])
+        last = (end_edge, targets[best_node][1], end_pos)
+        # Skip empty extremities (when starting or ending on a node)
+        steps = [s for s in [first] + steps + [last] if s[1] != s[2]]
+        return best_cost, steps or [(start_edge, start_pos, end_pos)]
+
+    def route(self, steps):
+        """
+        Returns the shortest way going through all specified steps, as a
+        list of ``(path_id, position)`` tuples.
+
+        Result is a tuple ``(length, legs)``, each leg being the list of
+        path portions between two consecutive steps.
+        """
+        if len(steps) < 2:
+            raise NoRouteError("At least two steps are required")
+        total, legs = 0.0, []
+        for start, end in zip(steps[:-1], steps[1:]):
+            length, leg = self.shortest_path(start, end)
+            total += length
+            legs.append(leg)
+        return total, legs
+
+
+class PathGraph(RoutingMixin):
+    """
+    In-memory graph of the path network: nodes are path extremities, edges
+    are paths.
+
+    It can be updated incrementally (see ``update()``) without renumbering
+    nodes: a node is identified by its coordinates, and keeps its id even
+    when no path reaches it anymore. Ids start again from 1 only in a new
+    ``generation`` of the graph, built from scratch.
+
+    Parallel edges (e.g. two paths sharing both extremities) are kept,
+    since the shortest one must win.
+    """
+    def __init__(self, generation=None):
+        self.keys = {}  # (x, y) -> node_id
+        self.coords = {}  # node_id -> (x, y)
+        self.edges = {}  # edge_id -> (node_a, node_b, length)
+        self.adjacency = defaultdict(list)  # node_id -> [(node_id, edge_id), ...]
+        self.generation = generation or uuid.uuid4().hex[:12]
+        self.revision = None  # see ``PathChange.since()``
+
+    @classmethod
+    def from_queryset(cls, qs):
+        graph = cls()
+        for path in qs:
+            graph.add_path(path)
+        return graph
 
-    for path in qs:
+    def node_key(self, coord):
+        key = self.keys.get(coord)
+        if key is None:
+            key = self.keys[coord] = len(self.keys) + 1
+            self.coords[key] = coord
+        return key
+
+    def add_path(self, path):
         coords = path.geom.coords
-        start_point, end_point = coords[0], coords[-1]
-        k_start_point, k_end_point = key_modifier(start_point), key_modifier(end_point)
+        node_a, node_b = self.node_key(coords[0][:2]), self.node_key(coords[-1][:2])
+        length = path_modifier(path)['length'] or path.geom.length
+        self.add_edge(path.pk, node_a, node_b, length)
 
-        v_path = value_modifier(path)
-        v_path['nodes_id'] = [k_start_point, k_end_point]
-        edge_id = v_path['id']
+    def add_edge(self, edge_id, node_a, node_b, length):
+        self.edges[edge_id] = (node_a, node_b, length)
+        self.adjacency[node_a].append((node_b, edge_id))
+        if node_a != node_b:
+            self.adjacency[node_b].append((node_a, edge_id))
 
-        nodes[k_start_point][k_end_point] = edge_id
-        nodes[k_end_point][k_start_point] = edge_id
-        edges[edge_id] = v_path
+    def remove_edge(self, edge_id):
+        edge = self.edges.pop(edge_id, None)
+        if edge is None:
+            return
+        for node in set(edge[:2]):
+            self.adjacency[node] = [(o, e) for (o, e) in self.adjacency[node] if e != edge_id]
 
-    return {
-        'edges': dict(edges),
-        'nodes': dict(nodes),
-    }
+    def update(self, modified, removed_ids):
+        """
+        Apply changes of paths: ``modified`` paths replace former edges,
+        edges of ``removed_ids`` are removed.
+        """
+        for edge_id in removed_ids:
+            self.remove_edge(edge_id)
+        for path in modified:
+            self.remove_edge(path.pk)
+            self.add_path(path)
+
+    def edge(self, edge_id):
+        return self.edges[edge_id]
+
+    def neighbours(self, node):
+        for other, edge_id in self.adjacency.get(node, []):
+            yield other, edge_id, self.edges[edge_id][2]
+
+    def distance(self, node_a, node_b):
+        (xa, ya), (xb, yb) = self.coords[node_a], self.coords[node_b]
+        return math.hypot(xb - xa, yb - ya)
+
+
+class CompactGraph(RoutingMixin):
+    """
+    Graph of the path network stored in flat arrays, in a CSR (compressed
+    sparse row) layout:
+
+    * nodes are numbered from 0, ``coords`` holds their ``x, y`` ;
+    * edges are sorted by path id, ``edge_ids``, ``edge_nodes`` (2 per edge)
+      and ``lengths`` being indexed by edge number ;
+    * neighbours of node ``n`` are ``adj_nodes[offsets[n]:offsets[n + 1]]``,
+      reached through edges ``adj_edges[offsets[n]:offsets[n + 1]]``.
+
+    Node ``n`` is node ``n + 1`` of the ``PathGraph`` it was built from, so
+    that ids sent to clients remain the same within a generation.
+
+    These arrays are never modified: changes of paths applied since
+    ``base_revision`` are kept aside, in ``changes`` (edge id to
+    ``(node_a, node_b, length)``, or ``None`` when removed) and
+    ``extra_coords`` (nodes added after the last one of the arrays).
+    They are merged into new arrays by ``compacted()``, once they are
+    too many (see ``needs_compaction``).
+
+    It is much lighter in memory than ``PathGraph``, and can be packed
+    into a binary string (see ``pack()``).
+    """
+    MAGIC = 'GTKG'
+    VERSION = 1
+    HEADER = struct.Struct('<4sIII')  # magic, version, nodes count, edges count
+    # Changes are merged when they exceed this part of the edges
+    COMPACTION_RATIO = 0.05
+    COMPACTION_MIN_CHANGES = 100
+
+    def __init__(self):
+        self.coords = array('d')
+        self.lengths = array('d')
+        self.edge_ids = array('i')
+        self.edge_nodes = array('i')
+        self.offsets = array('i', [0])
+        self.adj_nodes = array('i')
+        self.adj_edges = array('i')
+        self.changes = {}
+        self.extra_coords = array('d')
+        self.generation = None
+        self.revision = None
+        self.base_revision = None
+        self._packed = None
+        self._compacted = None
+        self._json = None
+        self._node_keys = None
+        self._extra_adjacency = None
+
+    @classmethod
+    def from_queryset(cls, qs):
+        return cls.from_graph(PathGraph.from_queryset(qs))
+
+    @classmethod
+    def from_graph(cls, graph):
+        """
+        Build from a ``PathGraph``.
+        """
+        # Nodes ids are contiguous, since nodes are never removed
+        nodes = sorted(graph.coords)
+        node_index = dict((node, node - 1) for node in nodes)
+        edge_ids = sorted(graph.edges)
+        edge_index = dict((edge_id, i) for i, edge_id in enumerate(edge_ids))
+
+        compact = cls()
+        compact.generation = graph.generation
+        compact.revision = compact.base_revision = graph.revision
+        for node in nodes:
+            compact.coords.extend(graph.coords[node])
+            for other, edge_id in graph.adjacency.get(node, []):
+                compact.adj_nodes.append(node_index[other])
+                compact.adj_edges.append(edge_index[edge_id])
+            compact.offsets.append(len(compact.adj_nodes))
+        for edge_id in edge_ids:
+            node_a, node_b, length = graph.edges[edge_id]
+            compact.edge_ids.append(edge_id)
+            compact.edge_nodes.extend((node_index[node_a], node_index[node_b]))
+            compact.lengths.append(length)
+        return compact
+
+    def to_graph(self):
+        """
+        Returns the equivalent ``PathGraph``, changes included.
+        """
+        graph = PathGraph(self.generation)
+        graph.revision = self.revision
+        for node in xrange(self.nodes_count):
+            graph.node_key(self.node_coords(node))
+        for edge_id in self.all_edge_ids():
+            node_a, node_b, length = self.edge(edge_id)
+            graph.add_edge(edge_id, node_a + 1, node_b + 1, length)
+        return graph
+
+    def compacted(self):
+        """
+        Returns the equivalent graph, with changes merged into its arrays.
+        """
+        if not self.changes and not self.extra_coords:
+            return self
+        if self._compacted is None:
+            self._compacted = CompactGraph.from_graph(self.to_graph())
+        return self._compacted
+
+    @property
+    def needs_compaction(self):
+        threshold = max(self.COMPACTION_MIN_CHANGES, self.COMPACTION_RATIO * len(self.edge_ids))
+        return len(self.changes) > threshold
+
+    def with_changes(self, revision, changes, extra_coords):
+        """
+        Returns a graph sharing the arrays of this one, with the given
+        changes since its ``base_revision`` instead of its own.
+        """
+        graph = CompactGraph()
+        for name in ('coords', 'lengths', 'edge_ids', 'edge_nodes', 'offsets', 'adj_nodes', 'adj_edges'):
+            setattr(graph, name, getattr(self, name))
+        graph.generation = self.generation
+        graph.base_revision = self.base_revision
+        graph.revision = revision
+        graph.changes = dict(changes)
+        graph.extra_coords = array('d', extra_coords)
+        graph._packed = self._packed
+        # Nodes of the arrays never move, the lookup can be shared
+        graph._node_keys = self._node_keys
+        return graph
+
+    def updated(self, modified, removed_ids, revision):
+        """
+        Returns the graph with changes of paths applied (see
+        ``PathGraph.update()``), as a new graph sharing the arrays of this
+        one: only changes are copied.
+        """
+        if self._node_keys is None:
+            self._node_keys = dict((self.node_coords(node), node)
+                                   for node in xrange(len(self.offsets) - 1))
+        graph = self.with_changes(revision, self.changes, self.extra_coords)
+        extra_keys = dict((graph.node_coords(node), node)
+                          for node in xrange(len(self.offsets) - 1, graph.nodes_count))
+
+        def node_key(coord):
+            node = graph._node_keys.get(coord, extra_keys.get(coord))
+            if node is None:
+                node = extra_keys[coord] = graph.nodes_count
+                graph.extra_coords.extend(coord)
+            return node
+
+        for edge_id in removed_ids:
+            graph.changes[edge_id] = None
+        for path in modified:
+            coords = path.geom.coords
+            node_a, node_b = node_key(coords[0][:2]), node_key(coords[-1][:2])
+            length = path_modifier(path)['length'] or path.geom.length
+            graph.changes[path.pk] = (node_a, node_b, length)
+        return graph
+
+    @property
+    def nodes_count(self):
+        return len(self.offsets) - 1 + len(self.extra_coords) // 2
+
+    @property
+    def token(self):
+        """
+        Identifies the graph among generations and revisions: this is the
+        revision known by clients.
+        """
+        return '%s/%s' % (self.generation, self.revision)
+
+    def all_edge_ids(self):
+        edge_ids = [edge_id for edge_id in self.edge_ids if edge_id not in self.changes]
+        edge_ids.extend(edge_id for edge_id, edge in self.changes.items() if edge is not None)
+        return sorted(edge_ids)
+
+    def edge_index(self, edge_id):
+        i = bisect_left(self.edge_ids, edge_id)
+        if i == len(self.edge_ids) or self.edge_ids[i] != edge_id:
+            raise KeyError(edge_id)
+        return i
+
+    def edge(self, edge_id):
+        if edge_id in self.changes:
+            edge = self.changes[edge_id]
+            if edge is None:
+                raise KeyError(edge_id)
+            return edge
+        i = self.edge_index(edge_id)
+        return self.edge_nodes[2 * i], self.edge_nodes[2 * i + 1], self.lengths[i]
+
+    def neighbours(self, node):
+        if node < len(self.offsets) - 1:
+            for j in xrange(self.offsets[node], self.offsets[node + 1]):
+                e = self.adj_edges[j]
+                edge_id = self.edge_ids[e]
+                if edge_id not in self.changes:
+                    yield self.adj_nodes[j], edge_id, self.lengths[e]
+        if self._extra_adjacency is None:
+            self._extra_adjacency = defaultdict(list)
+            for edge_id, edge in sorted(self.changes.items()):
+                if edge is not None:
+                    node_a, node_b, length = edge
+                    self._extra_adjacency[node_a].append((node_b, edge_id, length))
+                    if node_a != node_b:
+                        self._extra_adjacency[node_b].append((node_a, edge_id, length))
+        for neighbour in self._extra_adjacency.get(node, []):
+            yield neighbour
+
+    def node_coords(self, node):
+        base_count = len(self.offsets) - 1
+        if node < base_count:
+            return self.coords[2 * node], self.coords[2 * node + 1]
+        node -= base_count
+        return self.extra_coords[2 * node], self.extra_coords[2 * node + 1]
+
+    def distance(self, node_a, node_b):
+        (xa, ya), (xb, yb) = self.node_coords(node_a), self.node_coords(node_b)
+        return math.hypot(xb - xa, yb - ya)
+
+    def editor_edge(self, edge_id):
+        node_a, node_b, length = self.edge(edge_id)
+        return {
+            'id': edge_id,
+            'length': length,
+            'nodes_id': [node_a + 1, node_b + 1],
+        }
+
+    def as_dict(self):
+        """
+        Returns the graph as sent to the topology editor
+        (see ``graph_edges_nodes_of_qs()``).
+        """
+        edges = dict((edge_id, self.editor_edge(edge_id)) for edge_id in self.all_edge_ids())
+        return {
+            'edges': edges,
+            'nodes': editor_nodes(edges),
+        }
+
+    def as_json(self):
+        if self._json is None:
+            self._json = json.dumps(self.as_dict())
+        return self._json
+
+    def delta(self, changed_ids):
+        """
+        Returns the edges among ``changed_ids`` as in ``as_dict()``, and the
+        ids of those which are gone. Nodes are left to the client, since
+        they are given by edges.
+        """
+        edges, deleted = {}, []
+        for edge_id in sorted(set(changed_ids)):
+            try:
+                edges[edge_id] = self.editor_edge(edge_id)
+            except KeyError:
+                deleted.append(edge_id)
+        return {
+            'full': False,
+            'edges': edges,
+            'deleted_edges': deleted,
+        }
+
+    def _arrays(self):
+        # Floats first, to keep them aligned on 8 bytes in packed data
+        return [self.coords, self.lengths, self.edge_ids, self.edge_nodes,
+                self.offsets, self.adj_nodes, self.adj_edges]
+
+    def pack(self):
+        """
+        Returns the graph, changes included, as a binary string: a header
+        followed by the arrays, all little-endian (see ``_arrays()`` for
+        order).
+        """
+        return self.compacted().pack_base()
+
+    def pack_base(self):
+        """
+        Returns the arrays only as a binary string, changes excluded.
+        """
+        if self._packed is not None:
+            return self._packed
+        data = [self.HEADER.pack(self.MAGIC, self.VERSION, len(self.offsets) - 1, len(self.edge_ids))]
+        for values in self._arrays():
+            if sys.byteorder != 'little':
+                values = array(values.typecode, values)
+                values.byteswap()
+            data.append(values.tostring())
+        self._packed = ''.join(data)
+        return self._packed
+
+    @classmethod
+    def unpack(cls, data):
+        try:
+            magic, version, nodes_count, edges_count = cls.HEADER.unpack_from(data)
+        except struct.error as e:
+            raise ValueError("Invalid graph data: %s" % e)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ValueError("Invalid graph data: unknown format")
+        compact = cls()
+        compact.offsets = array('i')
+        # Adjacency arrays sizes are known once offsets are read
+        sizes = [2 * nodes_count, edges_count, edges_count, 2 * edges_count, nodes_count + 1, None, None]
+        position = cls.HEADER.size
+        for values, size in zip(compact._arrays(), sizes):
+            if size is None:
+                size = compact.offsets[-1]
+            end = position + size * values.itemsize
+            if end > len(data):
+                raise ValueError("Invalid graph data: truncated")
+            values.fromstring(data[position:end])
+            if sys.byteorder != 'little':
+                values.byteswap()
+            position = end
+        compact._packed = data
+        return compact
+
+
+def route_serialized(legs, offset=0.0):
+    """
+    Converts legs computed by ``PathGraph.route()`` into the serialized
+    form expected by ``TopologyHelper.deserialize()``: one sub-topology per
+    leg, intermediary markers being the junctions between them.
+    """
+    serialized = []
+    for leg in legs:
+        serialized.append({
+            'offset': offset,
+            'paths': [path_id for path_id, start, end in leg],
+            'positions': dict((i, (start, end)) for i, (path_id, start, end) in enumerate(leg)),
+        })
+    return serialized
+
+
+def editor_nodes(edges):
+    """
+    Returns nodes of the editor graph from its edges: when several edges
+    link the same nodes, the shortest one is kept (as done client-side
+    by ``Geotrek.graphNodes()``).
+    """
+    nodes = defaultdict(dict)
+    for edge_id in sorted(edges):
+        edge = edges[edge_id]
+        node_a, node_b = edge['nodes_id']
+        for node, other in ((node_a, node_b), (node_b, node_a)):
+            current = nodes[node].get(other)
+            if current is None or edge['length'] < edges[current]['length']:
+                nodes[node][other] = edge_id
+    return dict(nodes)
+
+
+def build_graph():
+    """
+    Builds the graph of visible paths from scratch, in a new generation.
+    Returns it along with the id of the current transaction if changes of
+    paths it made (thus uncommitted) are included.
+    """
+    from .models import Path, PathChange
+
+    revision, changed, transaction = PathChange.since()
+    graph = PathGraph.from_queryset(Path.objects.order_by('pk'))
+    graph.revision = revision
+    return CompactGraph.from_graph(graph), transaction
+
+
+def refresh_graph(graph):
+    """
+    Apply changes of paths since the revision of the given ``CompactGraph``.
+    Returns the up-to-date graph (the same one if nothing changed), along
+    with the id of the current transaction if it changed paths itself.
+
+    Changes are applied on top of the arrays of the given graph, which are
+    shared with the returned one (see ``CompactGraph.updated()``).
+    """
+    from .models import Path, PathChange
+
+    revision, changed, transaction = PathChange.since(graph.revision)
+    if not changed:
+        return graph, transaction
+    # Changed paths which are not visible anymore were deleted or hidden
+    modified = list(Path.objects.filter(pk__in=changed))
+    removed = set(changed) - set(path.pk for path in modified)
+    return graph.updated(modified, removed, revision), transaction
+
+
+_worker_graph = None
+# Graph including uncommitted changes, valid within their transaction only
+_transaction_graph = None
+
+
+def cached_path_graph(cache, revision, graph=None):
+    """
+    Returns the graph of the given revision from the fat cache, reusing the
+    arrays of ``graph`` if they are the cached ones. Returns ``graph`` if
+    the cache does not hold this revision anymore.
+
+    The cache holds the packed arrays (``path_graph``) and, next to them,
+    the changes applied since (``path_graph_changes``): the arrays are
+    loaded again only when they were compacted by another process.
+    """
+    changes = cache.get('path_graph_changes')
+    if changes is None or (changes[0], changes[2]) != revision:
+        return graph
+    base_revision = changes[:2]
+    if graph is None or (graph.generation, graph.base_revision) != base_revision:
+        cached = cache.get('path_graph')
+        if cached is None or cached[:2] != base_revision:
+            return graph
+        graph = CompactGraph.unpack(cached[2])
+        graph.generation, graph.revision = base_revision
+        graph.base_revision = graph.revision
+    return graph.with_changes(*changes[2:])
+
+
+def get_path_graph():
+    """
+    Returns the graph of visible paths (a ``CompactGraph``), up-to-date.
+
+    Each process keeps it in memory, and shares it with others through the
+    fat cache, the revision being stored apart. Changes of paths are
+    applied incrementally, and shared without the unchanged arrays: those
+    are merged with changes and packed again only once changes are too
+    many. The graph is built from scratch only the first time.
+    """
+    global _worker_graph, _transaction_graph
+    if _transaction_graph is not None:
+        transaction, graph = _transaction_graph
+        _transaction_graph = None
+        updated, current = refresh_graph(graph)
+        if current == transaction:
+            _transaction_graph = (current, updated)
+            return updated
+
+    cache = get_cache('fat')
+    graph = _worker_graph
+    revision = cache.get('path_graph_revision')
+    if revision is not None and (graph is None or (graph.generation, graph.revision) != revision):
+        graph = cached_path_graph(cache, revision, graph)
+
+    if graph is None:
+        updated, current = build_graph()
+    else:
+        updated, current = refresh_graph(graph)
+    if current is not None:
+        # Changes of the current transaction may still be rolled back
+        _transaction_graph = (current, updated)
+        return updated
+    if updated is not graph:
+        if updated.needs_compaction:
+            updated = updated.compacted()
+        base_revision = (updated.generation, updated.base_revision)
+        if graph is None or (graph.generation, graph.base_revision) != base_revision:
+            cache.set('path_graph', base_revision + (updated.pack_base(),))
+        cache.set('path_graph_changes', base_revision + (updated.revision, updated.changes,
+                                                         updated.extra_coords.tolist()))
+        cache.set('path_graph_revision', (updated.generation, updated.revision))
+    _worker_graph = updated
+    return updated
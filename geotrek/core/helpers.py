@@ -1,12 +1,14 @@
 import json
 import logging
+from contextlib import contextmanager
 
 from django.conf import settings
-from django.db import connection
+from django.db import connection, transaction
 from django.contrib.gis.geos import Point
 from django.db.models.query import QuerySet
+from django.db.models.sql.datastructures import EmptyResultSet
 
-from geotrek.common.utils import sqlfunction, uniquify
+from geotrek.common.utils import sqlfunction
 
 
 logger = logging.getLogger(__name__)
@@ -92,6 +94,10 @@ class TopologyHelper(object):
         PathAggregation.objects.filter(topo_object=topology).delete()
 
         try:
+            # Fetch all paths at once
+            all_paths = Path.objects.in_bulk([int(path_pk) for subtopology in objdict
+                                              for path_pk in subtopology['paths']])
+            aggregations = []
             counter = 0
             for j, subtopology in enumerate(objdict):
                 last_topo = j == len(objdict) - 1
@@ -103,8 +109,10 @@ class TopologyHelper(object):
                     # Javascript hash keys are parsed as a string
                     idx = str(i)
                     start_position, end_position = positions.get(idx, (0.0, 1.0))
-                    path = Path.objects.get(pk=path)
-                    topology.add_path(path, start=start_position, end=end_position, order=counter, reload=False)
+                    if int(path) not in all_paths:
+                        raise Path.DoesNotExist("Path %s does not exist" % path)
+                    path = all_paths[int(path)]
+                    aggregations.append((path, start_position, end_position, counter))
                     if not last_topo and last_path:
                         counter += 1
                         # Intermediary marker.
@@ -126,43 +134,81 @@ class TopologyHelper(object):
                         elif len(paths) == 1:
                             pos = end_position
                         assert pos >= 0, "Invalid position (%s, %s)." % (start_position, end_position)
-                        topology.add_path(path, start=pos, end=pos, order=counter, reload=False)
+                        aggregations.append((path, pos, pos, counter))
                     counter += 1
-        except (AssertionError, ValueError, KeyError, Path.DoesNotExist) as e:
+        except (AssertionError, TypeError, ValueError, KeyError, Path.DoesNotExist) as e:
             raise ValueError("Invalid serialized topology : %s" % e)
+        # Insert aggregations at once, and compute geometry only once
+        topology.add_paths(aggregations, reload=False)
         topology.save()
         return topology
 
     @classmethod
-    def _topologypoint(cls, lng, lat, kind=None, snap=None):
+    def _topologypoint(cls, lng, lat, kind=None, snap=None, radius=None):
         """
         Receives a point (lng, lat) with API_SRID, and returns
         a topology objects with a computed path aggregation.
+        Raises ``Path.DoesNotExist`` if no path is found within ``radius``.
         """
         from .models import Path, PathAggregation
         from .factories import TopologyFactory
-        # Find closest path
+        # Find closest path (or snapped path), and position along it
         point = Point(lng, lat, srid=settings.API_SRID)
         point.transform(settings.SRID)
-        if snap is None:
-            closest = Path.closest(point)
-            position, offset = closest.interpolate(point)
-        else:
-            closest = Path.objects.get(pk=snap)
-            position, offset = closest.interpolate(point)
+        closest = PathHelper.interpolate_many([point], [snap], radius)[0]
+        if closest is None:
+            raise Path.DoesNotExist("No path found for point %s" % point)
+        path_id, position, offset = closest
+        if snap is not None:
             offset = 0
         # We can now instantiante a Topology object
         topology = TopologyFactory.create(no_path=True, kind=kind, offset=offset)
         aggrobj = PathAggregation(topo_object=topology,
                                   start_position=position,
                                   end_position=position,
-                                  path=closest)
+                                  path_id=path_id)
         aggrobj.save()
         point = Point(point.x, point.y, srid=settings.SRID)
         topology.geom = point
         topology.save()
         return topology
 
+    @classmethod
+    def create_points(cls, topologies, points, radius=None, **filters):
+        """
+        Bulk version of ``_topologypoint()``: saves the given (unsaved) point
+        topologies, attached to the paths closest to the given points (with
+        ``API_SRID`` if not specified). Points are snapped with a single query,
+        aggregations inserted at once, and geometries computed once.
+
+        Returns the list of topologies saved (``None`` if no path was
+        found within ``radius``). See ``PathHelper._nearest_sql()`` for filters.
+        """
+        from .models import Topology, PathAggregation
+
+        points = [p if p.srid else Point(p.x, p.y, srid=settings.API_SRID) for p in points]
+        points = [p.transform(settings.SRID, clone=True) if p.srid != settings.SRID else p
+                  for p in points]
+        located = PathHelper.interpolate_many(points, radius=radius, **filters)
+        created = []
+        aggregations = []
+        for topology, point, closest in zip(topologies, points, located):
+            if closest is None:
+                created.append(None)
+                continue
+            path_id, position, offset = closest
+            topology.offset = offset
+            topology.geom = Point(point.x, point.y, srid=settings.SRID)
+            topology.save()
+            aggregations.append(PathAggregation(topo_object=topology,
+                                                start_position=position,
+                                                end_position=position,
+                                                path_id=path_id))
+            created.append(topology)
+        if aggregations:
+            Topology.bulk_create_aggregations(aggregations)
+        return created
+
     @classmethod
     def serialize(cls, topology, with_pk=True):
         # Point topology
@@ -200,63 +246,136 @@ class TopologyHelper(object):
                     ipath = 0
         return json.dumps(objdict)
 
+    # Aggregations ``a`` overlapping aggregations ``source`` of source topologies,
+    # and their rank along source topologies
+    OVERLAPPING_SQL = """
+        FROM %(aggregations_table)s a, %(aggregations_table)s source
+        WHERE source.evenement IN (%(sources)s)
+          AND a.troncon = source.troncon
+          AND least(a.pk_debut, a.pk_fin) <= greatest(source.pk_debut, source.pk_fin)
+          AND greatest(a.pk_debut, a.pk_fin) >= least(source.pk_debut, source.pk_fin)
+    """
+    OVERLAPPING_RANK = ("source.ordre + CASE WHEN source.pk_debut > source.pk_fin"
+                        " THEN (1 - a.pk_debut) ELSE a.pk_debut END")
+
+    @classmethod
+    def _overlapping_sql(cls, sources):
+        """
+        Returns SQL and parameters of aggregations overlapping ``sources``, a
+        topology, a queryset or a list of topologies.
+        """
+        from .models import PathAggregation
+
+        if isinstance(sources, QuerySet):
+            subquery, params = sources.values('pk').query.sql_with_params()
+        else:
+            if not isinstance(sources, (list, tuple)):
+                sources = [sources]
+            params = [topology.pk for topology in sources]
+            subquery = ', '.join(['%s'] * len(params))
+        sql = cls.OVERLAPPING_SQL % {
+            'aggregations_table': PathAggregation._meta.db_table,
+            'sources': subquery,
+        }
+        return sql, list(params)
+
     @classmethod
     def overlapping(cls, klass, queryset):
-        from .models import Path, Topology, PathAggregation
+        """
+        Returns a queryset of ``klass`` topologies overlapping the specified
+        topology (or queryset of topologies), ordered by progression along it.
+        """
+        from .models import Topology
 
         all_objects = klass.objects.existing()
         is_generic = klass.KIND == Topology.KIND
-        single_input = isinstance(queryset, QuerySet)
 
-        if single_input:
-            topology_pks = [str(pk) for pk in queryset.values_list('pk', flat=True)]
-        else:
-            topology_pks = [str(queryset.pk)]
-
-        if len(topology_pks) == 0:
-            return all_objects.filter(pk__in=[])
-
-        sql = """
-        WITH topologies AS (SELECT id FROM %(topology_table)s WHERE id IN (%(topology_list)s)),
-        -- Concerned aggregations
-             aggregations AS (SELECT * FROM %(aggregations_table)s a, topologies t
-                              WHERE a.evenement = t.id),
-        -- Concerned paths along with (start, end)
-             paths_aggr AS (SELECT a.pk_debut AS start, a.pk_fin AS end, p.id, a.ordre AS order
-                            FROM %(paths_table)s p, aggregations a
-                            WHERE a.troncon = p.id
-                            ORDER BY a.ordre)
-        -- Retrieve primary keys
-        SELECT t.id
-        FROM %(topology_table)s t, %(aggregations_table)s a, paths_aggr pa
-        WHERE a.troncon = pa.id AND a.evenement = t.id
-          AND least(a.pk_debut, a.pk_fin) <= greatest(pa.start, pa.end)
-          AND greatest(a.pk_debut, a.pk_fin) >= least(pa.start, pa.end)
-          AND %(extra_condition)s
-        ORDER BY (pa.order + CASE WHEN pa.start > pa.end THEN (1 - a.pk_debut) ELSE a.pk_debut END);
-        """ % {
-            'topology_table': Topology._meta.db_table,
-            'aggregations_table': PathAggregation._meta.db_table,
-            'paths_table': Path._meta.db_table,
-            'topology_list': ','.join(topology_pks),
-            'extra_condition': 'true' if is_generic else "kind = '%s'" % klass.KIND
-        }
+        try:
+            sql, params = cls._overlapping_sql(queryset)
+        except EmptyResultSet:
+            return all_objects.none()
+        table = Topology._meta.db_table
+        # Rank of a topology is its first position along sources
+        ordering = "SELECT MIN(%s) %s AND a.evenement = %s.id" % (cls.OVERLAPPING_RANK, sql, table)
+        condition = "%s.id IN (SELECT a.evenement %s)" % (table, sql)
+
+        queryset = all_objects.extra(select={'ordering': ordering}, select_params=params,
+                                     where=[condition], params=params,
+                                     order_by=('ordering',))
+        if not is_generic:
+            queryset = queryset.filter(kind=klass.KIND)
+        return queryset
 
+    @classmethod
+    def overlapping_many(cls, klass, topologies, queryset=None):
+        """
+        Bulk version of ``overlapping()``: returns a dict with the list of ``klass``
+        topologies overlapping each of the specified topologies, in two queries.
+        They can be restricted with ``queryset``.
+        """
+        from .models import Topology
+
+        topologies = list(topologies)
+        result = dict((topology.pk, []) for topology in topologies)
+        if not topologies:
+            return result
+
+        sql, params = cls._overlapping_sql(topologies)
+        condition = "NOT supprime"
+        if klass.KIND != Topology.KIND:
+            condition += " AND kind = %s"
+            params.append(klass.KIND)
         cursor = connection.cursor()
-        cursor.execute(sql)
-        result = cursor.fetchall()
-        pk_list = uniquify([row[0] for row in result])
-
-        # Return a QuerySet and preserve pk list order
-        # http://stackoverflow.com/a/1310188/141895
-        ordering = 'CASE %s END' % ' '.join(['WHEN %s.id=%s THEN %s' % (Topology._meta.db_table, id_, i)
-                                             for i, id_ in enumerate(pk_list)])
-        queryset = all_objects.filter(pk__in=pk_list).extra(
-            select={'ordering': ordering}, order_by=('ordering',))
-        return queryset
+        cursor.execute("""
+        SELECT source.evenement, a.evenement, MIN(%(rank)s) AS rank
+        %(overlapping)s
+          AND a.evenement IN (SELECT id FROM %(topology_table)s WHERE %(condition)s)
+        GROUP BY source.evenement, a.evenement
+        ORDER BY source.evenement, rank
+        """ % {'rank': cls.OVERLAPPING_RANK,
+               'overlapping': sql,
+               'topology_table': Topology._meta.db_table,
+               'condition': condition}, params)
+        rows = cursor.fetchall()
+
+        if queryset is None:
+            queryset = klass.objects
+        objects = queryset.in_bulk(set(row[1] for row in rows))
+        for source, pk, rank in rows:
+            if pk in objects:
+                result[source].append(objects[pk])
+        return result
+
+    @classmethod
+    def path_topologies_many(cls, queryset, paths):
+        """
+        Returns a dict with the list of topologies of ``queryset`` along each of
+        the specified paths, in two queries. Lists follow the ordering of
+        ``queryset``, or primary keys (as with ``distinct('pk')``), and hold
+        each topology once.
+        """
+        pks = [getattr(path, 'pk', path) for path in paths]
+        result = dict((pk, []) for pk in pks)
+        if not pks:
+            return result
+
+        if not queryset.ordered:
+            queryset = queryset.order_by('pk')
+        rows = list(queryset.filter(aggregations__path__in=pks)
+                            .values_list('aggregations__path', 'pk'))
+        objects = queryset.in_bulk(set(pk for path, pk in rows))
+        seen = set()
+        for path, pk in rows:
+            if (path, pk) not in seen:
+                seen.add((path, pk))
+                result[path].append(objects[pk])
+        return result
 
 
 class PathHelper(object):
+    # Number of extra paths examined to bound the search of nearest paths
+    KNN_CANDIDATES = 10
+
     @classmethod
     def snap(cls, path, point):
         if not path.pk:
@@ -293,6 +412,169 @@ class PathHelper(object):
         result = cursor.fetchall()
         return result[0]
 
+    @classmethod
+    def _points_sql(cls, points, paths):
+        """
+        Returns a SQL query of points, with their index (starting from 1) and
+        optional path id, along with its parameters.
+        """
+        points = [p if p.srid == settings.SRID else p.transform(settings.SRID, clone=True)
+                  for p in points]
+        sql = """
+        SELECT i, (%(pks)s::integer[])[i] AS pk,
+               ST_SetSRID(ST_MakePoint((%(xs)s::float[])[i], (%(ys)s::float[])[i]), %(srid)s) AS geom
+        FROM generate_series(1, %(count)s) AS i
+        """
+        params = {'xs': [p.x for p in points],
+                  'ys': [p.y for p in points],
+                  'pks': list(paths) if paths is not None else [None] * len(points),
+                  'srid': settings.SRID,
+                  'count': len(points)}
+        return sql, params
+
+    @classmethod
+    def snap_many(cls, points, paths):
+        """
+        Batch version of ``snap()``, in a single query: returns the points
+        snapped on the paths specified by their ids (``None`` if the path
+        does not exist or is not visible, as with ``Path.objects``).
+        """
+        from .models import Path
+
+        if not points:
+            return []
+        points_sql, params = cls._points_sql(points, paths)
+        sql = """
+        WITH points AS (%(points)s)
+        SELECT s.i, ST_X(s.geom), ST_Y(s.geom)
+        FROM (SELECT p.i, ST_ClosestPoint(t.geom, p.geom) AS geom
+              FROM points p, %(table)s t
+              WHERE t.id = p.pk AND t.visible) AS s
+        """ % {'points': points_sql, 'table': Path._meta.db_table}
+        cursor = connection.cursor()
+        cursor.execute(sql, params)
+        result = [None] * len(points)
+        for i, x, y in cursor.fetchall():
+            result[i - 1] = Point(x, y, srid=settings.SRID)
+        return result
+
+    @classmethod
+    def _nearest_sql(cls, count=1, radius=None, visible=True, valid=None, structure=None):
+        """
+        Returns a correlated subquery of the ids of the ``count`` paths nearest
+        to ``p.geom`` (ordered by distance), along with its parameters.
+
+        Paths are looked up within ``radius`` if specified, and can be
+        filtered on ``visible``, ``valid`` and ``structure``.
+
+        The KNN operator ``<->`` of the spatial index compares bounding boxes
+        (their centroids before PostGIS 2.2), so that a long path can be
+        missed among its nearest results. It is only used to bound the search:
+        the distance of the ``count``-th nearest of these candidates is a
+        radius within which the nearest paths are looked up exactly.
+        """
+        from .models import Path
+
+        conditions = ['true']
+        params = {'nearest_count': count,
+                  'nearest_candidates': count + cls.KNN_CANDIDATES}
+        if visible is not None:
+            conditions.append('visible = %(nearest_visible)s')
+            params['nearest_visible'] = visible
+        if valid is not None:
+            conditions.append('valide = %(nearest_valid)s')
+            params['nearest_valid'] = valid
+        if structure is not None:
+            conditions.append('structure = %(nearest_structure)s')
+            params['nearest_structure'] = getattr(structure, 'pk', structure)
+        if radius is not None:
+            conditions.append('ST_DWithin(geom, p.geom, %(nearest_radius)s)')
+            params['nearest_radius'] = radius
+        sql = """
+        SELECT id FROM %(table)s
+        WHERE %(conditions)s
+          AND ST_DWithin(geom, p.geom, (
+              SELECT max(knn.distance) FROM (
+                  SELECT ST_Distance(c.geom, p.geom) AS distance
+                  FROM (SELECT geom FROM %(table)s
+                        WHERE %(conditions)s
+                        ORDER BY geom <-> p.geom LIMIT %%(nearest_candidates)s) AS c
+                  ORDER BY distance LIMIT %%(nearest_count)s) AS knn))
+        ORDER BY ST_Distance(geom, p.geom), id LIMIT %%(nearest_count)s
+        """ % {'table': Path._meta.db_table,
+               'conditions': ' AND '.join(conditions)}
+        return sql, params
+
+    @classmethod
+    def nearest_many(cls, points, count=1, radius=None, **filters):
+        """
+        Returns, for each point, the list of the ``count`` nearest paths as
+        ``(path_id, distance)`` tuples, in a single query.
+        See ``_nearest_sql()`` for ``radius`` and filters.
+        """
+        from .models import Path
+
+        if not points:
+            return []
+        points_sql, params = cls._points_sql(points, None)
+        nearest_sql, nearest_params = cls._nearest_sql(count, radius, **filters)
+        params.update(nearest_params)
+        sql = """
+        WITH points AS (%(points)s),
+             nearest AS (
+                SELECT p.i, p.geom, ARRAY(%(nearest)s) AS pks
+                FROM points p),
+             ranked AS (
+                SELECT i, geom, pks, generate_subscripts(pks, 1) AS rank
+                FROM nearest)
+        SELECT r.i, t.id, ST_Distance(t.geom, r.geom)
+        FROM ranked r, %(table)s t
+        WHERE t.id = r.pks[r.rank]
+        ORDER BY r.i, r.rank
+        """ % {'points': points_sql, 'nearest': nearest_sql, 'table': Path._meta.db_table}
+        cursor = connection.cursor()
+        cursor.execute(sql, params)
+        result = [[] for point in points]
+        for i, pk, distance in cursor.fetchall():
+            result[i - 1].append((pk, distance))
+        return result
+
+    @classmethod
+    def interpolate_many(cls, points, paths=None, radius=None, **filters):
+        """
+        Batch version of ``Path.closest()`` followed by ``interpolate()``, in a
+        single query: returns a ``(path_id, position, distance)`` tuple for each
+        point (``None`` if no path was found).
+
+        ``paths`` optionally gives, for each point, the id of the path to use
+        instead of the closest one, which must be visible (as with
+        ``Path.objects``). See ``_nearest_sql()`` for ``radius`` and filters.
+        """
+        from .models import Path
+
+        if not points:
+            return []
+        points_sql, params = cls._points_sql(points, paths)
+        nearest_sql, nearest_params = cls._nearest_sql(1, radius, **filters)
+        params.update(nearest_params)
+        sql = """
+        WITH points AS (%(points)s),
+             closest AS (
+                SELECT p.i, p.geom, p.pk IS NOT NULL AS specified, COALESCE(p.pk, (%(nearest)s)) AS pk
+                FROM points p),
+             interpolated AS (
+                SELECT c.i, t.id, ft_interpolate_along(t.geom, c.geom) AS r
+                FROM closest c, %(table)s t
+                WHERE t.id = c.pk AND (t.visible OR NOT c.specified))
+        SELECT i, id, (r).position, (r).distance FROM interpolated
+        """ % {'points': points_sql, 'nearest': nearest_sql, 'table': Path._meta.db_table}
+        cursor = connection.cursor()
+        cursor.execute(sql, params)
+        result = [None] * len(points)
+        for i, pk, position, distance in cursor.fetchall():
+            result[i - 1] = (pk, position, distance)
+        return result
+
     @classmethod
     def disjoint(cls, geom, pk):
         """
@@ -303,3 +585,33 @@ class PathHelper(object):
         wkt = "ST_GeomFromText('%s', %s)" % (geom, settings.SRID)
         disjoint = sqlfunction('SELECT * FROM check_path_not_overlap', str(pk), wkt)
         return disjoint[0]
+
+
+@contextmanager
+def deferred_topology_update(process=True):
+    """
+    Within this block, changes of paths and path aggregations do not
+    compute geometry of related topologies: they are queued instead, and
+    computed only once when leaving the block (all of it runs in a single
+    transaction).
+
+    If ``process`` is False, queued topologies are left to the
+    ``update_topologies`` management command (e.g. run periodically).
+
+    /!\\ Topologies instances in memory are not reloaded.
+    """
+    from .models import PendingTopologyUpdate
+
+    cursor = connection.cursor()
+    cursor.execute("SELECT ft_defer_topology_update()")
+    if cursor.fetchone()[0]:
+        # Already deferred by an enclosing block
+        yield
+        return
+
+    with transaction.atomic():
+        cursor.execute("SET LOCAL geotrek.defer_topology_update = 'on'")
+        yield
+        cursor.execute("SET LOCAL geotrek.defer_topology_update = 'off'")
+        if process:
+            PendingTopologyUpdate.process()
@@ -0,0 +1,48 @@
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from geotrek.core.models import Path, Topology
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Measure queries count and duration of saving existing paths and topologies (changes are rolled back)"
+
+    option_list = BaseCommand.option_list + (
+        make_option('--count', '-n', action='store', dest='count', type='int', default=100,
+                    help='Number of objects saved per model'),
+    )
+
+    def handle(self, *args, **options):
+        count = options['count']
+        if count <= 0:
+            raise CommandError('Count must be positive')
+        for model in (Path, Topology):
+            objects = list(model._default_manager.order_by('pk')[:count])
+            if not objects:
+                self.stdout.write('%s: no object to save' % model._meta.verbose_name)
+                continue
+            queries, duration = self.benchmark(objects)
+            self.stdout.write('%s: %.1f queries, %.2f ms per save (%s objects)' % (
+                model._meta.verbose_name, float(queries) / len(objects),
+                duration * 1000 / len(objects), len(objects)))
+
+    def benchmark(self, objects):
+        try:
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.time()
+                    for obj in objects:
+                        obj.save()
+                    duration = time.time() - start
+                raise Rollback
+        except Rollback:
+            pass
+        return len(captured), duration
@@ -0,0 +1,16 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from geotrek.core.models import PendingTopologyUpdate
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Compute geometry of topologies queued by deferred updates"
+
+    def handle(self, *args, **options):
+        count = PendingTopologyUpdate.process()
+        logger.info("%s topologies updated." % count)
@@ -5,7 +5,7 @@ import functools
 from django.contrib.gis.db import models
 from django.conf import settings
 from django.utils.translation import ugettext_lazy as _
-from django.contrib.gis.geos import fromstr, LineString
+from django.contrib.gis.geos import fromstr, LineString, GEOSGeometry
 
 from mapentity.models import MapEntityMixin
 
@@ -16,8 +16,8 @@ from geotrek.common.utils import classproperty
 from geotrek.common.utils.postgresql import debug_pg_notices
 from geotrek.altimetry.models import AltimetryMixin
 
-from .helpers import PathHelper, TopologyHelper
-from django.db import connections, DEFAULT_DB_ALIAS
+from .helpers import PathHelper, TopologyHelper, deferred_topology_update
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
 
 
 logger = logging.getLogger(__name__)
@@ -39,13 +39,114 @@ class PathInvisibleManager(models.GeoManager):
     def get_queryset(self):
         return super(PathInvisibleManager, self).get_queryset()
 
+
+class UpdateReturningMixin(object):
+    """
+    Write the model table with ``UPDATE ... RETURNING``, in order to refresh
+    values computed by triggers within the same query, instead of fetching
+    the whole object again (see ``refresh()``).
+    """
+    # Fields computed by triggers, only written if listed in ``update_fields``
+    computed_fields = ()
+    # Fields refreshed from the updated row
+    returned_fields = ()
+    # Fields whose change fires an ``AFTER`` trigger modifying the row again:
+    # returned values are outdated then, and the object has to be reloaded
+    after_trigger_fields = ()
+
+    def update_assignment(self, field, placeholder, value):
+        """
+        Returns SQL expression and parameters assigned to the column of ``field``.
+        """
+        return placeholder, [value]
+
+    # Django private API: ``Model._do_update()`` (Django 1.6) is the only step
+    # of ``save()`` running the UPDATE query, once values are collected as
+    # ``(field, model, value)`` tuples. Its signature is checked by tests
+    # (see ``TopologySaveTest``), the rest is done by ``update_returning()``.
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        # Parents and children tables (multi-table inheritance) are updated separately
+        model = base_qs.model
+        if not values or not any(f.attname in self.returned_fields for f in model._meta.local_fields):
+            return super(UpdateReturningMixin, self)._do_update(base_qs, using, pk_val, values,
+                                                                update_fields, forced_update)
+        return self.update_returning(model, using, pk_val, values, update_fields)
+
+    def update_returning(self, model, using, pk_val, values, update_fields=None):
+        """
+        Writes ``values`` (``(field, model, value)`` tuples) to the row of
+        ``pk_val`` in the table of ``model``, and refreshes the fields of
+        ``returned_fields`` defined there. Returns ``False`` if the row does
+        not exist.
+        """
+        returned = [f for f in model._meta.local_fields if f.attname in self.returned_fields]
+        connection = connections[using]
+        qn = connection.ops.quote_name
+        table = qn(model._meta.db_table)
+        pk = qn(model._meta.pk.column)
+
+        assignments = []
+        params = []
+        for field, field_model, value in values:
+            explicit = update_fields is not None and (field.name in update_fields or
+                                                      field.attname in update_fields)
+            if field.attname in self.computed_fields and not explicit:
+                continue
+            if hasattr(field, 'get_placeholder'):
+                placeholder = field.get_placeholder(value, connection)
+            else:
+                placeholder = '%s'
+            value = field.get_db_prep_save(value, connection=connection)
+            expression, expression_params = self.update_assignment(field, placeholder, value)
+            assignments.append('%s = %s' % (qn(field.column), expression))
+            params.extend(expression_params)
+
+        if not assignments:
+            assignments.append('%s = %s' % (pk, pk))
+
+        # Previous values are read in the statement snapshot, i.e. before update
+        watched = [f for f in model._meta.local_fields if f.attname in self.after_trigger_fields]
+        changed = ' OR '.join(['previous.%(col)s::text IS DISTINCT FROM %(table)s.%(col)s::text'
+                               % {'table': table, 'col': qn(f.column)} for f in watched]) or 'false'
+        sql = ('UPDATE %(table)s SET %(assignments)s'
+               ' FROM (SELECT %(columns)s FROM %(table)s WHERE %(pk)s = %%s) AS previous'
+               ' WHERE %(table)s.%(pk)s = previous.%(pk)s'
+               ' RETURNING %(returned)s, %(changed)s') % {
+            'table': table,
+            'pk': pk,
+            'assignments': ', '.join(assignments),
+            'columns': ', '.join([pk] + [qn(f.column) for f in watched]),
+            'returned': ', '.join(['%s.%s' % (table, qn(f.column)) for f in returned]),
+            'changed': changed,
+        }
+        cursor = connection.cursor()
+        cursor.execute(sql, params + [pk_val])
+        row = cursor.fetchone()
+        if row is None:
+            return False
+        for field, value in zip(returned, row):
+            if value is not None and isinstance(field, models.GeometryField):
+                value = GEOSGeometry(value)
+            setattr(self, field.attname, value)
+        self._outdated = row[-1]
+        return True
+
+    def refresh(self):
+        """
+        Reload computed values, unless they were returned by the last update.
+        """
+        if self.__dict__.pop('_outdated', True):
+            self.reload()
+        return self
+
+
 # GeoDjango note:
 # Django automatically creates indexes on geometry fields but it uses a
 # syntax which is not compatible with PostGIS 2.0. That's why index creation
 # is explicitly disbaled here (see manual index creation in custom SQL files).
 
 
-class Path(AddPropertyMixin, MapEntityMixin, AltimetryMixin,
+class Path(UpdateReturningMixin, AddPropertyMixin, MapEntityMixin, AltimetryMixin,
            TimeStampedModelMixin, StructureRelated):
     geom = models.LineStringField(srid=settings.SRID, spatial_index=False)
     geom_cadastre = models.LineStringField(null=True, srid=settings.SRID, spatial_index=False,
@@ -86,6 +187,11 @@ class Path(AddPropertyMixin, MapEntityMixin, AltimetryMixin,
 
     is_reversed = False
 
+    computed_fields = ['geom_3d'] + AltimetryMixin.COLUMNS
+    returned_fields = ['geom', 'date_insert', 'date_update'] + computed_fields
+    # Path may be split by triggers when its geometry changes
+    after_trigger_fields = ['geom']
+
     @property
     def length_2d(self):
         if self.geom:
@@ -110,15 +216,29 @@ class Path(AddPropertyMixin, MapEntityMixin, AltimetryMixin,
         verbose_name_plural = _(u"Paths")
 
     @classmethod
-    def closest(cls, point):
+    def nearest(cls, point, count=1, radius=None, **filters):
+        """
+        Returns the ``count`` nearest paths of the point, ordered by distance
+        (available as ``distance`` attribute). Only paths within ``radius``
+        are considered if specified. Paths can be filtered on ``visible``
+        (default ``True``), ``valid`` and ``structure``.
         """
-        Returns the closest path of the point.
+        nearest = PathHelper.nearest_many([point], count, radius, **filters)[0]
+        paths = cls.include_invisible.in_bulk([pk for pk, distance in nearest])
+        result = []
+        for pk, distance in nearest:
+            path = paths[pk]
+            path.distance = distance
+            result.append(path)
+        return result
+
+    @classmethod
+    def closest(cls, point, radius=None, **filters):
+        """
+        Returns the closest path of the point (see ``nearest()``).
         Will fail if no path in database.
         """
-        # TODO: move to custom manager
-        if point.srid != settings.SRID:
-            point = point.transform(settings.SRID, clone=True)
-        return cls.objects.all().exclude(visible=False).distance(point).order_by('distance')[0]
+        return cls.nearest(point, 1, radius, **filters)[0]
 
     def is_overlap(self):
         return not PathHelper.disjoint(self.geom, self.pk)
@@ -148,8 +268,8 @@ class Path(AddPropertyMixin, MapEntityMixin, AltimetryMixin,
 
     def reload(self, fromdb=None):
         # Update object's computed values (reload from database)
-        if self.pk and self.visible:
-            fromdb = self.__class__.objects.get(pk=self.pk)
+        if self.pk:
+            fromdb = Path.include_invisible.only(*self.returned_fields).get(pk=self.pk)
             self.geom = fromdb.geom
             AltimetryMixin.reload(self, fromdb)
             TimeStampedModelMixin.reload(self, fromdb)
@@ -157,15 +277,18 @@ class Path(AddPropertyMixin, MapEntityMixin, AltimetryMixin,
 
     @debug_pg_notices
     def save(self, *args, **kwargs):
-        # If the path was reversed, we have to invert related topologies
-        if self.is_reversed:
-            for aggr in self.aggregations.all():
-                aggr.start_position = 1 - aggr.start_position
-                aggr.end_position = 1 - aggr.end_position
-                aggr.save()
-            self._is_reversed = False
-        super(Path, self).save(*args, **kwargs)
-        self.reload()
+        # Related topologies are computed once, even if the path is
+        # reversed or split (i.e. their aggregations are modified many times)
+        with deferred_topology_update():
+            # If the path was reversed, we have to invert related topologies
+            if self.is_reversed:
+                for aggr in self.aggregations.all():
+                    aggr.start_position = 1 - aggr.start_position
+                    aggr.end_position = 1 - aggr.end_position
+                    aggr.save()
+                self._is_reversed = False
+            super(Path, self).save(*args, **kwargs)
+        self.refresh()
 
     @property
     def name_display(self):
@@ -184,14 +307,14 @@ class Path(AddPropertyMixin, MapEntityMixin, AltimetryMixin,
 
     @property
     def trails_display(self):
-        trails = getattr(self, '_trails', self.trails)
+        trails = self.trails
         if trails:
             return ", ".join([t.name_display for t in trails])
         return _("None")
 
     @property
     def trails_csv_display(self):
-        trails = getattr(self, '_trails', self.trails)
+        trails = self.trails
         if trails:
             return ", ".join([unicode(t) for t in trails])
         return _("None")
@@ -234,7 +357,7 @@ class Path(AddPropertyMixin, MapEntityMixin, AltimetryMixin,
             return result
 
 
-class Topology(AddPropertyMixin, AltimetryMixin, TimeStampedModelMixin, NoDeleteMixin):
+class Topology(UpdateReturningMixin, AddPropertyMixin, AltimetryMixin, TimeStampedModelMixin, NoDeleteMixin):
     paths = models.ManyToManyField(Path, db_column='troncons', through='PathAggregation', verbose_name=_(u"Path"))
     offset = models.FloatField(default=0.0, db_column='decallage', verbose_name=_(u"Offset"))  # in SRID units
     kind = models.CharField(editable=False, verbose_name=_(u"Kind"), max_length=32)
@@ -249,6 +372,12 @@ class Topology(AddPropertyMixin, AltimetryMixin, TimeStampedModelMixin, NoDelete
     """ Fake srid attribute, that prevents transform() calls when using Django map widgets. """
     srid = settings.API_SRID
 
+    computed_fields = ['geom_3d'] + AltimetryMixin.COLUMNS
+    returned_fields = ['geom', 'offset', 'deleted', 'date_insert', 'date_update'] + computed_fields
+    # Geometry and altimetry are computed again by a trigger when offset is
+    # written, and only differ from returned values if offset or geom changed
+    after_trigger_fields = ['offset', 'geom']
+
     class Meta:
         db_table = 'e_t_evenement'
         verbose_name = _(u"Topology")
@@ -307,12 +436,64 @@ class Topology(AddPropertyMixin, AltimetryMixin, TimeStampedModelMixin, NoDelete
             self.reload()
         return aggr
 
+    def add_paths(self, aggregations, reload=True):
+        """
+        Bulk version of ``add_path()``, for a list of ``(path, start, end, order)``.
+        Aggregations are inserted at once, and topology geometry is computed
+        only once.
+        """
+        aggrs = [PathAggregation(topo_object=self, path=path, start_position=start,
+                                 end_position=end, order=order)
+                 for (path, start, end, order) in aggregations]
+        if not aggrs:
+            return aggrs
+        self.bulk_create_aggregations(aggrs)
+
+        if self.deleted:
+            self.deleted = False
+            self.save(update_fields=['deleted'])
+
+        if reload:
+            self.reload()
+        return aggrs
+
+    @classmethod
+    def bulk_create_aggregations(cls, aggregations):
+        """
+        Insert ``PathAggregation`` objects at once, and compute geometry of
+        their topologies only once.
+        """
+        topologies = list(set(aggr.topo_object_id for aggr in aggregations))
+        with transaction.atomic():
+            cursor = connections[DEFAULT_DB_ALIAS].cursor()
+            cursor.execute("SET LOCAL geotrek.skip_topology_update = 'on'")
+            PathAggregation.objects.bulk_create(aggregations)
+            cursor.execute("SET LOCAL geotrek.skip_topology_update = 'off'")
+            cursor.execute("SELECT update_geometry_of_evenement(eid) FROM unnest(%s::integer[]) AS eid",
+                           [topologies])
+
     @classmethod
     def overlapping(cls, topologies):
         """ Return a Topology queryset overlapping specified topologies.
         """
         return TopologyHelper.overlapping(cls, topologies)
 
+    @classmethod
+    def overlapping_many(cls, topologies, queryset=None):
+        """ Return a dict with the list of topologies overlapping each of specified
+        topologies (e.g. a page of a list view), ordered like ``overlapping()``.
+        """
+        return TopologyHelper.overlapping_many(cls, topologies, queryset)
+
+    @classmethod
+    def path_topologies_many(cls, paths, queryset=None):
+        """ Return a dict with the list of topologies along each of specified paths
+        (e.g. a page of a list view), in the order of ``queryset`` if given.
+        """
+        if queryset is None:
+            queryset = cls.objects.existing()
+        return TopologyHelper.path_topologies_many(queryset, paths)
+
     def mutate(self, other, delete=True):
         """
         Take alls attributes of the other topology specified and
@@ -328,13 +509,13 @@ class Topology(AddPropertyMixin, AltimetryMixin, TimeStampedModelMixin, NoDelete
         self.save(update_fields=['deleted', 'geom'])
 
         # Now copy all agregations from other to self
-        aggrs = other.aggregations.all()
+        aggrs = other.aggregations.select_related('path').all()
         # A point has only one aggregation, except if it is on an intersection.
         # In this case, the trigger will create them, so ignore them here.
         if other.ispoint():
             aggrs = aggrs[:1]
-        for aggr in aggrs:
-            self.add_path(aggr.path, aggr.start_position, aggr.end_position, aggr.order, reload=False)
+        self.add_paths([(aggr.path, aggr.start_position, aggr.end_position, aggr.order)
+                        for aggr in aggrs], reload=False)
         self.reload()
         if delete:
             other.delete(force=True)  # Really delete it from database
@@ -346,7 +527,7 @@ class Topology(AddPropertyMixin, AltimetryMixin, TimeStampedModelMixin, NoDelete
         """
         if self.pk:
             # Update computed values
-            fromdb = self.__class__.objects.get(pk=self.pk)
+            fromdb = Topology.objects.only(*self.returned_fields).get(pk=self.pk)
             self.geom = fromdb.geom
             # /!\ offset may be set by a trigger OR in
             # the django code, reload() will override
@@ -357,20 +538,26 @@ class Topology(AddPropertyMixin, AltimetryMixin, TimeStampedModelMixin, NoDelete
             NoDeleteMixin.reload(self, fromdb)
         return self
 
+    def update_assignment(self, field, placeholder, value):
+        # HACK: geom is readonly from the Django point of view but it is
+        # computed at DB level. In the case of points, the geom can be set by
+        # Django. Don't override with NULL. (Topologies without aggregations
+        # are considered as points, like in ``ispoint()``)
+        if field.attname == 'geom' and settings.TREKKING_TOPOLOGY_ENABLED:
+            expression = ("CASE WHEN NOT EXISTS (SELECT 1 FROM e_r_evenement_troncon et"
+                          "                      WHERE et.evenement = e_t_evenement.id"
+                          "                        AND et.pk_debut != et.pk_fin)"
+                          " THEN COALESCE(%(value)s, e_t_evenement.geom)"
+                          " ELSE COALESCE(e_t_evenement.geom, %(value)s) END") % {'value': placeholder}
+            return expression, [value, value]
+        return super(Topology, self).update_assignment(field, placeholder, value)
+
     @debug_pg_notices
     def save(self, *args, **kwargs):
-        # HACK: these fields are readonly from the Django point of view
-        # but they can be changed at DB level. Since Django write all fields
-        # to DB anyway, it is important to update it before writting
-        if self.pk and settings.TREKKING_TOPOLOGY_ENABLED:
-            existing = self.__class__.objects.get(pk=self.pk)
-            self.length = existing.length
-            # In the case of points, the geom can be set by Django. Don't override.
-            point_geom_not_set = self.ispoint() and self.geom is None
-            geom_already_in_db = not self.ispoint() and existing.geom is not None
-            if (point_geom_not_set or geom_already_in_db):
-                self.geom = existing.geom
-        else:
+        # Values computed at DB level (geom, length, ...) are not overwritten
+        # when updating (see ``update_assignment()``), and returned by the
+        # same query (see ``UpdateReturningMixin``).
+        if not self.pk or not settings.TREKKING_TOPOLOGY_ENABLED:
             if not self.deleted and self.geom is None:
                 # We cannot have NULL geometry. So we use an empty one,
                 # it will be computed or overwritten by triggers.
@@ -387,7 +574,7 @@ class Topology(AddPropertyMixin, AltimetryMixin, TimeStampedModelMixin, NoDelete
 
         # Save into db
         super(Topology, self).save(*args, **kwargs)
-        self.reload()
+        self.refresh()
 
     def serialize(self, **kwargs):
         return TopologyHelper.serialize(self, **kwargs)
@@ -454,6 +641,74 @@ class PathAggregation(models.Model):
         ordering = ['order', ]
 
 
+class PendingTopologyUpdate(models.Model):
+    """
+    Topologies whose geometry computation was deferred (rows are inserted
+    by triggers, see ``deferred_topology_update()``).
+    """
+    topology = models.IntegerField(db_column='evenement', unique=True, verbose_name=_(u"Topology"))
+
+    class Meta:
+        db_table = 'e_t_evenement_a_calculer'
+        verbose_name = _(u"Pending topology update")
+        verbose_name_plural = _(u"Pending topology updates")
+
+    @classmethod
+    def process(cls):
+        """
+        Compute geometry of queued topologies. Returns their number.
+        """
+        cursor = connections[DEFAULT_DB_ALIAS].cursor()
+        cursor.execute("SELECT update_geometry_of_queued_evenements()")
+        return cursor.fetchone()[0]
+
+
+class PathChange(models.Model):
+    """
+    Latest change of each path (rows are written by triggers), used to
+    update the graph of paths incrementally (see ``graph.refresh_graph()``).
+
+    Rows are numbered in sequence, and hold the transaction that made
+    the change.
+    """
+    path = models.IntegerField(db_column='troncon', unique=True, verbose_name=_(u"Path"))
+    transaction = models.BigIntegerField(db_column='txid', db_index=True, verbose_name=_(u"Transaction"))
+
+    class Meta:
+        db_table = 'l_t_troncon_journal'
+        verbose_name = _(u"Path change")
+        verbose_name_plural = _(u"Path changes")
+
+    @classmethod
+    def since(cls, revision=None):
+        """
+        Returns the current revision of paths, the ids of paths changed since
+        the given ``revision`` (none if not given), and the id of the current
+        transaction if it changed paths itself (``None`` otherwise).
+
+        A revision is made of the latest sequence number and the snapshot of
+        transactions: changes from transactions that were still in progress
+        then are found whatever their sequence number, so that slow transactions
+        are not missed.
+        """
+        if revision is None:
+            sequence, snapshot = 0, None
+        else:
+            sequence, snapshot = revision.split('/', 1)
+        cursor = connections[DEFAULT_DB_ALIAS].cursor()
+        cursor.execute("""
+            SELECT (SELECT coalesce(max(id), 0) FROM l_t_troncon_journal),
+                   txid_current_snapshot()::text,
+                   ARRAY(SELECT troncon FROM l_t_troncon_journal
+                         WHERE %s IS NOT NULL
+                           AND (id > %s OR (txid >= txid_snapshot_xmin(%s::txid_snapshot)
+                                            AND NOT txid_visible_in_snapshot(txid, %s::txid_snapshot)))),
+                   (SELECT txid_current() FROM l_t_troncon_journal WHERE txid = txid_current() LIMIT 1)
+        """, [snapshot, int(sequence), snapshot, snapshot])
+        sequence, snapshot, changed, current = cursor.fetchone()
+        return '%s/%s' % (sequence, snapshot), changed, current
+
+
 class PathSource(StructureRelated):
 
     source = models.CharField(verbose_name=_(u"Source"), max_length=50)
@@ -565,5 +820,7 @@ class Trail(MapEntityMixin, Topology, StructureRelated):
         return cls.objects.existing().filter(aggregations__path=path)
 
 
-Path.add_property('trails', lambda self: Trail.path_trails(self), _(u"Trails"))
-Topology.add_property('trails', lambda self: Trail.overlapping(self), _(u"Trails"))
+Path.add_property('trails', lambda self: Trail.path_trails(self), _(u"Trails"),
+                  bulk=Trail.path_topologies_many, queryset=Trail)
+Topology.add_property('trails', lambda self: Trail.overlapping(self), _(u"Trails"),
+                      bulk=Trail.overlapping_many, queryset=Trail)
@@ -28,6 +28,14 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Same, with named output, usable in set-based queries: (ft_interpolate_along(line, point)).position
+CREATE OR REPLACE FUNCTION geotrek.ft_interpolate_along(line geometry, point geometry, OUT position float, OUT distance float) AS $$
+BEGIN
+    SELECT r.pos, r.dist INTO position, distance
+        FROM ST_InterpolateAlong(line, point) AS r (pos FLOAT, dist FLOAT);
+END;
+$$ LANGUAGE plpgsql;
+
 
 -------------------------------------------------------------------------------
 -- A smart ST_Line_Substring that supports start > end
@@ -153,6 +153,58 @@ END;
 $$ LANGUAGE plpgsql;
 
 
+-------------------------------------------------------------------------------
+-- Update altimetry of an "evenement", without touching its geometry
+-- (e.g. after DEM was replaced and troncons elevation computed again)
+-------------------------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION geotrek.update_altimetry_of_evenement(eid integer) RETURNS void AS $$
+DECLARE
+    egeom geometry;
+    egeom_3d geometry;
+    elevation elevation_infos;
+    t_offset float;
+    t_geom_3d geometry;
+    tomerge_3d geometry[];
+BEGIN
+    SELECT geom, decallage INTO egeom, t_offset FROM e_t_evenement e WHERE e.id = eid;
+    IF egeom IS NULL OR ST_IsEmpty(egeom) THEN
+        RETURN;
+    END IF;
+
+    egeom_3d := egeom;
+    -- Lines follow the 3D geometry of their troncons (see update_geometry_of_evenement)
+    IF {{TREKKING_TOPOLOGY_ENABLED}} AND ST_GeometryType(egeom) <> 'ST_Point' THEN
+        FOR t_geom_3d IN SELECT ST_Smart_Line_Substring(t.geom_3d, et.pk_debut, et.pk_fin)
+               FROM e_r_evenement_troncon et, l_t_troncon t
+               WHERE et.evenement = eid AND et.troncon = t.id
+                 AND et.pk_debut != et.pk_fin
+               ORDER BY et.ordre, et.id
+        LOOP
+            tomerge_3d := array_append(tomerge_3d, t_geom_3d);
+        END LOOP;
+
+        IF tomerge_3d IS NOT NULL THEN
+            egeom_3d := ft_Smart_MakeLine(tomerge_3d);
+            IF t_offset != 0 THEN
+                egeom_3d := ST_GeometryN(ST_LocateBetween(ST_AddMeasure(egeom_3d, 0, 1), 0, 1, t_offset), 1);
+            END IF;
+        END IF;
+    END IF;
+
+    SELECT * FROM ft_elevation_infos(egeom_3d, {{ALTIMETRIC_PROFILE_STEP}}) INTO elevation;
+    UPDATE e_t_evenement SET geom_3d = ST_Force_3DZ(elevation.draped),
+                             longueur = ST_3DLength(elevation.draped),
+                             pente = elevation.slope,
+                             altitude_minimum = elevation.min_elevation,
+                             altitude_maximum = elevation.max_elevation,
+                             denivelee_positive = elevation.positive_gain,
+                             denivelee_negative = elevation.negative_gain
+                         WHERE id = eid;
+END;
+$$ LANGUAGE plpgsql;
+
+
 -------------------------------------------------------------------------------
 -- Update geometry when offset change
 -------------------------------------------------------------------------------
@@ -206,3 +258,6 @@ $$ LANGUAGE plpgsql;
 CREATE TRIGGER e_t_evenement_geom_iu_tgr
 BEFORE INSERT OR UPDATE OF geom ON e_t_evenement
 FOR EACH ROW EXECUTE PROCEDURE evenement_elevation_iu();
+
+-- Store elevation profile when geom_3d changes
+SELECT ft_add_elevation_profile('e_t_evenement');
@@ -43,13 +43,82 @@ $$ LANGUAGE plpgsql;
 -- Compute geometry of Evenements
 -------------------------------------------------------------------------------
 
+-- Geometry computation can be disabled during bulk insertions of
+-- evenement_troncons (SET LOCAL geotrek.skip_topology_update = 'on'), in
+-- order to compute it only once afterwards (see Topology.add_paths()).
+CREATE OR REPLACE FUNCTION geotrek.ft_skip_topology_update() RETURNS boolean AS $$
+BEGIN
+    RETURN current_setting('geotrek.skip_topology_update') = 'on';
+EXCEPTION WHEN undefined_object THEN
+    RETURN false;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- In deferred mode (SET LOCAL geotrek.defer_topology_update = 'on'), topologies
+-- are queued instead, and their geometry is computed once by
+-- update_geometry_of_queued_evenements() (see deferred_topology_update()).
+CREATE OR REPLACE FUNCTION geotrek.ft_defer_topology_update() RETURNS boolean AS $$
+BEGIN
+    RETURN current_setting('geotrek.defer_topology_update') = 'on';
+EXCEPTION WHEN undefined_object THEN
+    RETURN false;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+CREATE OR REPLACE FUNCTION geotrek.schedule_update_geometry_of_evenements(eids integer[]) RETURNS void AS $$
+DECLARE
+    eid integer;
+BEGIN
+    IF eids IS NULL THEN
+        RETURN;
+    END IF;
+    IF ft_defer_topology_update() THEN
+        -- Wait for concurrent transactions queuing the same topologies: once
+        -- they are committed, their rows are seen by the next statement.
+        PERFORM pg_advisory_xact_lock('e_t_evenement_a_calculer'::regclass::oid::integer, q.evenement)
+        FROM (SELECT DISTINCT unnest(eids) AS evenement ORDER BY 1) AS q;
+        INSERT INTO e_t_evenement_a_calculer (evenement)
+        SELECT DISTINCT q.evenement FROM unnest(eids) AS q(evenement)
+        WHERE NOT EXISTS (SELECT 1 FROM e_t_evenement_a_calculer c WHERE c.evenement = q.evenement);
+    ELSE
+        FOREACH eid IN ARRAY eids LOOP
+            PERFORM update_geometry_of_evenement(eid);
+        END LOOP;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION geotrek.schedule_update_geometry_of_evenement(eid integer) RETURNS void AS $$
+BEGIN
+    PERFORM schedule_update_geometry_of_evenements(ARRAY[eid]);
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION geotrek.update_geometry_of_queued_evenements() RETURNS integer AS $$
+DECLARE
+    eid integer;
+    total integer := 0;
+BEGIN
+    FOR eid IN WITH queued AS (DELETE FROM e_t_evenement_a_calculer RETURNING evenement)
+               SELECT DISTINCT evenement FROM queued
+    LOOP
+        PERFORM update_geometry_of_evenement(eid);
+        total := total + 1;
+    END LOOP;
+    RETURN total;
+END;
+$$ LANGUAGE plpgsql;
+
 DROP TRIGGER IF EXISTS e_r_evenement_troncon_geometry_tgr ON e_r_evenement_troncon;
 
 CREATE OR REPLACE FUNCTION geotrek.ft_evenements_troncons_geometry() RETURNS trigger AS $$
 DECLARE
-    eid integer;
     eids integer[];
 BEGIN
+    IF ft_skip_topology_update() THEN
+        RETURN NULL;
+    END IF;
+
     IF TG_OP = 'INSERT' THEN
         eids := array_append(eids, NEW.evenement);
     ELSE
@@ -61,9 +130,7 @@ BEGIN
         END IF;
     END IF;
 
-    FOREACH eid IN ARRAY eids LOOP
-        PERFORM update_geometry_of_evenement(eid);
-    END LOOP;
+    PERFORM schedule_update_geometry_of_evenements(eids);
 
     RETURN NULL;
 END;
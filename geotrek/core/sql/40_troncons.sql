@@ -98,14 +98,12 @@ DECLARE
 BEGIN
     -- Geometry of linear topologies are always updated
     -- Geometry of point topologies are updated if offset = 0
-    FOR eid IN SELECT e.id
-               FROM e_r_evenement_troncon et, e_t_evenement e
-               WHERE et.troncon = NEW.id AND et.evenement = e.id
-               GROUP BY e.id
-               HAVING BOOL_OR(et.pk_debut != et.pk_fin) OR e.decallage = 0.0
-    LOOP
-        PERFORM update_geometry_of_evenement(eid);
-    END LOOP;
+    PERFORM schedule_update_geometry_of_evenements(array_agg(id))
+    FROM (SELECT e.id
+          FROM e_r_evenement_troncon et, e_t_evenement e
+          WHERE et.troncon = NEW.id AND et.evenement = e.id
+          GROUP BY e.id
+          HAVING BOOL_OR(et.pk_debut != et.pk_fin) OR e.decallage = 0.0) AS topologies;
 
     -- Special case of point geometries with offset != 0
     FOR eid, egeom IN SELECT e.id, e.geom
@@ -170,6 +168,31 @@ CREATE TRIGGER l_t_troncon_10_elevation_iu_tgr
 BEFORE INSERT OR UPDATE OF geom ON l_t_troncon
 FOR EACH ROW EXECUTE PROCEDURE elevation_troncon_iu();
 
+-- Compute elevation again without touching geometries (e.g. after DEM was
+-- replaced): topologies are not updated, see update_altimetry_of_evenement().
+
+CREATE OR REPLACE FUNCTION geotrek.update_altimetry_of_troncons(tids integer[]) RETURNS integer AS $$
+DECLARE
+    updated integer;
+BEGIN
+    UPDATE l_t_troncon t SET geom_3d = (s.elevation).draped,
+                             longueur = ST_3DLength((s.elevation).draped),
+                             pente = (s.elevation).slope,
+                             altitude_minimum = (s.elevation).min_elevation,
+                             altitude_maximum = (s.elevation).max_elevation,
+                             denivelee_positive = (s.elevation).positive_gain,
+                             denivelee_negative = (s.elevation).negative_gain
+    FROM (SELECT id, ft_elevation_infos(geom, {{ALTIMETRIC_PROFILE_STEP}}) AS elevation
+          FROM l_t_troncon WHERE id = ANY(tids) OFFSET 0) AS s
+    WHERE t.id = s.id;
+    GET DIAGNOSTICS updated = ROW_COUNT;
+    RETURN updated;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Store elevation profile when geom_3d changes
+SELECT ft_add_elevation_profile('l_t_troncon');
+
 
 -------------------------------------------------------------------------------
 -- Change status of related objects when paths are deleted
@@ -217,3 +240,42 @@ $$ LANGUAGE plpgsql;
 CREATE TRIGGER l_t_troncon_latest_updated_d_tgr
 AFTER DELETE ON l_t_troncon
 FOR EACH ROW EXECUTE PROCEDURE troncon_latest_updated_d();
+
+
+-------------------------------------------------------------------------------
+-- Keep track of changes of paths network (see graph.refresh_graph())
+-------------------------------------------------------------------------------
+
+DROP TRIGGER IF EXISTS l_t_troncon_journal_id_tgr ON l_t_troncon;
+DROP TRIGGER IF EXISTS l_t_troncon_journal_u_tgr ON l_t_troncon;
+
+CREATE OR REPLACE FUNCTION geotrek.troncon_journal_iud() RETURNS trigger AS $$
+DECLARE
+    tid integer;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        tid := OLD.id;
+    ELSE
+        tid := NEW.id;
+    END IF;
+    -- Only the latest change of each path is kept, with a new sequence
+    -- number and the id of the transaction that made it
+    DELETE FROM l_t_troncon_journal WHERE troncon = tid;
+    INSERT INTO l_t_troncon_journal (troncon, txid) VALUES (tid, txid_current());
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER l_t_troncon_journal_id_tgr
+AFTER INSERT OR DELETE ON l_t_troncon
+FOR EACH ROW EXECUTE PROCEDURE troncon_journal_iud();
+
+-- Geometries are compared with ST_OrderingEquals() since "=" only compares
+-- their bounding boxes
+CREATE TRIGGER l_t_troncon_journal_u_tgr
+AFTER UPDATE OF geom, visible, longueur ON l_t_troncon
+FOR EACH ROW
+WHEN (NOT ST_OrderingEquals(OLD.geom, NEW.geom)
+      OR OLD.visible IS DISTINCT FROM NEW.visible
+      OR OLD.longueur IS DISTINCT FROM NEW.longueur)
+EXECUTE PROCEDURE troncon_journal_iud();
@@ -176,6 +176,127 @@ Geotrek.Dijkstra = (function() {
 })();
 
 
+// Decode graph packed in binary (see ``CompactGraph.pack()`` on server-side),
+// into the same structure as the JSON graph.
+//
+// Layout is a header (magic, version, nodes count, edges count) followed by
+// arrays: coords (float64), lengths (float64), edge_ids, edge_nodes, offsets,
+// adj_nodes and adj_edges (int32). All little-endian.
+//
+Geotrek.graphFromBinary = function (buffer) {
+    var header = new DataView(buffer, 0, 16)
+      , magic = String.fromCharCode.apply(null, new Uint8Array(buffer, 0, 4))
+      , version = header.getUint32(4, true)
+      , nodes_count = header.getUint32(8, true)
+      , edges_count = header.getUint32(12, true);
+
+    if (magic != 'GTKG' || version != 1) {
+        throw "Invalid graph data";
+    }
+
+    var view = new DataView(buffer)
+      , position = 16 + 8 * 2 * nodes_count;  // Skip coords
+    function read(count, size, getter) {
+        var values = [];
+        for (var i = 0; i < count; i++) {
+            values.push(view[getter](position, true));
+            position += size;
+        }
+        return values;
+    }
+    var lengths = read(edges_count, 8, 'getFloat64')
+      , edge_ids = read(edges_count, 4, 'getInt32')
+      , edge_nodes = read(2 * edges_count, 4, 'getInt32');
+
+    // Node ids start at 1, as in JSON graph
+    var edges = {};
+    for (var e = 0; e < edges_count; e++) {
+        var edge_id = edge_ids[e]
+          , node_a = edge_nodes[2 * e] + 1
+          , node_b = edge_nodes[2 * e + 1] + 1;
+        edges[edge_id] = {'id': edge_id, 'length': lengths[e], 'nodes_id': [node_a, node_b]};
+    }
+    return {'nodes': Geotrek.graphNodes(edges), 'edges': edges};
+};
+
+
+// Build nodes of the graph from its edges: when several edges link the
+// same nodes, the shortest one is kept (as done by ``editor_nodes()`` on
+// server-side).
+//
+Geotrek.graphNodes = function (edges) {
+    var nodes = {};
+    function link(node, other, edge) {
+        nodes[node] = nodes[node] || {};
+        var current = nodes[node][other];
+        if (current === undefined || edge.length < edges[current].length) {
+            nodes[node][other] = edge.id;
+        }
+    }
+    for (var edge_id in edges) {
+        var edge = edges[edge_id];
+        link(edge.nodes_id[0], edge.nodes_id[1], edge);
+        link(edge.nodes_id[1], edge.nodes_id[0], edge);
+    }
+    return nodes;
+};
+
+
+// Apply changes of graph, as returned by the JSON graph with ``since``:
+// changed edges replace former ones, deleted edges are removed, and nodes
+// are built again. Node ids are stable on server-side, until the graph is
+// sent again entirely (``full``).
+//
+Geotrek.applyGraphDelta = function (graph, delta) {
+    if (delta.full) {
+        return {'nodes': delta.nodes, 'edges': delta.edges};
+    }
+    var edges = $.extend({}, graph.edges, delta.edges);
+    for (var i = 0; i < delta.deleted_edges.length; i++) {
+        delete edges[delta.deleted_edges[i]];
+    }
+    return {'nodes': Geotrek.graphNodes(edges), 'edges': edges};
+};
+
+
+// Keep the graph in browser storage along with its revision, so that only
+// its changes are loaded next time.
+//
+Geotrek.graphStorage = {
+    key: 'geotrek-path-graph',
+
+    load: function () {
+        try {
+            var stored = JSON.parse(window.localStorage.getItem(this.key));
+            return stored && stored.revision && stored.graph ? stored : null;
+        }
+        catch (e) {
+            return null;
+        }
+    },
+
+    save: function (revision, graph) {
+        if (!revision) {
+            return;
+        }
+        try {
+            window.localStorage.setItem(this.key, JSON.stringify({'revision': revision, 'graph': graph}));
+        }
+        catch (e) {
+            // Storage is unavailable or full
+            this.clear();
+        }
+    },
+
+    clear: function () {
+        try {
+            window.localStorage.removeItem(this.key);
+        }
+        catch (e) {}
+    }
+};
+
+
 
 // Computed_paths:
 //
@@ -120,14 +120,65 @@ MapEntity.GeometryField.TopologyField = MapEntity.GeometryField.extend({
 
         // Path layer is ready, load graph !
         this._pathsLayer.fire('data:loading');
-        var url = window.SETTINGS.urls.path_graph + '?_u=' + (new Date().getTime());
-        $.getJSON(url, this._onGraphLoaded.bind(this))
-         .error(graphError.bind(this));
+        var stored = Geotrek.graphStorage.load()
+          , binary = window.SETTINGS.urls.path_graph_binary && window.DataView !== undefined
+          , url = binary ? window.SETTINGS.urls.path_graph_binary : window.SETTINGS.urls.path_graph;
+        url += '?_u=' + (new Date().getTime());
+
+        if (stored) {
+            // Only load changes since the stored revision
+            url = window.SETTINGS.urls.path_graph + '?since=' + encodeURIComponent(stored.revision);
+            $.getJSON(url, function (delta) {
+                var graph = Geotrek.applyGraphDelta(stored.graph, delta);
+                graphLoaded.call(this, delta.revision, graph);
+            }.bind(this))
+             .error(function (jqXHR, textStatus, errorThrown) {
+                Geotrek.graphStorage.clear();
+                graphError.call(this, jqXHR, textStatus, errorThrown);
+            }.bind(this));
+        }
+        else if (binary) {
+            // Compact binary format, much lighter for large networks
+            var xhr = new XMLHttpRequest();
+            xhr.open('GET', url, true);
+            xhr.responseType = 'arraybuffer';
+            xhr.onload = function () {
+                if (xhr.status != 200) {
+                    graphError.call(this, xhr, xhr.statusText);
+                    return;
+                }
+                var graph;
+                try {
+                    graph = Geotrek.graphFromBinary(xhr.response);
+                }
+                catch (e) {
+                    graphError.call(this, xhr, 'invalid data', e);
+                    return;
+                }
+                graphLoaded.call(this, xhr.getResponseHeader('X-Graph-Revision'), graph);
+            }.bind(this);
+            xhr.onerror = function () {
+                graphError.call(this, xhr, xhr.statusText);
+            }.bind(this);
+            xhr.send();
+        }
+        else {
+            $.getJSON(url, function (graph, textStatus, jqXHR) {
+                graphLoaded.call(this, jqXHR.getResponseHeader('X-Graph-Revision'), graph);
+            }.bind(this))
+             .error(graphError.bind(this));
+        }
+
+        function graphLoaded(revision, graph) {
+            // Store before the editor adds its own nodes into the graph
+            Geotrek.graphStorage.save(revision, graph);
+            this._onGraphLoaded(graph);
+        }
 
         function graphError(jqXHR, textStatus, errorThrown) {
             this._pathsLayer.fire('data:loaded');
             $(this._map._container).addClass('map-error');
-            console.error("Could not load url '" + window.SETTINGS.urls.path_graph + "': " + textStatus);
+            console.error("Could not load url '" + url + "': " + textStatus);
             console.error(errorThrown);
         }
     },
@@ -56,6 +56,10 @@ class SnappedLineStringFieldTest(TestCase):
             LineString((100000, 100000), (700000, 6600000),
                        srid=settings.SRID), 0.1))
 
+    def test_geom_cannot_be_snapped_on_unknown_path(self):
+        value = '{"geom": "%s", "snap": [null, -1]}' % self.wktgeom
+        self.assertRaises(ValidationError, self.f.clean, value)
+
 
 class TopologyFieldTest(TestCase):
     def setUp(self):
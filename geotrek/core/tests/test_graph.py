@@ -3,11 +3,13 @@ import json
 from django.test import TestCase
 from django.contrib.auth.models import User
 from django.contrib.gis.geos import LineString
+from django.core.cache import get_cache
 from django.core.urlresolvers import reverse
 
 from geotrek.core.factories import PathFactory
-from geotrek.core.graph import graph_edges_nodes_of_qs
-from geotrek.core.models import Path
+from geotrek.core.graph import (graph_edges_nodes_of_qs, build_graph, refresh_graph,
+                                cached_path_graph, PathGraph, CompactGraph, NoRouteError)
+from geotrek.core.models import Path, PathChange, Topology
 
 
 class SimpleGraph(TestCase):
@@ -80,3 +82,255 @@ class SimpleGraph(TestCase):
         expires = response['Expires']
         self.assertNotEqual(expires, None)
         self.assertEqual(expires, last_modified)
+
+
+class RoutingTest(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_user('homer', 'h@s.com', 'dooh')
+        success = self.client.login(username=user.username, password='dooh')
+        self.assertTrue(success)
+        self.url = reverse('core:path_json_route')
+        # A short way (ab, bc) and a long way (ac) between a and c
+        self.ab = PathFactory(geom=LineString((0, 0), (10, 0)))
+        self.bc = PathFactory(geom=LineString((10, 0), (10, 10)))
+        self.ac = PathFactory(geom=LineString((0, 0), (-10, 10), (10, 10)))
+
+    def get_route(self, *steps):
+        steps = [{'path': path.pk, 'position': position} for path, position in steps]
+        return self.client.get(self.url, {'steps': json.dumps(steps)})
+
+    def test_shortest_path_between_positions(self):
+        graph = PathGraph.from_queryset(Path.objects.all())
+        length, steps = graph.shortest_path((self.ab.pk, 0.5), (self.bc.pk, 0.5))
+        self.assertAlmostEqual(length, 10.0)
+        self.assertEqual(steps, [(self.ab.pk, 0.5, 1.0), (self.bc.pk, 0.0, 0.5)])
+
+    def test_shortest_path_on_same_path(self):
+        graph = PathGraph.from_queryset(Path.objects.all())
+        length, steps = graph.shortest_path((self.ac.pk, 0.7), (self.ac.pk, 0.2))
+        self.assertEqual(steps, [(self.ac.pk, 0.7, 0.2)])
+
+    def test_shortest_path_avoids_longer_path(self):
+        graph = PathGraph.from_queryset(Path.objects.all())
+        length, steps = graph.shortest_path((self.ac.pk, 0.0), (self.ac.pk, 1.0))
+        self.assertAlmostEqual(length, 20.0)
+        self.assertEqual(steps, [(self.ab.pk, 0.0, 1.0), (self.bc.pk, 0.0, 1.0)])
+
+    def test_no_route_between_disconnected_paths(self):
+        other = PathFactory(geom=LineString((100, 100), (110, 110)))
+        graph = PathGraph.from_queryset(Path.objects.all())
+        self.assertRaises(NoRouteError, graph.shortest_path, (self.ab.pk, 0.5), (other.pk, 0.5))
+
+    def test_json_route_can_be_deserialized(self):
+        response = self.get_route((self.ab, 0.5), (self.bc, 1.0), (self.ac, 0.5))
+        self.assertEqual(response.status_code, 200)
+        route = json.loads(response.content)
+        self.assertEqual(len(route['topology']), 2)
+        topology = Topology.deserialize(route['topology'])
+        self.assertEqual([a.path for a in topology.aggregations.all()],
+                         [self.ab, self.bc, self.bc, self.ac])
+
+    def test_json_route_invalid_steps(self):
+        response = self.client.get(self.url, {'steps': 'not json'})
+        self.assertEqual(response.status_code, 400)
+        response = self.get_route((self.ab, 0.5))
+        self.assertEqual(response.status_code, 400)
+        response = self.get_route((self.ab, 0.5), (self.bc, 1.5))
+        self.assertEqual(response.status_code, 400)
+        response = self.get_route((self.ab, -0.1), (self.bc, 1.0))
+        self.assertEqual(response.status_code, 400)
+
+
+class IncrementalGraphTest(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_user('homer', 'h@s.com', 'dooh')
+        success = self.client.login(username=user.username, password='dooh')
+        self.assertTrue(success)
+        self.url = reverse('core:path_json_graph')
+        self.ab = PathFactory(geom=LineString((0, 0), (10, 0)))
+        self.bc = PathFactory(geom=LineString((10, 0), (10, 10)))
+
+    def test_refresh_only_applies_changes(self):
+        graph, transaction = build_graph()
+        # Paths were created in this (uncommitted) transaction
+        self.assertNotEqual(transaction, None)
+        self.assertIs(refresh_graph(graph)[0], graph)
+
+        self.bc.geom = LineString((10, 0), (20, 0))
+        self.bc.save()
+        updated = refresh_graph(graph)[0]
+        self.assertEqual(updated.generation, graph.generation)
+        self.assertNotEqual(updated.revision, graph.revision)
+        # Former end of path is gone, new one is added: other ids are kept
+        result = updated.as_dict()
+        self.assertEqual(result['edges'][self.bc.pk]['nodes_id'], [2, 4])
+        self.assertEqual(result['nodes'], {1: {2: self.ab.pk},
+                                           2: {1: self.ab.pk, 4: self.bc.pk},
+                                           4: {2: self.bc.pk}})
+
+    def test_refresh_detects_deletions(self):
+        graph = build_graph()[0]
+        self.ab.delete()
+        updated = refresh_graph(graph)[0]
+        self.assertEqual(updated.all_edge_ids(), [self.bc.pk])
+        self.assertEqual(updated.edge(self.bc.pk), graph.edge(self.bc.pk))
+        self.assertRaises(KeyError, updated.edge, self.ab.pk)
+
+    def test_refresh_keeps_arrays(self):
+        graph = build_graph()[0]
+        self.bc.geom = LineString((10, 0), (20, 0))
+        self.bc.save()
+        updated = refresh_graph(graph)[0]
+        self.assertIs(updated.edge_ids, graph.edge_ids)
+        self.assertIs(updated.adj_nodes, graph.adj_nodes)
+        self.assertEqual(updated.changes.keys(), [self.bc.pk])
+        self.assertEqual(updated.edge(self.bc.pk)[:2], (1, 3))
+        self.assertEqual(updated.nodes_count, 4)
+        self.assertEqual(graph.changes, {})
+        # Merged into new arrays, with the same nodes and edges
+        compacted = updated.compacted()
+        self.assertEqual(compacted.changes, {})
+        self.assertEqual(compacted.revision, updated.revision)
+        self.assertEqual(compacted.base_revision, updated.revision)
+        self.assertEqual(compacted.as_dict(), updated.as_dict())
+        self.assertEqual(CompactGraph.unpack(updated.pack()).as_dict(), updated.as_dict())
+        self.assertEqual(updated.shortest_path((self.ab.pk, 0.0), (self.bc.pk, 1.0)),
+                         compacted.shortest_path((self.ab.pk, 0.0), (self.bc.pk, 1.0)))
+
+    def test_compaction_threshold(self):
+        graph = build_graph()[0]
+        self.assertFalse(graph.needs_compaction)
+        graph.changes = dict((i, None) for i in range(CompactGraph.COMPACTION_MIN_CHANGES + 1))
+        self.assertTrue(graph.needs_compaction)
+
+    def test_cached_changes_reuse_arrays(self):
+        cache = get_cache('django.core.cache.backends.locmem.LocMemCache')
+        graph = build_graph()[0]
+        base_revision = (graph.generation, graph.base_revision)
+        cache.set('path_graph', base_revision + (graph.pack_base(),))
+        self.ab.delete()
+        updated = refresh_graph(graph)[0]
+        cache.set('path_graph_changes', base_revision + (updated.revision, updated.changes,
+                                                         updated.extra_coords.tolist()))
+        revision = (updated.generation, updated.revision)
+        # Arrays of the process are reused, others load them
+        cached = cached_path_graph(cache, revision, graph)
+        self.assertIs(cached.edge_ids, graph.edge_ids)
+        self.assertEqual(cached.as_dict(), updated.as_dict())
+        cached = cached_path_graph(cache, revision)
+        self.assertEqual(cached.token, updated.token)
+        self.assertEqual(cached.as_dict(), updated.as_dict())
+        # Unknown revision
+        self.assertIs(cached_path_graph(cache, (graph.generation, 'other'), graph), graph)
+
+    def test_shortest_of_parallel_edges_remains(self):
+        other = PathFactory(geom=LineString((0, 0), (0, -10), (10, -10), (10, 0)))
+        graph = build_graph()[0]
+        self.assertEqual(graph.as_dict()['nodes'][1][2], self.ab.pk)
+        self.ab.delete()
+        updated = refresh_graph(graph)[0]
+        self.assertEqual(updated.as_dict()['nodes'][1][2], other.pk)
+
+    def test_changes_of_transactions_in_progress_are_found(self):
+        revision = PathChange.since()[0]
+        sequence = revision.split('/')[0]
+        # bc was changed by a transaction committed before the snapshot,
+        # ab by transaction 150, still in progress at the time
+        PathChange.objects.update(transaction=120)
+        PathChange.objects.filter(path=self.ab.pk).update(transaction=150)
+        changed = PathChange.since('%s/100:200:150' % sequence)[1]
+        self.assertEqual(changed, [self.ab.pk])
+
+    def test_json_graph_since(self):
+        response = self.client.get(self.url)
+        revision = response['X-Graph-Revision']
+
+        path = PathFactory(geom=LineString((10, 10), (0, 10)))
+        self.ab.delete()
+        response = self.client.get(self.url, {'since': revision})
+        self.assertEqual(response.status_code, 200)
+        graph = json.loads(response.content)
+        self.assertFalse(graph['full'])
+        self.assertEqual(graph['revision'], response['X-Graph-Revision'])
+        self.assertNotEqual(graph['revision'], revision)
+        self.assertEqual(graph['edges'].keys(), [str(path.pk)])
+        self.assertEqual(graph['edges'][str(path.pk)]['nodes_id'], [3, 4])
+        self.assertEqual(graph['deleted_edges'], [self.ab.pk])
+
+    def test_json_graph_since_other_generation_is_full(self):
+        revision = self.client.get(self.url)['X-Graph-Revision']
+        response = self.client.get(self.url, {'since': 'other' + revision})
+        graph = json.loads(response.content)
+        self.assertTrue(graph['full'])
+        self.assertEqual(len(graph['edges']), 2)
+
+    def test_json_graph_etag_changes_on_deletion(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.ab.delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_json_graph_invalid_since(self):
+        response = self.client.get(self.url, {'since': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+
+class CompactGraphTest(TestCase):
+
+    def setUp(self):
+        self.ab = PathFactory(geom=LineString((0, 0), (10, 0)))
+        self.bc = PathFactory(geom=LineString((10, 0), (10, 10)))
+        self.ac = PathFactory(geom=LineString((0, 0), (-10, 10), (10, 10)))
+        self.graph = CompactGraph.from_queryset(Path.objects.all())
+
+    def test_csr_arrays(self):
+        self.assertEqual(self.graph.nodes_count, 3)
+        self.assertEqual(list(self.graph.edge_ids), sorted([self.ab.pk, self.bc.pk, self.ac.pk]))
+        self.assertEqual(list(self.graph.offsets), [0, 2, 4, 6])
+        node_a, node_b, length = self.graph.edge(self.bc.pk)
+        self.assertAlmostEqual(length, 10.0)
+        self.assertEqual(sorted(e for n, e, l in self.graph.neighbours(node_b)), sorted([self.bc.pk, self.ac.pk]))
+
+    def test_routing_same_as_path_graph(self):
+        graph = PathGraph.from_queryset(Path.objects.all())
+        for start, end in [((self.ab.pk, 0.5), (self.bc.pk, 0.5)),
+                           ((self.ac.pk, 0.0), (self.ac.pk, 1.0)),
+                           ((self.ac.pk, 0.7), (self.ac.pk, 0.2))]:
+            self.assertEqual(self.graph.shortest_path(start, end), graph.shortest_path(start, end))
+
+    def test_pack_unpack(self):
+        data = self.graph.pack()
+        graph = CompactGraph.unpack(data)
+        for name in ('coords', 'lengths', 'edge_ids', 'edge_nodes', 'offsets', 'adj_nodes', 'adj_edges'):
+            self.assertEqual(getattr(graph, name), getattr(self.graph, name))
+        self.assertRaises(ValueError, CompactGraph.unpack, data[:-1])
+        self.assertRaises(ValueError, CompactGraph.unpack, 'GTKX' + data[4:])
+
+    def test_binary_graph_view(self):
+        user = User.objects.create_user('homer', 'h@s.com', 'dooh')
+        self.client.login(username=user.username, password='dooh')
+        response = self.client.get(reverse('core:path_binary_graph'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/octet-stream')
+        graph = CompactGraph.unpack(response.content)
+        self.assertEqual(graph.edge_ids, self.graph.edge_ids)
+
+    def test_binary_graph_follows_json_graph(self):
+        user = User.objects.create_user('homer', 'h@s.com', 'dooh')
+        self.client.login(username=user.username, password='dooh')
+        self.client.get(reverse('core:path_binary_graph'))
+        self.ab.delete()
+        response = self.client.get(reverse('core:path_binary_graph'))
+        graph = CompactGraph.unpack(response.content)
+        json_response = self.client.get(reverse('core:path_json_graph'))
+        self.assertEqual(response['X-Graph-Revision'], json_response['X-Graph-Revision'])
+        # Same node ids in both formats, although ab was removed
+        edges = json.loads(json_response.content)['edges']
+        self.assertEqual(sorted(edges), sorted(str(edge_id) for edge_id in graph.edge_ids))
+        node_a, node_b, length = graph.edge(self.bc.pk)
+        self.assertEqual(edges[str(self.bc.pk)]['nodes_id'], [node_a + 1, node_b + 1])
+        self.assertEqual(graph.nodes_count, 3)
@@ -1,15 +1,20 @@
 # -*- coding: utf-8 -*-
 import math
 
+import mock
 from django.test import TestCase
-from django.contrib.gis.geos import LineString
+from django.conf import settings
+from django.contrib.gis.geos import LineString, Point
 from django.db import IntegrityError
+from django.db.models.query import QuerySet
 
+from geotrek.common.mixins import prefetch_properties
 from geotrek.common.utils import dbnow
 from geotrek.authent.factories import UserFactory
 from geotrek.authent.models import Structure
-from geotrek.core.factories import (PathFactory, StakeFactory)
-from geotrek.core.models import Path
+from geotrek.core.factories import (PathFactory, StakeFactory, TopologyFactory, TrailFactory)
+from geotrek.core.models import Path, Topology, Trail
+from geotrek.core.helpers import PathHelper
 
 
 class StakeTest(TestCase):
@@ -177,3 +182,143 @@ class PathGeometryTest(TestCase):
         path_snapped.geom = old_geom
         path_snapped.save()
         self.assertEqual(path_snapped.geom.coords, old_geom.coords)
+
+
+class PathBatchInterpolationTest(TestCase):
+    def setUp(self):
+        self.horizontal = PathFactory.create(geom=LineString((0, 0), (10, 0)))
+        self.vertical = PathFactory.create(geom=LineString((20, 0), (20, 10)))
+        self.points = [Point(5, 3, srid=settings.SRID),
+                       Point(21, 8, srid=settings.SRID),
+                       Point(0, -2, srid=settings.SRID)]
+
+    def test_interpolate_closest_paths(self):
+        result = PathHelper.interpolate_many(self.points)
+        self.assertEqual([r[0] for r in result], [self.horizontal.pk, self.vertical.pk, self.horizontal.pk])
+        self.assertEqual([r[1] for r in result], [0.5, 0.8, 0.0])
+        self.assertEqual([abs(r[2]) for r in result], [3, 1, 2])
+
+    def test_interpolate_same_as_single_point(self):
+        for point, (pk, position, distance) in zip(self.points, PathHelper.interpolate_many(self.points)):
+            closest = Path.closest(point)
+            self.assertEqual(pk, closest.pk)
+            self.assertEqual((position, distance), closest.interpolate(point))
+
+    def test_interpolate_on_specified_paths(self):
+        result = PathHelper.interpolate_many(self.points, [self.vertical.pk, None, -1])
+        self.assertEqual(result[0][0], self.vertical.pk)
+        self.assertEqual(result[1][0], self.vertical.pk)
+        self.assertEqual(result[2], None)
+
+    def test_interpolate_ignores_invisible_paths(self):
+        PathFactory.create(geom=LineString((0, 3), (10, 3)), visible=False)
+        result = PathHelper.interpolate_many(self.points[:1])
+        self.assertEqual(result[0][0], self.horizontal.pk)
+
+    def test_snap_many(self):
+        result = PathHelper.snap_many(self.points, [self.horizontal.pk, None, self.vertical.pk])
+        self.assertEqual(result[0].coords, (5, 0))
+        self.assertEqual(result[1], None)
+        self.assertEqual(result[2].coords, (20, 0))
+
+    def test_specified_paths_must_be_visible(self):
+        self.vertical.visible = False
+        self.vertical.save()
+        result = PathHelper.interpolate_many(self.points[:2], [self.vertical.pk, None])
+        self.assertEqual(result[0], None)
+        self.assertEqual(result[1][0], self.horizontal.pk)
+        result = PathHelper.snap_many(self.points[:2], [self.vertical.pk, self.horizontal.pk])
+        self.assertEqual(result[0], None)
+        self.assertEqual(result[1].coords, (10, 0))
+
+    def test_empty(self):
+        self.assertEqual(PathHelper.interpolate_many([]), [])
+        self.assertEqual(PathHelper.snap_many([], []), [])
+
+
+class PathNearestTest(TestCase):
+    def setUp(self):
+        self.point = Point(0, 0, srid=settings.SRID)
+        self.near = PathFactory.create(geom=LineString((-10, 1), (10, 1)))
+        self.middle = PathFactory.create(geom=LineString((-10, 5), (10, 5)))
+        self.far = PathFactory.create(geom=LineString((-10, 20), (10, 20)))
+
+    def test_nearest_paths_are_ordered_by_distance(self):
+        nearest = Path.nearest(self.point, 2)
+        self.assertEqual(nearest, [self.near, self.middle])
+        self.assertEqual([p.distance for p in nearest], [1, 5])
+
+    def test_nearest_within_radius(self):
+        self.assertEqual(Path.nearest(self.point, 3, radius=10), [self.near, self.middle])
+        self.assertEqual(Path.nearest(self.point, 3, radius=0.5), [])
+        self.assertRaises(IndexError, Path.closest, self.point, radius=0.5)
+
+    def test_nearest_filters(self):
+        self.near.valid = False
+        self.near.save()
+        self.assertEqual(Path.closest(self.point, valid=True), self.middle)
+        self.far.structure = Structure.objects.create(name="other")
+        self.far.save()
+        self.assertEqual(Path.closest(self.point, structure=self.far.structure), self.far)
+
+    def test_long_path_is_found(self):
+        # Its bounding box centroid is farther from the point than those of
+        # more paths than KNN candidates, but the path itself is the closest
+        for i in range(PathHelper.KNN_CANDIDATES + 5):
+            PathFactory.create(geom=LineString((-1, 2 + i * 0.1), (1, 2 + i * 0.1)))
+        longest = PathFactory.create(geom=LineString((0, 0.5), (20000, 0.5)))
+        self.assertEqual(Path.closest(self.point), longest)
+        self.assertEqual(Path.nearest(self.point, 2), [longest, self.near])
+
+    def test_invisible_paths_are_ignored_by_default(self):
+        self.near.visible = False
+        self.near.save()
+        self.assertEqual(Path.closest(self.point), self.middle)
+        self.assertEqual(Path.closest(self.point, visible=None), self.near)
+
+
+class PrefetchPropertiesTest(TestCase):
+    def setUp(self):
+        self.path1 = PathFactory.create(geom=LineString((0, 0), (10, 0)))
+        self.path2 = PathFactory.create(geom=LineString((0, 10), (10, 10)))
+        self.trail = TrailFactory.create(no_path=True)
+        self.trail.add_path(self.path1)
+
+    def test_path_properties_are_computed_at_once(self):
+        paths = prefetch_properties(Path.objects.order_by('pk'), 'trails')
+        with self.assertNumQueries(3):
+            paths = list(paths)
+            self.assertEqual(list(paths[0].trails), [self.trail])
+            self.assertEqual(list(paths[1].trails.all()), [])
+
+    def test_topology_properties_are_computed_at_once(self):
+        topology = TopologyFactory.create(no_path=True)
+        topology.add_path(self.path1, start=0.5, end=1)
+        topologies = prefetch_properties(Topology.objects.filter(pk=topology.pk), 'trails')
+        with self.assertNumQueries(3):
+            self.assertEqual(list(list(topologies)[0].trails), [self.trail])
+
+    def test_clones_compute_properties(self):
+        paths = prefetch_properties(Path.objects.all(), 'trails').filter(pk=self.path2.pk)
+        with self.assertNumQueries(2):
+            self.assertEqual(len(paths[0].trails), 0)
+
+    def test_prefetched_properties_are_querysets(self):
+        other = TrailFactory.create(no_path=True, name='A')
+        other.add_path(self.path1)
+        path = prefetch_properties(Path.objects.filter(pk=self.path1.pk), 'trails')[0]
+        self.assertTrue(isinstance(path.trails, QuerySet))
+        # Ordered like the property computed without prefetching
+        self.assertEqual(list(path.trails), list(Path.objects.get(pk=self.path1.pk).trails))
+        self.assertEqual([trail.name for trail in path.trails], ['A', self.trail.name])
+        self.assertEqual(list(path.trails.values_list('pk', flat=True)), [other.pk, self.trail.pk])
+
+    def test_prefetched_properties_are_not_computed_again(self):
+        path = prefetch_properties(Path.objects.filter(pk=self.path1.pk), 'trails')[0]
+        with mock.patch.object(Trail, 'path_trails') as path_trails:
+            self.assertEqual(list(path.trails), [self.trail])
+            self.assertFalse(path_trails.called)
+
+    def test_other_names_are_ignored(self):
+        paths = Path.objects.all()
+        self.assertIs(prefetch_properties(paths, 'name', 'length'), paths)
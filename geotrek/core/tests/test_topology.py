@@ -1,16 +1,18 @@
+import inspect
 import json
 import math
 
 from django.test import TestCase
 from django.conf import settings
-from django.db import connections, DEFAULT_DB_ALIAS
+from django.core.management import call_command
+from django.db import connections, models, transaction, DEFAULT_DB_ALIAS, IntegrityError
 from django.contrib.gis.geos import Point, LineString
 
 from geotrek.common.utils import dbnow, almostequal
 from geotrek.core.factories import (PathFactory, PathAggregationFactory,
                                     TopologyFactory)
-from geotrek.core.models import Path, Topology, PathAggregation
-from geotrek.core.helpers import TopologyHelper
+from geotrek.core.models import Path, Topology, PathAggregation, PendingTopologyUpdate
+from geotrek.core.helpers import TopologyHelper, deferred_topology_update
 
 
 def dictfetchall(cursor):
@@ -882,6 +884,140 @@ class TopologyDerialization(TestCase):
         self.assertTrue(almostequal(start_before, start_after), '%s != %s' % (start_before, start_after))
         self.assertTrue(almostequal(end_before, end_after), '%s != %s' % (end_before, end_after))
 
+    def test_deserialize_computes_geometry_once(self):
+        p1 = PathFactory.create(geom=LineString((0, 0), (2, 0)))
+        p2 = PathFactory.create(geom=LineString((2, 0), (2, 2)))
+        p3 = PathFactory.create(geom=LineString((2, 2), (4, 2)))
+        pks = [p.pk for p in [p1, p2, p3]]
+        topology = Topology.deserialize('{"paths": %s, "positions": {"0": [0.5, 1.0], "2": [0.0, 0.5]}}' % (pks))
+        self.assertEqual(topology.geom, LineString((1, 0), (2, 0), (2, 2), (3, 2), srid=settings.SRID))
+        self.assertAlmostEqual(topology.length, 4.0)
+        self.assertEqual([a.order for a in topology.aggregations.all()], [0, 1, 2])
+
+    def test_deserialize_unknown_path(self):
+        path = PathFactory.create()
+        self.assertRaises(ValueError, Topology.deserialize, '{"paths": [%s, 0]}' % path.pk)
+
+    def test_add_paths_skips_intermediary_computations(self):
+        p1 = PathFactory.create(geom=LineString((0, 0), (2, 0)))
+        p2 = PathFactory.create(geom=LineString((2, 0), (2, 2)))
+        topology = TopologyFactory.create(no_path=True)
+        topology.add_paths([(p1, 0.0, 1.0, 0), (p2, 0.0, 1.0, 1)])
+        self.assertEqual(topology.geom, LineString((0, 0), (2, 0), (2, 2), srid=settings.SRID))
+        # Flag was only set during insertions
+        cursor = connections[DEFAULT_DB_ALIAS].cursor()
+        cursor.execute("SELECT ft_skip_topology_update()")
+        self.assertFalse(cursor.fetchone()[0])
+
+
+class TopologyDeferredUpdateTest(TestCase):
+
+    def setUp(self):
+        self.path = PathFactory.create(geom=LineString((0, 0), (10, 0)))
+        self.topology = TopologyFactory.create(no_path=True)
+        self.topology.add_path(self.path, start=0.0, end=0.5)
+
+    def move_path(self):
+        # Update at DB-level, since Path.save() defers updates itself
+        cursor = connections[DEFAULT_DB_ALIAS].cursor()
+        cursor.execute("UPDATE l_t_troncon SET geom = ST_GeomFromText('LINESTRING(0 0, 0 10)', %s) WHERE id = %s",
+                       [settings.SRID, self.path.pk])
+
+    def test_topologies_computed_when_leaving_block(self):
+        with deferred_topology_update():
+            self.move_path()
+            self.move_path()
+            self.assertEqual(PendingTopologyUpdate.objects.filter(topology=self.topology.pk).count(), 1)
+            self.topology.reload()
+            self.assertEqual(self.topology.geom.coords, ((0, 0), (5, 0)))
+        self.assertEqual(PendingTopologyUpdate.objects.count(), 0)
+        self.topology.reload()
+        self.assertEqual(self.topology.geom.coords, ((0, 0), (0, 5)))
+
+    def test_topologies_are_queued_once(self):
+        with deferred_topology_update(process=False):
+            self.move_path()
+        with transaction.atomic():
+            self.assertRaises(IntegrityError, PendingTopologyUpdate.objects.create, topology=self.topology.pk)
+        with deferred_topology_update(process=False):
+            self.move_path()
+        self.assertEqual(PendingTopologyUpdate.objects.count(), 1)
+
+    def test_nested_blocks(self):
+        with deferred_topology_update():
+            with deferred_topology_update():
+                self.move_path()
+            self.assertEqual(PendingTopologyUpdate.objects.count(), 1)
+        self.assertEqual(PendingTopologyUpdate.objects.count(), 0)
+
+    def test_topologies_computed_by_command(self):
+        with deferred_topology_update(process=False):
+            self.move_path()
+        self.assertEqual(PendingTopologyUpdate.objects.count(), 1)
+        call_command('update_topologies', verbosity=0)
+        self.assertEqual(PendingTopologyUpdate.objects.count(), 0)
+        self.topology.reload()
+        self.assertEqual(self.topology.geom.coords, ((0, 0), (0, 5)))
+
+    def test_path_reversed(self):
+        self.path.reverse()
+        self.path.save()
+        self.topology.reload()
+        self.assertEqual(self.topology.geom.coords, ((0, 0), (5, 0)))
+        self.assertEqual(PendingTopologyUpdate.objects.count(), 0)
+
+
+class TopologySaveTest(TestCase):
+
+    def setUp(self):
+        self.path = PathFactory.create(geom=LineString((0, 0), (10, 0)))
+        self.topology = TopologyFactory.create(no_path=True)
+        self.topology.add_path(self.path, start=0.0, end=0.5)
+
+    def test_django_update_hook_is_unchanged(self):
+        # UpdateReturningMixin overrides this private method of Django models
+        args = inspect.getargspec(models.Model._do_update).args
+        self.assertEqual(args, ['self', 'base_qs', 'using', 'pk_val', 'values', 'update_fields', 'forced_update'])
+
+    def test_update_refreshes_in_a_single_query(self):
+        with self.assertNumQueries(1):
+            self.topology.save()
+        self.assertEqual(self.topology.geom.coords, ((0, 0), (5, 0)))
+        self.assertEqual(self.topology.length, 5)
+
+    def test_computed_values_are_not_overwritten(self):
+        self.topology.length = 0
+        self.topology.geom = None
+        self.topology.save()
+        self.assertEqual(self.topology.length, 5)
+        self.assertEqual(self.topology.geom.coords, ((0, 0), (5, 0)))
+        fromdb = Topology.objects.get(pk=self.topology.pk)
+        self.assertEqual(fromdb.length, 5)
+
+    def test_offset_change_reloads_geometry(self):
+        self.topology.offset = 1
+        self.topology.save()
+        fromdb = Topology.objects.get(pk=self.topology.pk)
+        self.assertEqual(self.topology.geom, fromdb.geom)
+        self.assertNotEqual(self.topology.geom.coords, ((0, 0), (5, 0)))
+
+    def test_point_geometry_set_by_django(self):
+        point = TopologyFactory.create(no_path=True, offset=1)
+        point.add_path(self.path, start=0.5, end=0.5)
+        point.geom = Point(5, 1, srid=settings.SRID)
+        point.save()
+        self.assertEqual(point.geom.coords, (5, 1))
+        self.assertEqual(Topology.objects.get(pk=point.pk).geom.coords, (5, 1))
+
+    def test_path_update_refreshes_computed_values(self):
+        self.path.name = 'renamed'
+        self.path.save()
+        self.assertEqual(self.path.length, 10)
+        self.path.geom = LineString((0, 0), (0, 20))
+        self.path.save()
+        self.assertEqual(self.path.length, 20)
+        self.assertEqual(self.path.geom, Path.objects.get(pk=self.path.pk).geom)
+
 
 class TopologyOverlappingTest(TestCase):
 
@@ -937,3 +1073,26 @@ class TopologyOverlappingTest(TestCase):
         from geotrek.trekking.models import Trek
         overlaps = Topology.overlapping(Trek.objects.all())
         self.assertEqual(list(overlaps), [])
+
+    def test_overlapping_is_a_single_query(self):
+        with self.assertNumQueries(1):
+            list(Topology.overlapping(self.topo1))
+
+    def test_overlapping_of_many_topologies(self):
+        overlaps = Topology.overlapping(Topology.objects.filter(pk__in=[self.topo2.pk, self.point1.pk]))
+        self.assertEqual(set(overlaps), set([self.topo1, self.topo2,
+                                             self.point1, self.point2, self.point3]))
+
+    def test_overlapping_many_sorts_by_topology(self):
+        with self.assertNumQueries(2):
+            overlaps = Topology.overlapping_many([self.topo1, self.topo2, self.point1])
+        self.assertEqual(overlaps[self.topo1.pk], [self.topo1,
+                                                   self.point2, self.point3, self.point1, self.topo2])
+        self.assertEqual(overlaps[self.topo2.pk], [self.topo2,
+                                                   self.point1, self.point3, self.point2, self.topo1])
+        self.assertEqual(set(overlaps[self.point1.pk]), set([self.point1, self.topo1, self.topo2]))
+
+    def test_overlapping_many_ignores_deleted(self):
+        self.point1.delete()
+        overlaps = Topology.overlapping_many([self.topo2])
+        self.assertNotIn(self.point1, overlaps[self.topo2.pk])
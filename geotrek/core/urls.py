@@ -5,12 +5,14 @@ from mapentity import registry
 
 from geotrek.altimetry.urls import AltimetryEntityOptions
 from geotrek.core.models import Path, Trail
-from geotrek.core.views import get_graph_json, merge_path, ParametersView
+from geotrek.core.views import get_graph_json, get_graph_binary, get_route_json, merge_path, ParametersView
 
 
 urlpatterns = patterns(
     '',
     url(r'^api/graph.json$', get_graph_json, name="path_json_graph"),
+    url(r'^api/graph.bin$', get_graph_binary, name="path_binary_graph"),
+    url(r'^api/route.json$', get_route_json, name="path_json_route"),
     url(r'^api/(?P<lang>\w\w)/parameters.json$', ParametersView.as_view(), name='parameters_json'),
     url(r'^mergepath/$', merge_path, name="merge_path"),
 )
@@ -2,28 +2,28 @@
 
 import json
 import logging
+import re
 
 from django.contrib.auth.decorators import permission_required
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.http import last_modified as cache_last_modified
+from django.views.decorators.http import condition
 from django.views.decorators.cache import never_cache as force_cache_validation
 from django.views.generic import View
 from django.utils.translation import ugettext as _
-from django.core.cache import get_cache
 from django.core.urlresolvers import reverse
 from django.shortcuts import redirect
 from mapentity import registry
-from mapentity.views import (MapEntityLayer, MapEntityList, MapEntityJsonList,
+from mapentity.views import (MapEntityLayer, MapEntityList,
                              MapEntityDetail, MapEntityDocument, MapEntityCreate, MapEntityUpdate,
-                             MapEntityDelete, MapEntityFormat,
-                             HttpJSONResponse)
+                             MapEntityDelete, HttpJSONResponse)
 
 from geotrek.authent.decorators import same_structure_required
 from geotrek.common.utils import classproperty
+from geotrek.common.views import MapEntityJsonList, MapEntityFormat
 from geotrek.core.models import AltimetryMixin
 
-from .models import Path, Trail, Topology
+from .models import Path, PathChange, Trail, Topology
 from .forms import PathForm, TrailForm
 from .filters import PathFilterSet, TrailFilterSet
 from . import graph as graph_lib
@@ -86,26 +86,6 @@ class PathList(MapEntityList):
     def get_template_names(self):
         return (u"core/path_list.html",)
 
-    def get_queryset(self):
-        """
-        denormalize ``trail`` column from list.
-        """
-        qs = super(PathList, self).get_queryset()
-
-        denormalized = {}
-        if settings.TRAIL_MODEL_ENABLED:
-            paths_id = qs.values_list('id', flat=True)
-            paths_trails = Trail.objects.filter(aggregations__path__id__in=paths_id)
-            by_id = dict([(trail.id, trail) for trail in paths_trails])
-            trails_paths_ids = paths_trails.values_list('id', 'aggregations__path__id')
-            for trail_id, path_id in trails_paths_ids:
-                denormalized.setdefault(path_id, []).append(by_id[trail_id])
-
-        for path in qs:
-            path_trails = denormalized.get(path.id, [])
-            setattr(path, '_trails', path_trails)
-            yield path
-
 
 class PathJsonList(MapEntityJsonList, PathList):
     pass
@@ -160,29 +140,96 @@ class PathDelete(MapEntityDelete):
         return super(PathDelete, self).dispatch(*args, **kwargs)
 
 
+def path_graph_etag(request, *args, **kwargs):
+    # The graph is refreshed once per request, and used by the view afterwards
+    request.path_graph = graph_lib.get_path_graph()
+    return request.path_graph.token
+
+
+GRAPH_REVISION_RE = re.compile(r'^(\w+)/(\d+/\d+:\d+:[\d,]*)$')
+
+
 @login_required
-@cache_last_modified(lambda x: Path.latest_updated())
+@condition(etag_func=path_graph_etag, last_modified_func=lambda x: Path.latest_updated())
 @force_cache_validation
 def get_graph_json(request):
-    cache = get_cache('fat')
-    key = 'path_graph_json'
+    """
+    Returns the graph of paths used by the topology editor.
+
+    Its revision is given in the ``X-Graph-Revision`` header. With the ``since``
+    parameter (a revision previously obtained), only the edges changed after
+    this revision are returned, along with the ids of the deleted ones and
+    the new ``revision``: nodes are left to the client (see
+    ``Geotrek.applyGraphDelta()``). The whole graph is returned (``full``)
+    if the graph was built again from scratch meanwhile.
+    """
+    graph = request.path_graph
+    since = request.GET.get('since')
+    if since is None:
+        response = HttpJSONResponse(graph.as_json())
+    else:
+        match = GRAPH_REVISION_RE.match(since)
+        if match is None:
+            return HttpJSONResponse(json.dumps({'error': u"Invalid revision: %s" % since}), status=400)
+        generation, revision = match.groups()
+        if generation == graph.generation:
+            changed = PathChange.since(revision)[1]
+            delta = graph.delta(changed)
+        else:
+            delta = graph.as_dict()
+            delta.update(full=True, deleted_edges=[])
+        delta['revision'] = graph.token
+        response = HttpJSONResponse(json.dumps(delta))
+    response['X-Graph-Revision'] = graph.token
+    return response
 
-    result = cache.get(key)
-    latest = Path.latest_updated()
 
-    if result and latest:
-        cache_latest, json_graph = result
-        # Not empty and still valid
-        if cache_latest and cache_latest >= latest:
-            return HttpJSONResponse(json_graph)
+@login_required
+@condition(etag_func=path_graph_etag, last_modified_func=lambda x: Path.latest_updated())
+@force_cache_validation
+def get_graph_binary(request):
+    """
+    Returns the graph of paths in the compact binary format
+    (see ``graph.CompactGraph.pack()``), with the same node ids and
+    revision as the JSON graph.
+    """
+    graph = request.path_graph
+    response = HttpResponse(graph.pack(), content_type='application/octet-stream')
+    response['X-Graph-Revision'] = graph.token
+    return response
+
 
-    # cache does not exist or is not up to date
-    # rebuild the graph and cache the json
-    graph = graph_lib.graph_edges_nodes_of_qs(Path.objects.all())
-    json_graph = json.dumps(graph)
+@login_required
+def get_route_json(request):
+    """
+    Compute the shortest route between steps on the path network.
+
+    Steps are given as a JSON list in the ``steps`` parameter, for example:
 
-    cache.set(key, (latest, json_graph))
-    return HttpJSONResponse(json_graph)
+        [{"path": 1245, "position": 0.3}, {"path": 1208, "position": 1.0}]
+
+    The response contains the route ``length``, and the ``topology`` serialized
+    as expected by ``TopologyHelper.deserialize()``.
+    """
+    try:
+        steps = json.loads(request.GET.get('steps', ''))
+        steps = [(int(step['path']), float(step['position'])) for step in steps]
+        for path_id, position in steps:
+            if not 0.0 <= position <= 1.0:
+                raise ValueError(u"position %s of path %s is not within [0, 1]" % (position, path_id))
+    except (ValueError, TypeError, KeyError) as e:
+        return HttpJSONResponse(json.dumps({'error': u"Invalid steps: %s" % e}), status=400)
+
+    graph = graph_lib.get_path_graph()
+    try:
+        length, legs = graph.route(steps)
+    except graph_lib.NoRouteError as e:
+        return HttpJSONResponse(json.dumps({'error': unicode(e)}), status=400)
+    response = {
+        'length': length,
+        'topology': graph_lib.route_serialized(legs),
+    }
+    return HttpJSONResponse(json.dumps(response))
 
 
 class TrailLayer(MapEntityLayer):
@@ -140,8 +140,10 @@ class Infrastructure(BaseInfrastructure):
     def topology_infrastructures(cls, topology):
         return cls.overlapping(topology)
 
-Path.add_property('infrastructures', lambda self: Infrastructure.path_infrastructures(self), _(u"Infrastructures"))
-Topology.add_property('infrastructures', lambda self: Infrastructure.topology_infrastructures(self), _(u"Infrastructures"))
+Path.add_property('infrastructures', lambda self: Infrastructure.path_infrastructures(self), _(u"Infrastructures"),
+                  bulk=Infrastructure.path_topologies_many, queryset=Infrastructure)
+Topology.add_property('infrastructures', lambda self: Infrastructure.topology_infrastructures(self), _(u"Infrastructures"),
+                      bulk=Infrastructure.overlapping_many, queryset=Infrastructure)
 
 
 class SignageGISManager(gismodels.GeoManager):
@@ -174,5 +176,7 @@ class Signage(BaseInfrastructure):
     def topology_signages(cls, topology):
         return cls.overlapping(topology)
 
-Path.add_property('signages', lambda self: Signage.path_signages(self), _(u"Signages"))
-Topology.add_property('signages', lambda self: Signage.topology_signages(self), _(u"Signages"))
+Path.add_property('signages', lambda self: Signage.path_signages(self), _(u"Signages"),
+                  bulk=Signage.path_topologies_many, queryset=Signage)
+Topology.add_property('signages', lambda self: Signage.topology_signages(self), _(u"Signages"),
+                      bulk=Signage.overlapping_many, queryset=Signage)
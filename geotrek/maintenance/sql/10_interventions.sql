@@ -101,6 +101,9 @@ CREATE TRIGGER m_t_intervention_altimetry_iu_tgr
 BEFORE INSERT OR UPDATE OF topology_id ON m_t_intervention
 FOR EACH ROW EXECUTE PROCEDURE update_altimetry_intervention();
 
+-- Store elevation profile when geom_3d changes
+SELECT ft_add_elevation_profile('m_t_intervention');
+
 
 -------------------------------------------------------------------------------
 -- Compute area
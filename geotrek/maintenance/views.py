@@ -3,12 +3,12 @@
 import logging
 
 from django.utils.translation import ugettext_lazy as _
-from mapentity.views import (MapEntityLayer, MapEntityList, MapEntityJsonList, MapEntityFormat,
+from mapentity.views import (MapEntityLayer, MapEntityList,
                              MapEntityDetail, MapEntityDocument, MapEntityCreate, MapEntityUpdate, MapEntityDelete)
 
 from geotrek.core.views import CreateFromTopologyMixin
 from geotrek.altimetry.models import AltimetryMixin
-from geotrek.common.views import FormsetMixin
+from geotrek.common.views import FormsetMixin, MapEntityJsonList, MapEntityFormat
 from geotrek.authent.decorators import same_structure_required
 from geotrek.infrastructure.models import Infrastructure, Signage
 from .models import Intervention, Project
@@ -288,7 +288,13 @@ CACHES = {
     # The fat backend is used to store big chunk of data (>1 Mo)
     'fat': {
         'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
-    }
+    },
+    # Names of pictures thumbnails (must not be a dummy cache)
+    'thumbnails': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'TIMEOUT': 3600 * 24 * 30,
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
 }
 
 # A sample logging configuration. The only tangible logging
@@ -422,8 +428,10 @@ ALTIMETRIC_PROFILE_WIDTH = 800
 ALTIMETRIC_PROFILE_FONTSIZE = 25
 ALTIMETRIC_PROFILE_FONT = 'ubuntu'
 ALTIMETRIC_PROFILE_MIN_YSCALE = 1200  # Minimum y scale (in meters)
+ALTIMETRIC_PROFILE_POINTS = 500  # Maximum number of points of charts and synced profiles
 ALTIMETRIC_AREA_MAX_RESOLUTION = 150  # Maximum number of points (by width/height)
 ALTIMETRIC_AREA_MARGIN = 0.15
+ALTIMETRIC_DEM_ARRAY = None  # Path of DEM exported with loaddem --export-array (requires NumPy)
 
 
 # Let this be defined at instance-level
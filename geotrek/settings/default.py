@@ -61,6 +61,8 @@ CACHES['default']['TIMEOUT'] = envini.getint('cachetimeout', 3600 * 24)
 CACHES['fat']['BACKEND'] = 'django.core.cache.backends.filebased.FileBasedCache'
 CACHES['fat']['LOCATION'] = CACHE_ROOT
 CACHES['fat']['TIMEOUT'] = envini.getint('cachetimeout', 3600 * 24)
+CACHES['thumbnails']['BACKEND'] = 'django.core.cache.backends.filebased.FileBasedCache'
+CACHES['thumbnails']['LOCATION'] = os.path.join(CACHE_ROOT, 'thumbnails')
 
 
 LANGUAGE_CODE = envini.get('language', LANGUAGE_CODE, env=False)
@@ -23,7 +23,7 @@ from geotrek.common.mixins import (NoDeleteMixin, TimeStampedModelMixin,
                                    PublishableMixin, PicturesMixin,
                                    AddPropertyMixin)
 from geotrek.common.models import Theme
-from geotrek.common.utils import intersecting
+from geotrek.common.utils import intersecting, intersecting_bulk
 
 from extended_choices import Choices
 from multiselectfield import MultiSelectField
@@ -392,10 +392,14 @@ class TouristicContent(AddPropertyMixin, PublishableMixin, MapEntityMixin, Struc
         return ','.join([unicode(source) for source in self.source.all()])
 
 
-Topology.add_property('touristic_contents', lambda self: intersecting(TouristicContent, self), _(u"Touristic contents"))
-Topology.add_property('published_touristic_contents', lambda self: intersecting(TouristicContent, self).filter(published=True), _(u"Published touristic contents"))
-TouristicContent.add_property('touristic_contents', lambda self: intersecting(TouristicContent, self), _(u"Touristic contents"))
-TouristicContent.add_property('published_touristic_contents', lambda self: intersecting(TouristicContent, self).filter(published=True), _(u"Published touristic contents"))
+Topology.add_property('touristic_contents', lambda self: intersecting(TouristicContent, self), _(u"Touristic contents"),
+                      bulk=intersecting_bulk(TouristicContent), queryset=TouristicContent)
+Topology.add_property('published_touristic_contents', lambda self: intersecting(TouristicContent, self).filter(published=True), _(u"Published touristic contents"),
+                      bulk=intersecting_bulk(TouristicContent, published=True), queryset=TouristicContent)
+TouristicContent.add_property('touristic_contents', lambda self: intersecting(TouristicContent, self), _(u"Touristic contents"),
+                              bulk=intersecting_bulk(TouristicContent), queryset=TouristicContent)
+TouristicContent.add_property('published_touristic_contents', lambda self: intersecting(TouristicContent, self).filter(published=True), _(u"Published touristic contents"),
+                              bulk=intersecting_bulk(TouristicContent, published=True), queryset=TouristicContent)
 
 
 class TouristicEventType(OptionalPictogramMixin):
@@ -519,11 +523,19 @@ class TouristicEvent(AddPropertyMixin, PublishableMixin, MapEntityMixin, Structu
         return ', '.join([unicode(source) for source in self.source.all()])
 
 
-TouristicEvent.add_property('touristic_contents', lambda self: intersecting(TouristicContent, self), _(u"Touristic contents"))
-TouristicEvent.add_property('published_touristic_contents', lambda self: intersecting(TouristicContent, self).filter(published=True), _(u"Published touristic contents"))
-Topology.add_property('touristic_events', lambda self: intersecting(TouristicEvent, self), _(u"Touristic events"))
-Topology.add_property('published_touristic_events', lambda self: intersecting(TouristicEvent, self).filter(published=True), _(u"Published touristic events"))
-TouristicContent.add_property('touristic_events', lambda self: intersecting(TouristicEvent, self), _(u"Touristic events"))
-TouristicContent.add_property('published_touristic_events', lambda self: intersecting(TouristicEvent, self).filter(published=True), _(u"Published touristic events"))
-TouristicEvent.add_property('touristic_events', lambda self: intersecting(TouristicEvent, self), _(u"Touristic events"))
-TouristicEvent.add_property('published_touristic_events', lambda self: intersecting(TouristicEvent, self).filter(published=True), _(u"Published touristic events"))
+TouristicEvent.add_property('touristic_contents', lambda self: intersecting(TouristicContent, self), _(u"Touristic contents"),
+                            bulk=intersecting_bulk(TouristicContent), queryset=TouristicContent)
+TouristicEvent.add_property('published_touristic_contents', lambda self: intersecting(TouristicContent, self).filter(published=True), _(u"Published touristic contents"),
+                            bulk=intersecting_bulk(TouristicContent, published=True), queryset=TouristicContent)
+Topology.add_property('touristic_events', lambda self: intersecting(TouristicEvent, self), _(u"Touristic events"),
+                      bulk=intersecting_bulk(TouristicEvent), queryset=TouristicEvent)
+Topology.add_property('published_touristic_events', lambda self: intersecting(TouristicEvent, self).filter(published=True), _(u"Published touristic events"),
+                      bulk=intersecting_bulk(TouristicEvent, published=True), queryset=TouristicEvent)
+TouristicContent.add_property('touristic_events', lambda self: intersecting(TouristicEvent, self), _(u"Touristic events"),
+                              bulk=intersecting_bulk(TouristicEvent), queryset=TouristicEvent)
+TouristicContent.add_property('published_touristic_events', lambda self: intersecting(TouristicEvent, self).filter(published=True), _(u"Published touristic events"),
+                              bulk=intersecting_bulk(TouristicEvent, published=True), queryset=TouristicEvent)
+TouristicEvent.add_property('touristic_events', lambda self: intersecting(TouristicEvent, self), _(u"Touristic events"),
+                            bulk=intersecting_bulk(TouristicEvent), queryset=TouristicEvent)
+TouristicEvent.add_property('published_touristic_events', lambda self: intersecting(TouristicEvent, self).filter(published=True), _(u"Published touristic events"),
+                            bulk=intersecting_bulk(TouristicEvent, published=True), queryset=TouristicEvent)
@@ -2,9 +2,12 @@ from django.test import TestCase
 from django.conf import settings
 from django.test.utils import override_settings
 
+from geotrek.common.utils import intersecting_bulk, intersecting_many
 from geotrek.core import factories as core_factories
+from geotrek.tourism.models import TouristicContent, TouristicEvent
 from geotrek.tourism import factories as tourism_factories
 from geotrek.trekking import factories as trekking_factories
+from geotrek.trekking.models import Trek, TrekProximity
 
 
 class TourismRelations(TestCase):
@@ -14,11 +17,11 @@ class TourismRelations(TestCase):
         self.content2 = tourism_factories.TouristicContentFactory(geom='SRID=%s;POINT(2 2)' % settings.SRID)
         self.event = tourism_factories.TouristicEventFactory(geom='SRID=%s;POINT(50 50)' % settings.SRID)
         self.event2 = tourism_factories.TouristicEventFactory(geom='SRID=%s;POINT(60 60)' % settings.SRID)
-        path = core_factories.PathFactory(geom='SRID=%s;LINESTRING(0 100, 100 100)' % settings.SRID)
+        self.path = core_factories.PathFactory(geom='SRID=%s;LINESTRING(0 100, 100 100)' % settings.SRID)
         self.trek = trekking_factories.TrekFactory(no_path=True)
-        self.trek.add_path(path)
+        self.trek.add_path(self.path)
         self.poi = trekking_factories.POIFactory(no_path=True)
-        self.poi.add_path(path, start=0.5, end=0.5)
+        self.poi.add_path(self.path, start=0.5, end=0.5)
 
     def test_spatial_link_with_tourism(self):
         self.assertIn(self.content2, self.content.touristic_contents.all())
@@ -72,3 +75,76 @@ class TourismRelations(TestCase):
         self.trek.practice.save()
         self.assertNotIn(self.content, self.trek.touristic_contents.all())
         self.assertNotIn(self.event, self.trek.touristic_events.all())
+
+    def test_spatial_links_of_many_objects(self):
+        contents = intersecting_many(TouristicContent, [self.content, self.content2])
+        self.assertEqual(contents[self.content.pk], [self.content2])
+        self.assertEqual(contents[self.content2.pk], [self.content])
+        events = intersecting_many(TouristicEvent, [self.content, self.content2])
+        self.assertIn(self.event, events[self.content.pk])
+
+    def test_spatial_links_of_many_treks_respect_their_distance(self):
+        trek = trekking_factories.TrekFactory(no_path=True)
+        trek.add_path(self.path)
+        trek.practice.distance = 10
+        trek.practice.save()
+        treks = list(Trek.objects.filter(pk__in=[self.trek.pk, trek.pk]).select_related('practice'))
+        with self.assertNumQueries(2):
+            contents = intersecting_many(TouristicContent, treks)
+        self.assertIn(self.content, contents[self.trek.pk])
+        self.assertEqual(contents[trek.pk], [])
+
+    def test_published_spatial_links_of_many_objects(self):
+        self.content.published = False
+        self.content.save()
+        contents = intersecting_many(TouristicContent, [self.content, self.content2], published=True)
+        self.assertEqual(contents[self.content.pk], [self.content2])
+        self.assertEqual(contents[self.content2.pk], [])
+        bulk = intersecting_bulk(TouristicContent, published=True)
+        self.assertEqual(bulk([self.content, self.content2]), contents)
+
+    def test_close_objects_follow_geometry_changes(self):
+        self.content.geom = 'SRID=%s;POINT(1000 1000)' % settings.SRID
+        self.content.save()
+        self.assertNotIn(self.content, self.trek.touristic_contents.all())
+        self.assertNotIn(self.trek, self.content.treks.all())
+
+    def test_close_objects_are_ordered_along_trek(self):
+        content = tourism_factories.TouristicContentFactory(geom='SRID=%s;POINT(90 110)' % settings.SRID)
+        content2 = tourism_factories.TouristicContentFactory(geom='SRID=%s;POINT(10 110)' % settings.SRID)
+        self.assertEqual(list(self.trek.touristic_contents.all()),
+                         [self.content, self.content2, content2, content])
+
+    def test_close_objects_of_many_treks(self):
+        trek = trekking_factories.TrekFactory(no_path=True)
+        trek.add_path(self.path)
+        trek.practice.distance = 10
+        trek.practice.save()
+        treks = list(Trek.objects.filter(pk__in=[self.trek.pk, trek.pk]).select_related('practice'))
+        with self.assertNumQueries(1):
+            contents = TrekProximity.close_objects_many(TouristicContent, treks)
+        self.assertEqual(contents[self.trek.pk], [self.content, self.content2])
+        self.assertEqual(contents[trek.pk], [])
+        with self.assertNumQueries(1):
+            treks = TrekProximity.treks_many([self.content, self.content2])
+        # Contents find treks within TOURISM_INTERSECTION_MARGIN
+        self.assertItemsEqual(treks[self.content.pk], [self.trek, trek])
+        self.assertItemsEqual(treks[self.content2.pk], [self.trek, trek])
+
+    def test_treks_of_content_use_margin_rather_than_practice_distance(self):
+        self.trek.practice.distance = 10
+        self.trek.practice.save()
+        trek = Trek.objects.get(pk=self.trek.pk)
+        self.assertNotIn(self.content, trek.touristic_contents.all())
+        self.assertIn(trek, self.content.treks.all())
+        with override_settings(TOURISM_INTERSECTION_MARGIN=10):
+            self.assertNotIn(trek, self.content.treks.all())
+
+    def test_treks_with_larger_practice_distance_find_farther_contents(self):
+        content = tourism_factories.TouristicContentFactory(geom='SRID=%s;POINT(50 700)' % settings.SRID)
+        self.assertNotIn(content, self.trek.touristic_contents.all())
+        self.trek.practice.distance = 1000
+        self.trek.practice.save()
+        trek = Trek.objects.get(pk=self.trek.pk)
+        self.assertIn(content, trek.touristic_contents.all())
+        self.assertNotIn(trek, content.treks.all())
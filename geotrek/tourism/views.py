@@ -14,7 +14,7 @@ import geojson
 from mapentity.views import (JSONResponseMixin, MapEntityCreate,
                              MapEntityUpdate, MapEntityLayer, MapEntityList,
                              MapEntityDetail, MapEntityDelete, MapEntityViewSet,
-                             MapEntityFormat, MapEntityDocument)
+                             MapEntityDocument)
 import requests
 from requests.exceptions import RequestException
 from rest_framework import permissions as rest_permissions, viewsets
@@ -25,8 +25,9 @@ from rest_framework.views import APIView
 from rest_framework_gis.serializers import GeoFeatureModelSerializer
 
 from geotrek.authent.decorators import same_structure_required
+from geotrek.common.mixins import prefetch_properties
 from geotrek.common.models import RecordSource, TargetPortal
-from geotrek.common.views import DocumentPublic
+from geotrek.common.views import DocumentPublic, MapEntityFormat
 from geotrek.tourism.serializers import TouristicContentCategorySerializer
 from geotrek.trekking.models import Trek
 from geotrek.trekking.serializers import POISerializer
@@ -292,7 +293,7 @@ class TouristicContentViewSet(MapEntityViewSet):
             qs = qs.filter(portal__name__in=self.request.GET['portal'].split(','))
 
         qs = qs.transform(settings.API_SRID, field_name='geom')
-        return qs
+        return prefetch_properties(qs, 'pictures')
 
 
 class TouristicContentCategoryViewSet(MapEntityViewSet):
@@ -327,7 +328,7 @@ class TouristicEventViewSet(MapEntityViewSet):
             qs = qs.filter(portal__name__in=self.request.GET['portal'].split(','))
 
         qs = qs.transform(settings.API_SRID, field_name='geom')
-        return qs
+        return prefetch_properties(qs, 'pictures')
 
 
 class InformationDeskViewSet(viewsets.ModelViewSet):
@@ -377,11 +378,13 @@ class TrekTouristicContentAndPOIViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         pk = self.kwargs['pk']
         try:
-            trek = Trek.objects.existing().get(pk=pk, published=True)
+            trek = Trek.objects.existing().select_related('practice').get(pk=pk, published=True)
         except Trek.DoesNotExist:
             raise Http404
         qs1 = trek.touristic_contents.filter(published=True).transform(settings.API_SRID, field_name='geom')
+        qs1 = prefetch_properties(qs1, 'pictures')
         qs2 = trek.pois.filter(published=True).transform(settings.API_SRID, field_name='geom')
+        qs2 = prefetch_properties(qs2, 'pictures')
         return chain(qs1, qs2)
 
 
@@ -396,7 +399,7 @@ class TrekTouristicContentViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         try:
-            trek = Trek.objects.existing().get(pk=self.kwargs['pk'])
+            trek = Trek.objects.existing().select_related('practice').get(pk=self.kwargs['pk'])
 
         except Trek.DoesNotExist:
             raise Http404
@@ -412,8 +415,8 @@ class TrekTouristicContentViewSet(viewsets.ModelViewSet):
         if 'portal' in self.request.GET:
             queryset = queryset.filter(portal__name__in=self.request.GET['portal'].split(','))
 
-        return queryset.transform(settings.API_SRID,
-                                  field_name='geom')
+        queryset = queryset.transform(settings.API_SRID, field_name='geom')
+        return prefetch_properties(queryset, 'pictures')
 
 
 class TrekTouristicEventViewSet(viewsets.ModelViewSet):
@@ -427,7 +430,7 @@ class TrekTouristicEventViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         try:
-            trek = Trek.objects.existing().get(pk=self.kwargs['pk'])
+            trek = Trek.objects.existing().select_related('practice').get(pk=self.kwargs['pk'])
 
         except Trek.DoesNotExist:
             raise Http404
@@ -440,8 +443,8 @@ class TrekTouristicEventViewSet(viewsets.ModelViewSet):
         if 'portal' in self.request.GET:
             queryset = queryset.filter(portal__name__in=self.request.GET['portal'].split(','))
 
-        return queryset.transform(settings.API_SRID,
-                                  field_name='geom')
+        queryset = queryset.transform(settings.API_SRID, field_name='geom')
+        return prefetch_properties(queryset, 'pictures')
 
 
 class TouristicCategoryView(APIView):
@@ -1,9 +1,12 @@
 import os.path
+from optparse import make_option
 
 from django.core.management.base import BaseCommand, CommandError
 from django.contrib.gis.geos import GEOSGeometry
+from django.db import transaction
 
 from geotrek.core.helpers import TopologyHelper
+from geotrek.core.models import Path
 from geotrek.trekking.models import POI, POIType
 
 
@@ -13,8 +16,19 @@ class Command(BaseCommand):
     can_import_settings = True
     field_name = 'name'
     field_poitype = 'type'
+    max_distance = None
+
+    option_list = BaseCommand.option_list + (
+        make_option('--max-distance', '-d', action='store', dest='max_distance', type='float',
+                    default=None, help='Skip points farther than this distance (in meters) from paths'),
+        make_option('--bulk', '-b', action='store_true', dest='bulk',
+                    default=False, help='Create POIs by chunks, snapping them on paths all at once'),
+        make_option('--chunk-size', '-c', action='store', dest='chunk_size', type='int',
+                    default=1000, help='Number of POIs created per transaction in bulk mode'),
+    )
 
     def handle(self, *args, **options):
+        self.max_distance = options.get('max_distance')
 
         try:
             from osgeo import gdal, ogr, osr  # NOQA
@@ -37,25 +51,62 @@ class Command(BaseCommand):
         count = layer.GetFeatureCount()
         self.stdout.write('%s objects found' % count)
 
+        if options.get('bulk'):
+            chunk_size = options.get('chunk_size') or 1000
+            for start in range(0, count, chunk_size):
+                chunk = [self.read_feature(layer.GetFeature(i))
+                         for i in range(start, min(start + chunk_size, count))]
+                with transaction.atomic():
+                    pois = self.create_pois(chunk)
+                for (geometry, name, poitype), poi in zip(chunk, pois):
+                    if poi is None:
+                        self.skipped(name)
+                self.stdout.write('%s/%s objects processed' % (start + len(chunk), count))
+            return
+
         for i in range(count):
-            feature = layer.GetFeature(i)
-            featureGeom = feature.GetGeometryRef()
-            geometry = GEOSGeometry(featureGeom.ExportToWkt())
-            name = feature.GetFieldAsString(self.field_name)
-            if name:
-                name = name.decode('utf-8')
-            poitype = feature.GetFieldAsString(self.field_poitype)
-            if poitype:
-                poitype = poitype.decode('utf-8')
-            self.create_poi(geometry, name, poitype)
+            geometry, name, poitype = self.read_feature(layer.GetFeature(i))
+            poi = self.create_poi(geometry, name, poitype)
+            if poi is None:
+                self.skipped(name)
+
+    def read_feature(self, feature):
+        featureGeom = feature.GetGeometryRef()
+        geometry = GEOSGeometry(featureGeom.ExportToWkt())
+        name = feature.GetFieldAsString(self.field_name)
+        if name:
+            name = name.decode('utf-8')
+        poitype = feature.GetFieldAsString(self.field_poitype)
+        if poitype:
+            poitype = poitype.decode('utf-8')
+        return geometry, name, poitype
+
+    def skipped(self, name):
+        if self.max_distance is None:
+            self.stderr.write('No path found for %s, skipped' % name)
+        else:
+            self.stderr.write('No path found within %g m of %s, skipped' % (self.max_distance, name))
 
     def create_poi(self, geometry, name, poitype):
+        # Use existing topology helpers to transform a Point(x, y)
+        # to a path aggregation (topology) on the nearest path
+        try:
+            topology = TopologyHelper._topologypoint(geometry.x, geometry.y, radius=self.max_distance)
+        except Path.DoesNotExist:
+            return None
         poitype, created = POIType.objects.get_or_create(label=poitype)
         poi = POI.objects.create(name=name, type=poitype)
-        # Use existing topology helpers to transform a Point(x, y)
-        # to a path aggregation (topology)
-        serialized = '{"lng": %s, "lat": %s}' % (geometry.x, geometry.y)
-        topology = TopologyHelper.deserialize(serialized)
         # Move deserialization aggregations to the POI
         poi.mutate(topology)
         return poi
+
+    def create_pois(self, features):
+        """
+        Bulk version of ``create_poi()``, for a list of ``(geometry, name, poitype)``.
+        """
+        poitypes = {}
+        for label in set(poitype for geometry, name, poitype in features):
+            poitypes[label], created = POIType.objects.get_or_create(label=label)
+        pois = [POI(name=name, type=poitypes[poitype]) for geometry, name, poitype in features]
+        return TopologyHelper.create_points(pois, [geometry for geometry, name, poitype in features],
+                                            radius=self.max_distance)
@@ -19,7 +19,7 @@ from django.utils.translation import ugettext as _
 from landez import TilesManager
 from landez.sources import DownloadError
 from geotrek.common.models import FileType  # NOQA
-from geotrek.altimetry.views import ElevationProfile, ElevationArea, serve_elevation_chart
+from geotrek.altimetry.views import ElevationProfile, ElevationArea, ElevationAreaGrid, serve_elevation_chart
 from geotrek.common import models as common_models
 from geotrek.common.views import ThemeViewSet
 from geotrek.core.views import ParametersView
@@ -259,7 +259,8 @@ class Command(BaseCommand):
 
     def sync_profile_json(self, lang, obj, zipfile=None):
         view = ElevationProfile.as_view(model=type(obj))
-        self.sync_object_view(lang, obj, view, 'profile.json', zipfile=zipfile)
+        params = {'points': settings.ALTIMETRIC_PROFILE_POINTS}
+        self.sync_object_view(lang, obj, view, 'profile.json', params=params, zipfile=zipfile)
 
     def sync_profile_png(self, lang, obj, zipfile=None):
         view = serve_elevation_chart
@@ -271,6 +272,8 @@ class Command(BaseCommand):
             return
         view = ElevationArea.as_view(model=type(obj))
         self.sync_object_view(lang, obj, view, 'dem.json')
+        view = ElevationAreaGrid.as_view(model=type(obj))
+        self.sync_object_view(lang, obj, view, 'dem.bin')
 
     def sync_gpx(self, lang, obj):
         self.sync_object_view(lang, obj, TrekGPXDetail.as_view(), '{obj.slug}.gpx')
@@ -3,6 +3,7 @@ import logging
 
 from django.conf import settings
 from django.contrib.gis.db import models
+from django.db.models import F, Q
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from django.template.defaultfilters import slugify
@@ -14,8 +15,8 @@ from mapentity.serializers import plain_text
 
 from geotrek.authent.models import StructureRelated
 from geotrek.core.models import Path, Topology
-from geotrek.common.utils import intersecting, classproperty
-from geotrek.common.mixins import (PicturesMixin, PublishableMixin,
+from geotrek.common.utils import intersecting, intersecting_bulk, classproperty
+from geotrek.common.mixins import (PicturesMixin, PublishableMixin, prefetch_properties,
                                    PictogramMixin, OptionalPictogramMixin)
 from geotrek.common.models import Theme
 from geotrek.maintenance.models import Intervention, Project
@@ -237,6 +238,10 @@ class Trek(StructureRelated, PicturesMixin, PublishableMixin, MapEntityMixin, To
         # ProgrammingError: SELECT DISTINCT ON expressions must match initial ORDER BY expressions
         return treks.order_by('topo_object').distinct('topo_object')
 
+    @classmethod
+    def path_treks_many(cls, paths):
+        return cls.path_topologies_many(paths, cls.objects.existing().order_by('topo_object'))
+
     @classmethod
     def topology_treks(cls, topology):
         if settings.TREKKING_TOPOLOGY_ENABLED:
@@ -369,18 +374,124 @@ class Trek(StructureRelated, PicturesMixin, PublishableMixin, MapEntityMixin, To
         return ','.join([unicode(source) for source in self.source.all()])
 
 
-Path.add_property('treks', Trek.path_treks, _(u"Treks"))
-Topology.add_property('treks', Trek.topology_treks, _(u"Treks"))
+Path.add_property('treks', Trek.path_treks, _(u"Treks"), bulk=Trek.path_treks_many, queryset=Trek)
+Topology.add_property('treks', Trek.topology_treks, _(u"Treks"),
+                      bulk=Trek.overlapping_many if settings.TREKKING_TOPOLOGY_ENABLED else None, queryset=Trek)
 if settings.HIDE_PUBLISHED_TREKS_IN_TOPOLOGIES:
     Topology.add_property('published_treks', lambda self: [], _(u"Published treks"))
 else:
-    Topology.add_property('published_treks', lambda self: intersecting(Trek, self).filter(published=True), _(u"Published treks"))
+    Topology.add_property('published_treks', lambda self: intersecting(Trek, self).filter(published=True), _(u"Published treks"),
+                          bulk=intersecting_bulk(Trek, published=True), queryset=Trek)
 Intervention.add_property('treks', lambda self: self.topology.treks if self.topology else [], _(u"Treks"))
 Project.add_property('treks', lambda self: self.edges_by_attr('treks'), _(u"Treks"))
-tourism_models.TouristicContent.add_property('treks', lambda self: intersecting(Trek, self), _(u"Treks"))
-tourism_models.TouristicContent.add_property('published_treks', lambda self: intersecting(Trek, self).filter(published=True), _(u"Published treks"))
-tourism_models.TouristicEvent.add_property('treks', lambda self: intersecting(Trek, self), _(u"Treks"))
-tourism_models.TouristicEvent.add_property('published_treks', lambda self: intersecting(Trek, self).filter(published=True), _(u"Published treks"))
+tourism_models.TouristicContent.add_property('treks', lambda self: TrekProximity.treks(self), _(u"Treks"),
+                                             bulk=lambda objects: TrekProximity.treks_many(objects), queryset=Trek)
+tourism_models.TouristicContent.add_property('published_treks', lambda self: TrekProximity.treks(self).filter(published=True), _(u"Published treks"),
+                                             bulk=lambda objects: TrekProximity.treks_many(objects, published=True), queryset=Trek)
+tourism_models.TouristicEvent.add_property('treks', lambda self: TrekProximity.treks(self), _(u"Treks"),
+                                           bulk=lambda objects: TrekProximity.treks_many(objects), queryset=Trek)
+tourism_models.TouristicEvent.add_property('published_treks', lambda self: TrekProximity.treks(self).filter(published=True), _(u"Published treks"),
+                                           bulk=lambda objects: TrekProximity.treks_many(objects, published=True), queryset=Trek)
+Trek.add_property('touristic_contents', lambda self: TrekProximity.close_objects(tourism_models.TouristicContent, self), _(u"Touristic contents"),
+                  bulk=lambda objects: TrekProximity.close_objects_many(tourism_models.TouristicContent, objects), queryset=tourism_models.TouristicContent)
+Trek.add_property('published_touristic_contents', lambda self: TrekProximity.close_objects(tourism_models.TouristicContent, self).filter(published=True), _(u"Published touristic contents"),
+                  bulk=lambda objects: TrekProximity.close_objects_many(tourism_models.TouristicContent, objects, published=True), queryset=tourism_models.TouristicContent)
+Trek.add_property('touristic_events', lambda self: TrekProximity.close_objects(tourism_models.TouristicEvent, self), _(u"Touristic events"),
+                  bulk=lambda objects: TrekProximity.close_objects_many(tourism_models.TouristicEvent, objects), queryset=tourism_models.TouristicEvent)
+Trek.add_property('published_touristic_events', lambda self: TrekProximity.close_objects(tourism_models.TouristicEvent, self).filter(published=True), _(u"Published touristic events"),
+                  bulk=lambda objects: TrekProximity.close_objects_many(tourism_models.TouristicEvent, objects, published=True), queryset=tourism_models.TouristicEvent)
+
+
+class TrekProximity(models.Model):
+    """
+    Touristic contents and events close to treks, along with their distance and
+    position along the trek. It is maintained by triggers (see
+    ``sql/40_proximites.sql``), up to the largest of the trek practice distance
+    and ``TOURISM_INTERSECTION_MARGIN``. Like ``intersecting()``, treks find
+    contents and events within their practice distance (or the margin), whereas
+    contents and events find treks within the margin. Publication and deletion
+    are filtered when reading.
+    """
+    trek = models.ForeignKey(Trek, related_name='proximities', db_column='itineraire',
+                             db_constraint=False)
+    touristic_content = models.ForeignKey(tourism_models.TouristicContent, null=True, related_name='trek_proximities',
+                                          db_column='contenu_touristique', db_constraint=False)
+    touristic_event = models.ForeignKey(tourism_models.TouristicEvent, null=True, related_name='trek_proximities',
+                                        db_column='evenement_touristique', db_constraint=False)
+    distance = models.FloatField(db_column='distance')
+    order = models.FloatField(null=True, db_column='ordre')
+
+    class Meta:
+        db_table = 'o_r_itineraire_proximite'
+        ordering = ['order']
+
+    @classmethod
+    def _field(cls, model):
+        return 'touristic_content' if model == tourism_models.TouristicContent else 'touristic_event'
+
+    @classmethod
+    def _within_trek_distance(cls):
+        """
+        Condition of ``Trek.distance()``: the practice distance, or the margin.
+        """
+        margin = settings.TOURISM_INTERSECTION_MARGIN
+        return (Q(trek__practice__distance__isnull=True, distance__lte=margin) |
+                Q(distance__lte=F('trek__practice__distance')))
+
+    @classmethod
+    def close_objects(cls, model, trek):
+        """
+        Returns the touristic contents or events (``model``) close to the trek,
+        ordered along it.
+        """
+        qs = model.objects.existing().filter(trek_proximities__trek=trek,
+                                             trek_proximities__distance__lte=trek.distance(model))
+        return qs.order_by('trek_proximities__order')
+
+    @classmethod
+    def close_objects_many(cls, model, treks, **filters):
+        """
+        Bulk version of ``close_objects()``: returns a dict with the list of
+        ``model`` instances close to each trek.
+        """
+        field = cls._field(model)
+        result = dict((trek.pk, []) for trek in treks)
+        candidates = model.objects.existing().filter(**filters)
+        qs = cls.objects.filter(cls._within_trek_distance(), trek__in=result.keys(),
+                                **{'%s__in' % field: candidates})
+        for proximity in qs.select_related(field):
+            result[proximity.trek_id].append(getattr(proximity, field))
+        return result
+
+    @classmethod
+    def treks(cls, obj):
+        """
+        Returns the treks within ``TOURISM_INTERSECTION_MARGIN`` of the touristic
+        content or event.
+        """
+        field = cls._field(obj.__class__)
+        margin = settings.TOURISM_INTERSECTION_MARGIN
+        return Trek.objects.existing().filter(**{'proximities__%s' % field: obj,
+                                                 'proximities__distance__lte': margin})
+
+    @classmethod
+    def treks_many(cls, objects, **filters):
+        """
+        Bulk version of ``treks()``: returns a dict with the list of treks close
+        to each touristic content or event.
+        """
+        objects = list(objects)
+        result = dict((obj.pk, []) for obj in objects)
+        if not objects:
+            return result
+        field = cls._field(objects[0].__class__)
+        candidates = Trek.objects.existing().filter(**filters)
+        qs = cls.objects.filter(trek__in=candidates, distance__lte=settings.TOURISM_INTERSECTION_MARGIN,
+                                **{'%s__in' % field: result.keys()})
+        qs = qs.select_related('trek').order_by(*['trek__%s' % f for f in Trek._meta.ordering])
+        for proximity in qs:
+            result[getattr(proximity, '%s_id' % field)].append(proximity.trek)
+        return result
 
 
 class TrekRelationshipManager(models.Manager):
@@ -650,18 +761,32 @@ class POI(StructureRelated, PicturesMixin, PublishableMixin, MapEntityMixin, Top
     def published_topology_pois(cls, topology):
         return cls.topology_pois(topology).filter(published=True)
 
+    @classmethod
+    def published_topology_pois_many(cls, topologies):
+        queryset = cls.objects.filter(published=True)
+        if settings.TREK_WITH_POIS_PICTURES:
+            # Pictures of POIs are serialized along with treks
+            queryset = prefetch_properties(queryset, 'pictures')
+        return cls.overlapping_many(topologies, queryset)
+
     def distance(self, to_cls):
         return settings.TOURISM_INTERSECTION_MARGIN
 
-Path.add_property('pois', POI.path_pois, _(u"POIs"))
-Topology.add_property('pois', POI.topology_pois, _(u"POIs"))
-Topology.add_property('published_pois', POI.published_topology_pois, _(u"Published POIs"))
+Path.add_property('pois', POI.path_pois, _(u"POIs"), bulk=POI.path_topologies_many, queryset=POI)
+Topology.add_property('pois', POI.topology_pois, _(u"POIs"),
+                      bulk=POI.overlapping_many if settings.TREKKING_TOPOLOGY_ENABLED else None, queryset=POI)
+Topology.add_property('published_pois', POI.published_topology_pois, _(u"Published POIs"),
+                      bulk=POI.published_topology_pois_many if settings.TREKKING_TOPOLOGY_ENABLED else None, queryset=POI)
 Intervention.add_property('pois', lambda self: self.topology.pois if self.topology else [], _(u"POIs"))
 Project.add_property('pois', lambda self: self.edges_by_attr('pois'), _(u"POIs"))
-tourism_models.TouristicContent.add_property('pois', lambda self: intersecting(POI, self), _(u"POIs"))
-tourism_models.TouristicContent.add_property('published_pois', lambda self: intersecting(POI, self).filter(published=True), _(u"Published POIs"))
-tourism_models.TouristicEvent.add_property('pois', lambda self: intersecting(POI, self), _(u"POIs"))
-tourism_models.TouristicEvent.add_property('published_pois', lambda self: intersecting(POI, self).filter(published=True), _(u"Published POIs"))
+tourism_models.TouristicContent.add_property('pois', lambda self: intersecting(POI, self), _(u"POIs"),
+                                             bulk=intersecting_bulk(POI), queryset=POI)
+tourism_models.TouristicContent.add_property('published_pois', lambda self: intersecting(POI, self).filter(published=True), _(u"Published POIs"),
+                                             bulk=intersecting_bulk(POI, published=True), queryset=POI)
+tourism_models.TouristicEvent.add_property('pois', lambda self: intersecting(POI, self), _(u"POIs"),
+                                           bulk=intersecting_bulk(POI), queryset=POI)
+tourism_models.TouristicEvent.add_property('published_pois', lambda self: intersecting(POI, self).filter(published=True), _(u"Published POIs"),
+                                           bulk=intersecting_bulk(POI, published=True), queryset=POI)
 
 
 class POIType(PictogramMixin):
@@ -766,15 +891,41 @@ class Service(StructureRelated, MapEntityMixin, Topology):
     def published_topology_services(cls, topology):
         return cls.topology_services(topology).filter(type__published=True)
 
+    @classmethod
+    def published_topology_services_many(cls, topologies):
+        """
+        Bulk version of ``published_topology_services()``: returns a dict with
+        the list of published services overlapping each topology.
+        """
+        topologies = list(topologies)
+        result = cls.overlapping_many(topologies, cls.objects.filter(type__published=True))
+        treks = [topology for topology in topologies if isinstance(topology, Trek)]
+        if treks:
+            # Services of treks are restricted to types of their practice
+            practices = {}
+            type_ids = set(service.type_id for trek in treks for service in result[trek.pk])
+            through = ServiceType.practices.through.objects.filter(servicetype__in=type_ids)
+            for type_id, practice_id in through.values_list('servicetype', 'practice'):
+                practices.setdefault(type_id, set()).add(practice_id)
+            for trek in treks:
+                result[trek.pk] = [service for service in result[trek.pk]
+                                   if trek.practice_id in practices.get(service.type_id, set([None]))]
+        return result
+
     def distance(self, to_cls):
         return settings.TOURISM_INTERSECTION_MARGIN
 
-Path.add_property('services', Service.path_services, _(u"Services"))
+Path.add_property('services', Service.path_services, _(u"Services"), bulk=Service.path_topologies_many, queryset=Service)
 Topology.add_property('services', Service.topology_services, _(u"Services"))
-Topology.add_property('published_services', Service.published_topology_services, _(u"Published Services"))
+Topology.add_property('published_services', Service.published_topology_services, _(u"Published Services"),
+                      bulk=Service.published_topology_services_many if settings.TREKKING_TOPOLOGY_ENABLED else None, queryset=Service)
 Intervention.add_property('services', lambda self: self.topology.services if self.topology else [], _(u"Services"))
 Project.add_property('services', lambda self: self.edges_by_attr('services'), _(u"Services"))
-tourism_models.TouristicContent.add_property('services', lambda self: intersecting(Service, self), _(u"Services"))
-tourism_models.TouristicContent.add_property('published_services', lambda self: intersecting(Service, self).filter(published=True), _(u"Published Services"))
-tourism_models.TouristicEvent.add_property('services', lambda self: intersecting(Service, self), _(u"Services"))
-tourism_models.TouristicEvent.add_property('published_services', lambda self: intersecting(Service, self).filter(published=True), _(u"Published Services"))
+tourism_models.TouristicContent.add_property('services', lambda self: intersecting(Service, self), _(u"Services"),
+                                             bulk=intersecting_bulk(Service), queryset=Service)
+tourism_models.TouristicContent.add_property('published_services', lambda self: intersecting(Service, self).filter(published=True), _(u"Published Services"),
+                                             bulk=intersecting_bulk(Service, published=True), queryset=Service)
+tourism_models.TouristicEvent.add_property('services', lambda self: intersecting(Service, self), _(u"Services"),
+                                           bulk=intersecting_bulk(Service), queryset=Service)
+tourism_models.TouristicEvent.add_property('published_services', lambda self: intersecting(Service, self).filter(published=True), _(u"Published Services"),
+                                           bulk=intersecting_bulk(Service, published=True), queryset=Service)
@@ -0,0 +1,184 @@
+-------------------------------------------------------------------------------
+-- Index of contenus and evenements touristiques close to itineraires, along
+-- with their distance and position along itineraire (see TrekProximity model).
+-- Proximity goes up to the largest of the distance of itineraire pratique and
+-- TOURISM_INTERSECTION_MARGIN: itineraires use the former (or the margin if
+-- unset), contenus and evenements touristiques the latter.
+-------------------------------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION rando.update_proximites(iids integer[], cids integer[], eids integer[]) RETURNS void AS $$
+BEGIN
+    DELETE FROM o_r_itineraire_proximite
+    WHERE itineraire = ANY(iids)
+       OR contenu_touristique = ANY(cids)
+       OR evenement_touristique = ANY(eids);
+
+    INSERT INTO o_r_itineraire_proximite (itineraire, contenu_touristique, distance, ordre)
+    SELECT i.evenement, c.id, ST_Distance(e.geom, c.geom),
+           CASE WHEN GeometryType(e.geom) = 'LINESTRING'
+                THEN ST_Line_Locate_Point(e.geom, ST_ClosestPoint(e.geom, c.geom)) END
+    FROM o_t_itineraire i
+    JOIN e_t_evenement e ON e.id = i.evenement
+    LEFT JOIN o_b_pratique p ON p.id = i.pratique
+    JOIN t_t_contenu_touristique c ON ST_DWithin(e.geom, c.geom, GREATEST(p.distance, {{TOURISM_INTERSECTION_MARGIN}}))
+    WHERE i.evenement = ANY(iids) OR c.id = ANY(cids);
+
+    INSERT INTO o_r_itineraire_proximite (itineraire, evenement_touristique, distance, ordre)
+    SELECT i.evenement, t.id, ST_Distance(e.geom, t.geom),
+           CASE WHEN GeometryType(e.geom) = 'LINESTRING'
+                THEN ST_Line_Locate_Point(e.geom, ST_ClosestPoint(e.geom, t.geom)) END
+    FROM o_t_itineraire i
+    JOIN e_t_evenement e ON e.id = i.evenement
+    LEFT JOIN o_b_pratique p ON p.id = i.pratique
+    JOIN t_t_evenement_touristique t ON ST_DWithin(e.geom, t.geom, GREATEST(p.distance, {{TOURISM_INTERSECTION_MARGIN}}))
+    WHERE i.evenement = ANY(iids) OR t.id = ANY(eids);
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- Itineraire created, or pratique changed
+
+DROP TRIGGER IF EXISTS o_t_itineraire_proximites_iu_tgr ON o_t_itineraire;
+
+CREATE OR REPLACE FUNCTION rando.itineraire_proximites_iu() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND NEW.pratique IS NOT DISTINCT FROM OLD.pratique THEN
+        RETURN NULL;
+    END IF;
+    PERFORM update_proximites(ARRAY[NEW.evenement], '{}'::integer[], '{}'::integer[]);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER o_t_itineraire_proximites_iu_tgr
+AFTER INSERT OR UPDATE OF pratique ON o_t_itineraire
+FOR EACH ROW EXECUTE PROCEDURE itineraire_proximites_iu();
+
+
+-- Geometry of itineraire changed (computed again from its troncons, or edited)
+
+DROP TRIGGER IF EXISTS e_t_evenement_proximites_u_tgr ON e_t_evenement;
+
+CREATE OR REPLACE FUNCTION rando.evenement_proximites_u() RETURNS trigger AS $$
+BEGIN
+    IF ST_OrderingEquals(NEW.geom, OLD.geom) THEN
+        RETURN NULL;
+    END IF;
+    IF EXISTS (SELECT 1 FROM o_t_itineraire WHERE evenement = NEW.id) THEN
+        PERFORM update_proximites(ARRAY[NEW.id], '{}'::integer[], '{}'::integer[]);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER e_t_evenement_proximites_u_tgr
+AFTER UPDATE OF geom ON e_t_evenement
+FOR EACH ROW EXECUTE PROCEDURE evenement_proximites_u();
+
+
+-- Distance of pratique changed
+
+DROP TRIGGER IF EXISTS o_b_pratique_proximites_u_tgr ON o_b_pratique;
+
+CREATE OR REPLACE FUNCTION rando.pratique_proximites_u() RETURNS trigger AS $$
+BEGIN
+    IF NEW.distance IS NOT DISTINCT FROM OLD.distance THEN
+        RETURN NULL;
+    END IF;
+    PERFORM update_proximites(ARRAY(SELECT evenement FROM o_t_itineraire WHERE pratique = NEW.id),
+                              '{}'::integer[], '{}'::integer[]);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER o_b_pratique_proximites_u_tgr
+AFTER UPDATE OF distance ON o_b_pratique
+FOR EACH ROW EXECUTE PROCEDURE pratique_proximites_u();
+
+
+-- Contenu or evenement touristique created, or geometry changed
+
+DROP TRIGGER IF EXISTS t_t_contenu_touristique_proximites_iu_tgr ON t_t_contenu_touristique;
+DROP TRIGGER IF EXISTS t_t_evenement_touristique_proximites_iu_tgr ON t_t_evenement_touristique;
+
+CREATE OR REPLACE FUNCTION rando.touristique_proximites_iu() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND ST_OrderingEquals(NEW.geom, OLD.geom) THEN
+        RETURN NULL;
+    END IF;
+    IF TG_TABLE_NAME = 't_t_contenu_touristique' THEN
+        PERFORM update_proximites('{}'::integer[], ARRAY[NEW.id], '{}'::integer[]);
+    ELSE
+        PERFORM update_proximites('{}'::integer[], '{}'::integer[], ARRAY[NEW.id]);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER t_t_contenu_touristique_proximites_iu_tgr
+AFTER INSERT OR UPDATE OF geom ON t_t_contenu_touristique
+FOR EACH ROW EXECUTE PROCEDURE touristique_proximites_iu();
+
+CREATE TRIGGER t_t_evenement_touristique_proximites_iu_tgr
+AFTER INSERT OR UPDATE OF geom ON t_t_evenement_touristique
+FOR EACH ROW EXECUTE PROCEDURE touristique_proximites_iu();
+
+
+-- Cleanup index when objects are deleted
+
+DROP TRIGGER IF EXISTS o_t_itineraire_proximites_d_tgr ON o_t_itineraire;
+DROP TRIGGER IF EXISTS t_t_contenu_touristique_proximites_d_tgr ON t_t_contenu_touristique;
+DROP TRIGGER IF EXISTS t_t_evenement_touristique_proximites_d_tgr ON t_t_evenement_touristique;
+
+CREATE OR REPLACE FUNCTION rando.proximites_d() RETURNS trigger AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'o_t_itineraire' THEN
+        DELETE FROM o_r_itineraire_proximite WHERE itineraire = OLD.evenement;
+    ELSIF TG_TABLE_NAME = 't_t_contenu_touristique' THEN
+        DELETE FROM o_r_itineraire_proximite WHERE contenu_touristique = OLD.id;
+    ELSE
+        DELETE FROM o_r_itineraire_proximite WHERE evenement_touristique = OLD.id;
+    END IF;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER o_t_itineraire_proximites_d_tgr
+AFTER DELETE ON o_t_itineraire
+FOR EACH ROW EXECUTE PROCEDURE proximites_d();
+
+CREATE TRIGGER t_t_contenu_touristique_proximites_d_tgr
+AFTER DELETE ON t_t_contenu_touristique
+FOR EACH ROW EXECUTE PROCEDURE proximites_d();
+
+CREATE TRIGGER t_t_evenement_touristique_proximites_d_tgr
+AFTER DELETE ON t_t_evenement_touristique
+FOR EACH ROW EXECUTE PROCEDURE proximites_d();
+
+
+-------------------------------------------------------------------------------
+-- Build index again for itineraires depending on TOURISM_INTERSECTION_MARGIN,
+-- if it changed since the index was built (margin is kept in table comment)
+-------------------------------------------------------------------------------
+
+DO $$
+DECLARE
+    description text := obj_description('o_r_itineraire_proximite'::regclass, 'pg_class');
+    previous float := substring(description FROM '^TOURISM_INTERSECTION_MARGIN=(.*)$')::float;
+    margin float := {{TOURISM_INTERSECTION_MARGIN}};
+BEGIN
+    IF previous IS NULL THEN
+        PERFORM update_proximites(ARRAY(SELECT evenement FROM o_t_itineraire), '{}'::integer[], '{}'::integer[]);
+    ELSIF previous <> margin THEN
+        -- Itineraires with a larger distance of pratique are not concerned
+        PERFORM update_proximites(ARRAY(SELECT i.evenement
+                                        FROM o_t_itineraire i
+                                        LEFT JOIN o_b_pratique p ON p.id = i.pratique
+                                        WHERE p.distance IS NULL OR p.distance < GREATEST(previous, margin)),
+                                  '{}'::integer[], '{}'::integer[]);
+    ELSE
+        RETURN;
+    END IF;
+    EXECUTE 'COMMENT ON TABLE o_r_itineraire_proximite IS ' || quote_literal('TOURISM_INTERSECTION_MARGIN=' || margin);
+END;
+$$;
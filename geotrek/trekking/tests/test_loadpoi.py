@@ -76,3 +76,31 @@ class LoadPOITest(TestCase):
         geom = GEOSGeometry('POINT(1 1)')
         poi = self.cmd.create_poi(geom, 'bridge', 'infra')
         self.assertEquals([self.path], list(poi.paths.all()))
+
+    def test_pois_far_from_paths_are_skipped(self):
+        geom = GEOSGeometry('POINT(1 1)')
+        self.cmd.max_distance = 1
+        before = len(POI.objects.all())
+        self.assertEquals(self.cmd.create_poi(geom, 'bridge', 'infra'), None)
+        self.assertEquals(len(POI.objects.all()), before)
+
+    def test_skipped_pois_show_max_distance(self):
+        self.cmd.stderr = StringIO()
+        self.cmd.skipped('bridge')
+        self.assertIn('No path found for bridge', self.cmd.stderr.getvalue())
+        self.cmd.max_distance = 1.5
+        self.cmd.skipped('bridge')
+        self.assertIn('No path found within 1.5 m of bridge', self.cmd.stderr.getvalue())
+
+    def test_pois_are_created_in_bulk(self):
+        before = len(POI.objects.all())
+        output = StringIO()
+        self.cmd.execute(self.filename, bulk=True, chunk_size=1, stdout=output)
+        self.assertEquals(len(POI.objects.all()) - before, 2)
+        self.assertIn('2/2 objects processed', output.getvalue())
+
+    def test_pois_created_in_bulk_are_attached_to_paths(self):
+        geom = GEOSGeometry('POINT(1 1)')
+        poi, = self.cmd.create_pois([(geom, 'bridge', 'infra')])
+        self.assertEquals([self.path], list(poi.paths.all()))
+        self.assertIsNotNone(POI.objects.get(pk=poi.pk).geom)
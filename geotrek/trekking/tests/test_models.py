@@ -5,7 +5,10 @@ from django.core.exceptions import ValidationError
 
 from bs4 import BeautifulSoup
 
+from geotrek.common.factories import AttachmentFactory
+from geotrek.common.mixins import prefetch_properties
 from geotrek.common.tests import TranslationResetMixin
+from geotrek.common.utils.testdata import get_dummy_uploaded_image
 from geotrek.core.factories import PathFactory, PathAggregationFactory
 from geotrek.zoning.factories import DistrictFactory, CityFactory
 from geotrek.trekking.factories import (POIFactory, TrekFactory,
@@ -205,6 +208,26 @@ class RelatedObjectsTest(TranslationResetMixin, TestCase):
         service.delete()
         self.assertItemsEqual(trek.services, [])
 
+    def test_published_services_of_many_treks(self):
+        p1 = PathFactory.create(geom=LineString((0, 0), (4, 4)))
+        trek = TrekFactory.create(no_path=True)
+        trek.add_path(p1)
+        other = TrekFactory.create(no_path=True)
+        other.add_path(p1)
+        service = ServiceFactory.create(no_path=True)
+        service.type.practices.add(trek.practice)
+        service.add_path(p1, start=0.6, end=0.6)
+        unpublished = ServiceFactory.create(no_path=True, type__published=False)
+        unpublished.type.practices.add(trek.practice)
+        unpublished.add_path(p1, start=0.7, end=0.7)
+        treks = prefetch_properties(Trek.objects.filter(pk__in=[trek.pk, other.pk]), 'published_services')
+        treks = dict((t.pk, t) for t in treks)
+        with self.assertNumQueries(0):
+            self.assertEqual(list(treks[trek.pk].published_services), [service])
+            self.assertEqual(list(treks[other.pk].published_services), [])
+        self.assertEqual(list(treks[trek.pk].published_services), list(trek.published_services))
+        self.assertEqual(list(treks[other.pk].published_services), list(other.published_services))
+
     def test_pois_should_be_ordered_by_progression(self):
         p1 = PathFactory.create(geom=LineString((0, 0), (4, 4)))
         p2 = PathFactory.create(geom=LineString((4, 4), (8, 8)))
@@ -355,3 +378,23 @@ class TrekItinerancyTest(TestCase):
         self.assertQuerysetEqual(trekC.children, ['<Trek: A>'])
         self.assertEqual(trekA.parents_id, [trekC.id])
         self.assertEqual(trekC.children_id, [trekA.id])
+
+
+class TrekPicturesTest(TestCase):
+    def setUp(self):
+        self.trek = TrekFactory.create()
+        self.trek2 = TrekFactory.create()
+        self.picture = AttachmentFactory.create(obj=self.trek, attachment_file=get_dummy_uploaded_image())
+        AttachmentFactory.create(obj=self.trek)
+        AttachmentFactory.create(obj=self.trek, title='mapimage', attachment_file=get_dummy_uploaded_image())
+
+    def test_pictures_are_images_only(self):
+        self.assertEqual(self.trek.pictures, [self.picture])
+        self.assertEqual(self.trek2.pictures, [])
+
+    def test_pictures_of_many_treks(self):
+        treks = prefetch_properties(Trek.objects.filter(pk__in=[self.trek.pk, self.trek2.pk]), 'pictures')
+        treks = dict((trek.pk, trek) for trek in treks)
+        with self.assertNumQueries(0):
+            self.assertEqual(treks[self.trek.pk].pictures, [self.picture])
+            self.assertEqual(treks[self.trek2.pk].pictures, [])
@@ -326,6 +326,16 @@ class TrekCustomViewTests(TrekkingManagerTest):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response['Content-Type'], 'application/vnd.google-earth.kml+xml')
 
+    def test_simplified_profile_json_keeps_limits(self):
+        trek = TrekFactory.create(published=True)
+        url = '/api/en/treks/{pk}/profile.json?points=3'.format(pk=trek.pk)
+        with mock.patch('geotrek.altimetry.helpers.AltimetryHelper.simplify_profile') as simplify:
+            simplify.return_value = [(0.0, 0.0, 0.0, 5000.0)]
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        limits = json.loads(response.content)['limits']
+        self.assertEqual((limits['ceil'], limits['floor']), trek.get_elevation_limits())
+
     def test_not_published_profile_json(self):
         trek = TrekFactory.create(published=False)
         url = '/api/en/treks/{pk}/profile.json'.format(pk=trek.pk)
@@ -391,6 +401,13 @@ class TrekCustomPublicViewTests(TrekkingManagerTest):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response['Content-Type'], 'application/json')
 
+    def test_simplified_profile_json(self):
+        trek = TrekFactory.create(published=True)
+        url = '/api/en/treks/{pk}/profile.json?points=3'.format(pk=trek.pk)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(len(json.loads(response.content)['profile']) <= 3)
+
     def test_not_published_profile_json(self):
         trek = TrekFactory.create(published=False)
         url = '/api/en/treks/{pk}/profile.json'.format(pk=trek.pk)
@@ -404,6 +421,13 @@ class TrekCustomPublicViewTests(TrekkingManagerTest):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response['Content-Type'], 'application/json')
 
+    def test_elevation_area_grid(self):
+        trek = TrekFactory.create(published=True)
+        url = '/api/en/treks/{pk}/dem.bin'.format(pk=trek.pk)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/octet-stream')
+
     def test_not_published_elevation_area_json(self):
         trek = TrekFactory.create(published=False)
         url = '/api/en/treks/{pk}/dem.json'.format(pk=trek.pk)
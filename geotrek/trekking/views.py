@@ -15,21 +15,22 @@ from django.views.generic import CreateView, ListView, RedirectView
 from django.views.generic.detail import BaseDetailView
 from djcelery.models import TaskMeta
 from mapentity.helpers import alphabet_enumeration
-from mapentity.views import (MapEntityLayer, MapEntityList, MapEntityJsonList,
-                             MapEntityFormat, MapEntityDetail, MapEntityMapImage,
+from mapentity.views import (MapEntityLayer, MapEntityList,
+                             MapEntityDetail, MapEntityMapImage,
                              MapEntityDocument, MapEntityCreate, MapEntityUpdate,
                              MapEntityDelete, LastModifiedMixin, MapEntityViewSet)
-from paperclip.models import Attachment
 from rest_framework import permissions as rest_permissions, viewsets
 from rest_framework_gis.serializers import GeoFeatureModelSerializer
 
 from geotrek.authent.decorators import same_structure_required
+from geotrek.common.mixins import prefetch_properties
 from geotrek.common.models import RecordSource, TargetPortal
-from geotrek.common.views import FormsetMixin, PublicOrReadPermMixin, DocumentPublic
+from geotrek.common.views import (FormsetMixin, PublicOrReadPermMixin, DocumentPublic,
+                                  MapEntityJsonList, MapEntityFormat)
 from geotrek.core.models import AltimetryMixin
 from geotrek.core.views import CreateFromTopologyMixin
 from geotrek.trekking.forms import SyncRandoForm
-from geotrek.zoning.models import District, City, RestrictedArea
+from geotrek.zoning.models import District, City, RestrictedArea, TopologyZoning
 from geotrek.celery import app as celery_app
 
 from .filters import TrekFilterSet, POIFilterSet, ServiceFilterSet
@@ -74,21 +75,10 @@ class FlattenPicturesMixin(object):
 
     def get_queryset(self):
         """ Override queryset to avoid attachment lookup while serializing.
-        It will fetch attachments, and force ``pictures`` attribute of instances.
+        It will fetch pictures of listed objects at once (see ``PicturesMixin``).
         """
-        app_label = self.get_model()._meta.app_label
-        model_name = self.get_model()._meta.object_name.lower()
-        attachments = Attachment.objects.filter(content_type__app_label=app_label,
-                                                content_type__model=model_name)
-        pictures = {}
-        for attachment in attachments:
-            if attachment.is_image:
-                obj_id = attachment.object_id
-                pictures.setdefault(obj_id, []).append(attachment)
-
-        for obj in super(FlattenPicturesMixin, self).get_queryset():
-            obj.pictures = pictures.get(obj.id, [])
-            yield obj
+        qs = super(FlattenPicturesMixin, self).get_queryset()
+        return prefetch_properties(qs, 'pictures')
 
 
 class TrekLayer(MapEntityLayer):
@@ -387,6 +377,14 @@ class TrekViewSet(MapEntityViewSet):
 
         qs = qs.transform(settings.API_SRID, field_name='geom')
 
+        if settings.TREKKING_TOPOLOGY_ENABLED:
+            qs = qs.prefetch_related(*TopologyZoning.PREFETCH)
+
+        # Close objects of all treks at once (distance depends on practice)
+        qs = qs.select_related('practice')
+        qs = prefetch_properties(qs, 'pictures', 'published_pois', 'published_services', 'published_treks',
+                                 'published_touristic_contents', 'published_touristic_events')
+
         return qs
 
 
@@ -396,7 +394,11 @@ class POIViewSet(MapEntityViewSet):
     permission_classes = [rest_permissions.DjangoModelPermissionsOrAnonReadOnly]
 
     def get_queryset(self):
-        return POI.objects.existing().filter(published=True).transform(settings.API_SRID, field_name='geom')
+        qs = POI.objects.existing().filter(published=True).transform(settings.API_SRID, field_name='geom')
+        if settings.TREKKING_TOPOLOGY_ENABLED:
+            qs = qs.prefetch_related(*TopologyZoning.PREFETCH)
+        qs = prefetch_properties(qs, 'pictures', 'published_touristic_contents', 'published_touristic_events')
+        return qs
 
 
 class TrekPOIViewSet(viewsets.ModelViewSet):
@@ -416,7 +418,8 @@ class TrekPOIViewSet(viewsets.ModelViewSet):
             raise Http404
         if not trek.is_public:
             raise Http404
-        return trek.pois.filter(published=True).transform(settings.API_SRID, field_name='geom')
+        qs = trek.pois.filter(published=True).transform(settings.API_SRID, field_name='geom')
+        return prefetch_properties(qs, 'pictures')
 
 
 class ServiceLayer(MapEntityLayer):
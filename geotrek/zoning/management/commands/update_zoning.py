@@ -0,0 +1,49 @@
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from geotrek.core.models import Path
+from geotrek.zoning.models import City, District, RestrictedArea
+
+
+LAYERS = {
+    'city': City,
+    'district': District,
+    'restrictedarea': RestrictedArea,
+}
+
+
+class Command(BaseCommand):
+    help = "Compute again cities, districts and restricted areas crossed by paths (e.g. after a massive import of layers)"
+
+    option_list = BaseCommand.option_list + (
+        make_option('--layer', '-l', action='append', dest='layers', default=None,
+                    help='Layer to compute (%s), all of them by default' % ', '.join(sorted(LAYERS))),
+        make_option('--chunk-size', '-c', action='store', dest='chunk_size', type='int',
+                    default=1000, help='Number of paths computed per transaction'),
+    )
+
+    def handle(self, *args, **options):
+        layers = options.get('layers') or sorted(LAYERS)
+        for layer in layers:
+            if layer not in LAYERS:
+                raise CommandError("Unknown layer '%s'" % layer)
+        tables = [LAYERS[layer]._meta.db_table for layer in layers]
+        chunk_size = options.get('chunk_size') or 1000
+        verbosity = int(options.get('verbosity', 1))
+
+        start = time.time()
+        pks = list(Path.include_invisible.order_by('pk').values_list('pk', flat=True))
+        count = 0
+        for i in range(0, len(pks), chunk_size):
+            chunk = pks[i:i + chunk_size]
+            with transaction.atomic():
+                cursor = connection.cursor()
+                cursor.execute("SELECT update_couches_sig_of_troncons(%s, %s)", [chunk, tables])
+                count += cursor.fetchone()[0]
+            if verbosity >= 1:
+                self.stdout.write('%s/%s paths processed' % (i + len(chunk), len(pks)))
+        if verbosity >= 1:
+            self.stdout.write('%s edges created in %.1f s' % (count, time.time() - start))
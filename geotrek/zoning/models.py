@@ -7,15 +7,23 @@
 from operator import attrgetter
 
 from django.contrib.gis.db import models
+from django.db.models.query import prefetch_related_objects
 from django.conf import settings
 from django.utils.translation import ugettext_lazy as _
 
 from geotrek.common.utils import uniquify, intersecting
+from geotrek.core.helpers import TopologyHelper
 from geotrek.core.models import Topology, Path
 from geotrek.maintenance.models import Intervention, Project
 from geotrek.tourism.models import TouristicContent, TouristicEvent
 
 
+def edges_zones(edges, field):
+    """ Returns the zones of edges lists (by path), as given by ``path_*_edges_many()``
+    """
+    return dict((pk, uniquify(map(attrgetter(field), objects))) for pk, objects in edges.items())
+
+
 class RestrictedAreaType(models.Model):
     name = models.CharField(max_length=200, verbose_name=_(u"Name"), db_column='nom')
 
@@ -74,6 +82,11 @@ class RestrictedAreaEdge(Topology):
                           .select_related('restricted_area__area_type')\
                           .filter(aggregations__path=path).distinct('pk')
 
+    @classmethod
+    def path_area_edges_many(cls, paths):
+        queryset = cls.objects.existing().select_related('restricted_area__area_type')
+        return TopologyHelper.path_topologies_many(queryset, paths)
+
     @classmethod
     def topology_area_edges(cls, topology):
         return cls.overlapping(topology)\
@@ -82,10 +95,13 @@ class RestrictedAreaEdge(Topology):
 
 
 if settings.TREKKING_TOPOLOGY_ENABLED:
-    Path.add_property('area_edges', RestrictedAreaEdge.path_area_edges, _(u"Restricted area edges"))
-    Path.add_property('areas', lambda self: uniquify(map(attrgetter('restricted_area'), self.area_edges)), _(u"Restricted areas"))
+    Path.add_property('area_edges', RestrictedAreaEdge.path_area_edges, _(u"Restricted area edges"),
+                      bulk=RestrictedAreaEdge.path_area_edges_many, queryset=RestrictedAreaEdge)
+    Path.add_property('areas', lambda self: uniquify(map(attrgetter('restricted_area'), self.area_edges)), _(u"Restricted areas"),
+                      bulk=lambda paths: edges_zones(RestrictedAreaEdge.path_area_edges_many(paths), 'restricted_area'))
     Topology.add_property('area_edges', RestrictedAreaEdge.topology_area_edges, _(u"Restricted area edges"))
-    Topology.add_property('areas', lambda self: uniquify(map(attrgetter('restricted_area'), self.area_edges)), _(u"Restricted areas"))
+    Topology.add_property('areas', lambda self: TopologyZoning.zones(self, 'restricted_area'), _(u"Restricted areas"),
+                          bulk=lambda topologies: TopologyZoning.zones_many(topologies, 'restricted_area'))
     Intervention.add_property('area_edges', lambda self: self.topology.area_edges if self.topology else [], _(u"Restricted area edges"))
     Intervention.add_property('areas', lambda self: self.topology.areas if self.topology else [], _(u"Restricted areas"))
     Project.add_property('area_edges', lambda self: self.edges_by_attr('area_edges'), _(u"Restricted area edges"))
@@ -136,16 +152,24 @@ class CityEdge(Topology):
     def path_city_edges(cls, path):
         return cls.objects.existing().select_related('city').filter(aggregations__path=path).distinct('pk')
 
+    @classmethod
+    def path_city_edges_many(cls, paths):
+        queryset = cls.objects.existing().select_related('city')
+        return TopologyHelper.path_topologies_many(queryset, paths)
+
     @classmethod
     def topology_city_edges(cls, topology):
         return cls.overlapping(topology).select_related('city')
 
 
 if settings.TREKKING_TOPOLOGY_ENABLED:
-    Path.add_property('city_edges', CityEdge.path_city_edges, _(u"City edges"))
-    Path.add_property('cities', lambda self: uniquify(map(attrgetter('city'), self.city_edges)), _(u"Cities"))
+    Path.add_property('city_edges', CityEdge.path_city_edges, _(u"City edges"),
+                      bulk=CityEdge.path_city_edges_many, queryset=CityEdge)
+    Path.add_property('cities', lambda self: uniquify(map(attrgetter('city'), self.city_edges)), _(u"Cities"),
+                      bulk=lambda paths: edges_zones(CityEdge.path_city_edges_many(paths), 'city'))
     Topology.add_property('city_edges', CityEdge.topology_city_edges, _(u"City edges"))
-    Topology.add_property('cities', lambda self: uniquify(map(attrgetter('city'), self.city_edges)), _(u"Cities"))
+    Topology.add_property('cities', lambda self: TopologyZoning.zones(self, 'city'), _(u"Cities"),
+                          bulk=lambda topologies: TopologyZoning.zones_many(topologies, 'city'))
     Intervention.add_property('city_edges', lambda self: self.topology.city_edges if self.topology else [], _(u"City edges"))
     Intervention.add_property('cities', lambda self: self.topology.cities if self.topology else [], _(u"Cities"))
     Project.add_property('city_edges', lambda self: self.edges_by_attr('city_edges'), _(u"City edges"))
@@ -194,16 +218,24 @@ class DistrictEdge(Topology):
     def path_district_edges(cls, path):
         return cls.objects.existing().select_related('district').filter(aggregations__path=path).distinct('pk')
 
+    @classmethod
+    def path_district_edges_many(cls, paths):
+        queryset = cls.objects.existing().select_related('district')
+        return TopologyHelper.path_topologies_many(queryset, paths)
+
     @classmethod
     def topology_district_edges(cls, topology):
         return cls.overlapping(topology).select_related('district')
 
 
 if settings.TREKKING_TOPOLOGY_ENABLED:
-    Path.add_property('district_edges', DistrictEdge.path_district_edges, _(u"District edges"))
-    Path.add_property('districts', lambda self: uniquify(map(attrgetter('district'), self.district_edges)), _(u"Districts"))
+    Path.add_property('district_edges', DistrictEdge.path_district_edges, _(u"District edges"),
+                      bulk=DistrictEdge.path_district_edges_many, queryset=DistrictEdge)
+    Path.add_property('districts', lambda self: uniquify(map(attrgetter('district'), self.district_edges)), _(u"Districts"),
+                      bulk=lambda paths: edges_zones(DistrictEdge.path_district_edges_many(paths), 'district'))
     Topology.add_property('district_edges', DistrictEdge.topology_district_edges, _(u"District edges"))
-    Topology.add_property('districts', lambda self: uniquify(map(attrgetter('district'), self.district_edges)), _(u"Districts"))
+    Topology.add_property('districts', lambda self: TopologyZoning.zones(self, 'district'), _(u"Districts"),
+                          bulk=lambda topologies: TopologyZoning.zones_many(topologies, 'district'))
     Intervention.add_property('district_edges', lambda self: self.topology.district_edges if self.topology else [], _(u"District edges"))
     Intervention.add_property('districts', lambda self: self.topology.districts if self.topology else [], _(u"Districts"))
     Project.add_property('district_edges', lambda self: self.edges_by_attr('district_edges'), _(u"District edges"))
@@ -213,3 +245,44 @@ else:
 
 TouristicContent.add_property('districts', lambda self: intersecting(District, self, distance=0), _(u"Districts"))
 TouristicEvent.add_property('districts', lambda self: intersecting(District, self, distance=0), _(u"Districts"))
+
+
+class TopologyZoning(models.Model):
+    """
+    Cities, districts and restricted areas crossed by topologies, along with
+    the position of their first crossing. It is maintained by triggers (see
+    ``sql/10_couches_sig.sql``), and can be prefetched for querysets of
+    topologies with ``prefetch_related(*TopologyZoning.PREFETCH)``.
+    """
+    topology = models.ForeignKey(Topology, related_name='zoning', db_column='evenement',
+                                 db_constraint=False)
+    city = models.ForeignKey(City, null=True, related_name='+', db_column='commune')
+    district = models.ForeignKey(District, null=True, related_name='+', db_column='secteur')
+    restricted_area = models.ForeignKey(RestrictedArea, null=True, related_name='+', db_column='zone')
+    order = models.FloatField(db_column='ordre')
+
+    PREFETCH = ('zoning__city', 'zoning__district', 'zoning__restricted_area__area_type')
+
+    class Meta:
+        db_table = 'f_r_evenement_couche_sig'
+        ordering = ['order']
+
+    @classmethod
+    def zones(cls, topology, field):
+        """
+        Returns the zones (``city``, ``district`` or ``restricted_area``) crossed by
+        the topology, in order of progression.
+        """
+        zoning = topology.zoning.all()
+        if 'zoning' not in getattr(topology, '_prefetched_objects_cache', {}):
+            related = 'restricted_area__area_type' if field == 'restricted_area' else field
+            zoning = zoning.filter(**{'%s__isnull' % field: False}).select_related(related)
+        return [getattr(z, field) for z in zoning if getattr(z, '%s_id' % field) is not None]
+
+    @classmethod
+    def zones_many(cls, topologies, field):
+        """
+        Returns a dict with the zones crossed by each of the topologies.
+        """
+        prefetch_related_objects(topologies, cls.PREFETCH)
+        return dict((topology.pk, cls.zones(topology, field)) for topology in topologies)
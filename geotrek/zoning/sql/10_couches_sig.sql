@@ -30,6 +30,83 @@ ALTER TABLE l_secteur ADD CONSTRAINT l_secteur_geom_isvalid CHECK (ST_IsValid(ge
 ALTER TABLE l_zonage_reglementaire DROP CONSTRAINT IF EXISTS l_zonage_reglementaire_geom_isvalid;
 ALTER TABLE l_zonage_reglementaire ADD CONSTRAINT l_zonage_reglementaire_geom_isvalid CHECK (ST_IsValid(geom));
 
+-------------------------------------------------------------------------------
+-- Index of communes/secteurs/zonages crossed by evenements, along with the
+-- position of their first crossing (see TopologyZoning model)
+-------------------------------------------------------------------------------
+
+-- Entries of a deleted commune/secteur/zonage go along with it
+DO $$
+DECLARE
+    c record;
+BEGIN
+    FOR c IN SELECT conname, pg_get_constraintdef(oid) AS def
+             FROM pg_constraint
+             WHERE conrelid = 'f_r_evenement_couche_sig'::regclass
+               AND contype = 'f' AND confdeltype <> 'c'
+               AND confrelid IN ('l_commune'::regclass, 'l_secteur'::regclass, 'l_zonage_reglementaire'::regclass)
+    LOOP
+        EXECUTE 'ALTER TABLE f_r_evenement_couche_sig DROP CONSTRAINT ' || quote_ident(c.conname);
+        EXECUTE 'ALTER TABLE f_r_evenement_couche_sig ADD CONSTRAINT ' || quote_ident(c.conname) || ' '
+                || regexp_replace(c.def, '(REFERENCES [^)]*[)])', E'\\1 ON DELETE CASCADE');
+    END LOOP;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION zonage.update_couches_sig_of_evenements(eids integer[]) RETURNS void AS $$
+BEGIN
+    DELETE FROM f_r_evenement_couche_sig WHERE evenement = ANY(eids);
+
+    INSERT INTO f_r_evenement_couche_sig (evenement, commune, secteur, zone, ordre)
+    SELECT source.evenement, c.commune, s.secteur, z.zone,
+           MIN(source.ordre + CASE WHEN source.pk_debut > source.pk_fin THEN (1 - a.pk_debut) ELSE a.pk_debut END)
+    FROM e_r_evenement_troncon source
+    JOIN e_r_evenement_troncon a ON (a.troncon = source.troncon
+                                     AND least(a.pk_debut, a.pk_fin) <= greatest(source.pk_debut, source.pk_fin)
+                                     AND greatest(a.pk_debut, a.pk_fin) >= least(source.pk_debut, source.pk_fin))
+    JOIN e_t_evenement e ON (e.id = a.evenement AND NOT e.supprime)
+    LEFT JOIN f_t_commune c ON c.evenement = a.evenement
+    LEFT JOIN f_t_secteur s ON s.evenement = a.evenement
+    LEFT JOIN f_t_zonage z ON z.evenement = a.evenement
+    WHERE source.evenement = ANY(eids)
+      AND (c.evenement IS NOT NULL OR s.evenement IS NOT NULL OR z.evenement IS NOT NULL)
+    GROUP BY source.evenement, c.commune, s.secteur, z.zone;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Evenements along troncons, excluding communes/secteurs/zonages themselves
+CREATE OR REPLACE FUNCTION zonage.evenements_of_troncons(tids integer[]) RETURNS integer[] AS $$
+    SELECT array_agg(DISTINCT et.evenement)
+    FROM e_r_evenement_troncon et, e_t_evenement e
+    WHERE et.troncon = ANY($1)
+      AND e.id = et.evenement
+      AND e.kind NOT IN ('CITYEDGE', 'DISTRICTEDGE', 'RESTRICTEDAREAEDGE');
+$$ LANGUAGE sql STABLE;
+
+DROP TRIGGER IF EXISTS e_t_evenement_couches_sig_u_tgr ON e_t_evenement;
+
+CREATE OR REPLACE FUNCTION zonage.evenement_couches_sig_u() RETURNS trigger AS $$
+BEGIN
+    -- Geometry is computed again when troncons of evenement change
+    IF NEW.kind IN ('CITYEDGE', 'DISTRICTEDGE', 'RESTRICTEDAREAEDGE') THEN
+        PERFORM update_couches_sig_of_evenements(evenements_of_troncons(ARRAY(
+            SELECT troncon FROM e_r_evenement_troncon WHERE evenement = NEW.id)));
+    ELSE
+        PERFORM update_couches_sig_of_evenements(ARRAY[NEW.id]);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Topology.save() always sets geom: skip unchanged ones. Geometries are
+-- compared with ST_OrderingEquals(), since '=' only compares bounding boxes.
+CREATE TRIGGER e_t_evenement_couches_sig_u_tgr
+AFTER UPDATE OF geom ON e_t_evenement
+FOR EACH ROW
+WHEN ((OLD.geom IS NULL) <> (NEW.geom IS NULL) OR NOT ST_OrderingEquals(OLD.geom, NEW.geom))
+EXECUTE PROCEDURE evenement_couches_sig_u();
+
+
 -------------------------------------------------------------------------------
 -- Delete Commune/Zonage/Secteur when evenements are deleted
 -------------------------------------------------------------------------------
@@ -95,52 +172,93 @@ FOR EACH ROW EXECUTE PROCEDURE nettoyage_auto_couches_sig_d();
 
 
 -------------------------------------------------------------------------------
--- Sync when Troncon modified
+-- Compute Commune/Zonage/Secteur evenements of a set of troncons at once
 -------------------------------------------------------------------------------
 
-DROP TRIGGER IF EXISTS l_t_troncon_couches_sig_iu_tgr ON l_t_troncon;
+DROP FUNCTION IF EXISTS zonage.update_couche_sig_of_troncons(integer[], varchar, varchar, varchar, varchar, varchar);
 
-CREATE OR REPLACE FUNCTION lien_auto_troncon_couches_sig_iu() RETURNS trigger AS $$
+-- Evenements of all communes/secteurs/zonages of the layer, or of the one
+-- with id zid only
+CREATE OR REPLACE FUNCTION zonage.update_couche_sig_of_troncons(tids integer[], layer_name varchar, id_name varchar,
+                                                                table_name varchar, fk_name varchar, kind_name varchar,
+                                                                zid text) RETURNS integer AS $$
 DECLARE
-    rec record;
-    tab varchar;
-    eid integer;
+    total integer;
 BEGIN
-    -- Remove obsolete evenement
-    IF TG_OP = 'UPDATE' THEN
-        -- Related evenement/zonage/secteur/commune will be cleared by another trigger
-        DELETE FROM e_r_evenement_troncon et USING f_t_zonage z WHERE et.troncon = OLD.id AND et.evenement = z.evenement;
-        DELETE FROM e_r_evenement_troncon et USING f_t_secteur s WHERE et.troncon = OLD.id AND et.evenement = s.evenement;
-        DELETE FROM e_r_evenement_troncon et USING f_t_commune c WHERE et.troncon = OLD.id AND et.evenement = c.evenement;
+    -- Remove obsolete evenements
+    -- Related evenement/zonage/secteur/commune will be cleared by another trigger
+    EXECUTE 'DELETE FROM e_r_evenement_troncon et USING '|| quote_ident(table_name) ||' z
+             WHERE et.troncon = ANY($1) AND et.evenement = z.evenement
+               AND ($2 IS NULL OR z.'|| quote_ident(fk_name) ||'::text = $2)' USING tids, zid;
+
+    -- Add new evenements, their troncon and their commune/secteur/zonage with
+    -- one statement. Geometry of evenements is the intersection itself.
+    EXECUTE 'WITH edges AS (
+                 SELECT nextval('|| quote_literal(pg_get_serial_sequence('e_t_evenement', 'id')) ||') AS eid, id, zid, egeom,
+                        ST_Line_Locate_Point(tgeom, COALESCE(ST_StartPoint(egeom), egeom)) AS pk_a,
+                        ST_Line_Locate_Point(tgeom, COALESCE(ST_EndPoint(egeom), egeom)) AS pk_b
+                 FROM (SELECT t.id, t.geom AS tgeom, z.'|| quote_ident(id_name) ||' AS zid,
+                              (ST_Dump(ST_Multi(ST_Intersection(t.geom, z.geom)))).geom AS egeom
+                       FROM l_t_troncon t, '|| quote_ident(layer_name) ||' z
+                       WHERE t.id = ANY($1) AND ST_Intersects(t.geom, z.geom)
+                         AND ($3 IS NULL OR z.'|| quote_ident(id_name) ||'::text = $3)) AS sub
+             ), evenements AS (
+                 INSERT INTO e_t_evenement (id, date_insert, date_update, kind, decallage, longueur, geom, supprime)
+                 SELECT eid, now(), now(), $2, 0, ST_Length(egeom), egeom, FALSE FROM edges
+             ), evenements_troncons AS (
+                 INSERT INTO e_r_evenement_troncon (troncon, evenement, pk_debut, pk_fin)
+                 SELECT id, eid, least(pk_a, pk_b), greatest(pk_a, pk_b) FROM edges
+             )
+             INSERT INTO '|| quote_ident(table_name) ||' (evenement, '|| quote_ident(fk_name) ||')
+             SELECT eid, zid FROM edges' USING tids, kind_name, zid;
+    GET DIAGNOSTICS total = ROW_COUNT;
+
+    RETURN total;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP FUNCTION IF EXISTS zonage.update_couches_sig_of_troncons(integer[], text[]);
+
+-- Returns the number of evenements created
+CREATE OR REPLACE FUNCTION zonage.update_couches_sig_of_troncons(tids integer[], layers text[],
+                                                                 zid text DEFAULT NULL) RETURNS integer AS $$
+DECLARE
+    skip boolean := ft_skip_topology_update();
+    total integer := 0;
+BEGIN
+    -- Geometry of evenements is set on insert, don't compute it for each evenement_troncon
+    PERFORM set_config('geotrek.skip_topology_update', 'on', true);
+
+    IF 'l_commune' = ANY(layers) THEN
+        total := total + update_couche_sig_of_troncons(tids, 'l_commune', 'insee', 'f_t_commune', 'commune', 'CITYEDGE', zid);
+    END IF;
+    IF 'l_secteur' = ANY(layers) THEN
+        total := total + update_couche_sig_of_troncons(tids, 'l_secteur', 'id', 'f_t_secteur', 'secteur', 'DISTRICTEDGE', zid);
+    END IF;
+    IF 'l_zonage_reglementaire' = ANY(layers) THEN
+        total := total + update_couche_sig_of_troncons(tids, 'l_zonage_reglementaire', 'id', 'f_t_zonage', 'zone', 'RESTRICTEDAREAEDGE', zid);
     END IF;
 
-    -- Add new evenement
-    -- Note: Column names differ between commune, secteur and zonage, we can not use an elegant loop.
+    PERFORM set_config('geotrek.skip_topology_update', CASE WHEN skip THEN 'on' ELSE 'off' END, true);
 
-    -- Commune
-    FOR rec IN EXECUTE 'SELECT id, ST_Line_Locate_Point($1, COALESCE(ST_StartPoint(geom), geom)) as pk_a, ST_Line_Locate_Point($1, COALESCE(ST_EndPoint(geom), geom)) as pk_b FROM (SELECT insee AS id, (ST_Dump(ST_Multi(ST_Intersection(geom, $1)))).geom AS geom FROM l_commune WHERE ST_Intersects(geom, $1)) AS sub' USING NEW.geom
-    LOOP
-        INSERT INTO e_t_evenement (date_insert, date_update, kind, decallage, longueur, geom, supprime) VALUES (now(), now(), 'CITYEDGE', 0, 0, NEW.geom, FALSE) RETURNING id INTO eid;
-        INSERT INTO e_r_evenement_troncon (troncon, evenement, pk_debut, pk_fin) VALUES (NEW.id, eid, least(rec.pk_a, rec.pk_b), greatest(rec.pk_a, rec.pk_b));
-        INSERT INTO f_t_commune (evenement, commune) VALUES (eid, rec.id);
-    END LOOP;
+    -- Evenements along these troncons may cross other communes/secteurs/zonages,
+    -- even if no new one was added
+    PERFORM update_couches_sig_of_evenements(evenements_of_troncons(tids));
 
-    -- Secteur
-    FOR rec IN EXECUTE 'SELECT id, ST_Line_Locate_Point($1,COALESCE(ST_StartPoint(geom), geom)) as pk_a, ST_Line_Locate_Point($1, COALESCE(ST_EndPoint(geom), geom)) as pk_b FROM (SELECT id, (ST_Dump(ST_Multi(ST_Intersection(geom, $1)))).geom AS geom FROM l_secteur WHERE ST_Intersects(geom, $1)) AS sub' USING NEW.geom
-    LOOP
-        INSERT INTO e_t_evenement (date_insert, date_update, kind, decallage, longueur, geom, supprime) VALUES (now(), now(), 'DISTRICTEDGE', 0, 0, NEW.geom, FALSE) RETURNING id INTO eid;
-        INSERT INTO e_r_evenement_troncon (troncon, evenement, pk_debut, pk_fin) VALUES (NEW.id, eid, least(rec.pk_a, rec.pk_b), greatest(rec.pk_a, rec.pk_b));
-        INSERT INTO f_t_secteur (evenement, secteur) VALUES (eid, rec.id);
-    END LOOP;
+    RETURN total;
+END;
+$$ LANGUAGE plpgsql;
 
-    -- Zonage
-    FOR rec IN EXECUTE 'SELECT id, ST_Line_Locate_Point($1, COALESCE(ST_StartPoint(geom), geom)) as pk_a, ST_Line_Locate_Point($1, COALESCE(ST_EndPoint(geom), geom)) as pk_b FROM (SELECT id, (ST_Dump(ST_Multi(ST_Intersection(geom, $1)))).geom AS geom FROM l_zonage_reglementaire WHERE ST_Intersects(geom, $1)) AS sub' USING NEW.geom
-    LOOP
-        INSERT INTO e_t_evenement (date_insert, date_update, kind, decallage, longueur, geom, supprime) VALUES (now(), now(), 'RESTRICTEDAREAEDGE', 0, 0, NEW.geom, FALSE) RETURNING id INTO eid;
-        INSERT INTO e_r_evenement_troncon (troncon, evenement, pk_debut, pk_fin) VALUES (NEW.id, eid, least(rec.pk_a, rec.pk_b), greatest(rec.pk_a, rec.pk_b));
-        INSERT INTO f_t_zonage (evenement, zone) VALUES (eid, rec.id);
-    END LOOP;
 
+-------------------------------------------------------------------------------
+-- Sync when Troncon modified
+-------------------------------------------------------------------------------
+
+DROP TRIGGER IF EXISTS l_t_troncon_couches_sig_iu_tgr ON l_t_troncon;
+
+CREATE OR REPLACE FUNCTION lien_auto_troncon_couches_sig_iu() RETURNS trigger AS $$
+BEGIN
+    PERFORM update_couches_sig_of_troncons(ARRAY[NEW.id], ARRAY['l_commune', 'l_secteur', 'l_zonage_reglementaire']);
     RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
@@ -161,34 +279,28 @@ DROP TRIGGER IF EXISTS zonage_troncons_iu_tgr ON l_zonage_reglementaire;
 
 CREATE OR REPLACE FUNCTION lien_auto_couches_sig_troncon_iu() RETURNS trigger AS $$
 DECLARE
-    table_name varchar := TG_ARGV[0];
-    id_name varchar := TG_ARGV[1];
-    fk_name varchar := TG_ARGV[2];
-    kind_name varchar := TG_ARGV[3];
-    obj record;
-    rec record;
-    eid integer;
+    tids integer[];
+    zid text;
 BEGIN
-    -- Harmonize ID name
-    BEGIN
-        SELECT NEW.insee AS id INTO obj;
-    EXCEPTION
-        WHEN undefined_column THEN
-            SELECT NEW.id AS id INTO obj;
-    END;
-
-    -- Remove obsolete evenement
+    -- Evenements of this commune/secteur/zonage only are computed again, on
+    -- troncons within its previous and new bounding boxes
     IF TG_OP = 'UPDATE' THEN
-        EXECUTE 'DELETE FROM '|| quote_ident(table_name) ||' WHERE '|| quote_ident(fk_name) ||' = $1' USING obj.id;
+        IF ST_OrderingEquals(NEW.geom, OLD.geom) THEN
+            -- e.g. layer imported again
+            RETURN NULL;
+        END IF;
+        tids := ARRAY(SELECT id FROM l_t_troncon WHERE geom && NEW.geom OR geom && OLD.geom);
+    ELSE
+        tids := ARRAY(SELECT id FROM l_t_troncon WHERE geom && NEW.geom);
     END IF;
 
-    -- Add new evenement
-    FOR rec IN EXECUTE 'SELECT id, egeom AS geom, ST_Line_Locate_Point(tgeom, ST_StartPoint(egeom)) AS pk_a, ST_Line_Locate_Point(tgeom, ST_EndPoint(egeom)) AS pk_b FROM (SELECT id, geom AS tgeom, (ST_Dump(ST_Multi(ST_Intersection(geom, $1)))).geom AS egeom FROM l_t_troncon WHERE ST_Intersects(geom, $1)) AS sub' USING NEW.geom
-    LOOP
-        INSERT INTO e_t_evenement (date_insert, date_update, kind, decallage, longueur, geom, supprime) VALUES (now(), now(), kind_name, 0, 0, rec.geom, FALSE) RETURNING id INTO eid;
-        INSERT INTO e_r_evenement_troncon (troncon, evenement, pk_debut, pk_fin) VALUES (rec.id, eid, least(rec.pk_a, rec.pk_b), greatest(rec.pk_a, rec.pk_b));
-        EXECUTE 'INSERT INTO '|| quote_ident(table_name) ||' (evenement, '|| quote_ident(fk_name) ||') VALUES ($1, $2)' USING eid, obj.id;
-    END LOOP;
+    IF TG_TABLE_NAME = 'l_commune' THEN
+        zid := NEW.insee;
+    ELSE
+        zid := NEW.id;
+    END IF;
+
+    PERFORM update_couches_sig_of_troncons(tids, ARRAY[TG_TABLE_NAME::text], zid);
 
     RETURN NULL;
 END;
@@ -196,12 +308,59 @@ $$ LANGUAGE plpgsql;
 
 CREATE TRIGGER commune_troncons_iu_tgr
 AFTER INSERT OR UPDATE OF geom ON l_commune
-FOR EACH ROW EXECUTE PROCEDURE lien_auto_couches_sig_troncon_iu('f_t_commune', 'insee', 'commune', 'CITYEDGE');
+FOR EACH ROW EXECUTE PROCEDURE lien_auto_couches_sig_troncon_iu();
 
 CREATE TRIGGER secteur_troncons_iu_tgr
 AFTER INSERT OR UPDATE OF geom ON l_secteur
-FOR EACH ROW EXECUTE PROCEDURE lien_auto_couches_sig_troncon_iu('f_t_secteur', 'id', 'secteur', 'DISTRICTEDGE');
+FOR EACH ROW EXECUTE PROCEDURE lien_auto_couches_sig_troncon_iu();
 
 CREATE TRIGGER zonage_troncons_iu_tgr
 AFTER INSERT OR UPDATE OF geom ON l_zonage_reglementaire
-FOR EACH ROW EXECUTE PROCEDURE lien_auto_couches_sig_troncon_iu('f_t_zonage', 'id', 'zone', 'RESTRICTEDAREAEDGE');
+FOR EACH ROW EXECUTE PROCEDURE lien_auto_couches_sig_troncon_iu();
+
+
+-------------------------------------------------------------------------------
+-- Sync when Commune/Zonage/Secteur deleted
+-------------------------------------------------------------------------------
+
+DROP TRIGGER IF EXISTS commune_couches_sig_d_tgr ON l_commune;
+DROP TRIGGER IF EXISTS secteur_couches_sig_d_tgr ON l_secteur;
+DROP TRIGGER IF EXISTS zonage_couches_sig_d_tgr ON l_zonage_reglementaire;
+
+CREATE OR REPLACE FUNCTION lien_auto_couches_sig_troncon_d() RETURNS trigger AS $$
+BEGIN
+    -- Evenements are deleted along with their association (see above), and
+    -- their entries in f_r_evenement_couche_sig by cascade
+    IF TG_TABLE_NAME = 'l_commune' THEN
+        DELETE FROM f_t_commune WHERE commune = OLD.insee;
+    ELSIF TG_TABLE_NAME = 'l_secteur' THEN
+        DELETE FROM f_t_secteur WHERE secteur = OLD.id;
+    ELSE
+        DELETE FROM f_t_zonage WHERE zone = OLD.id;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER commune_couches_sig_d_tgr
+AFTER DELETE ON l_commune
+FOR EACH ROW EXECUTE PROCEDURE lien_auto_couches_sig_troncon_d();
+
+CREATE TRIGGER secteur_couches_sig_d_tgr
+AFTER DELETE ON l_secteur
+FOR EACH ROW EXECUTE PROCEDURE lien_auto_couches_sig_troncon_d();
+
+CREATE TRIGGER zonage_couches_sig_d_tgr
+AFTER DELETE ON l_zonage_reglementaire
+FOR EACH ROW EXECUTE PROCEDURE lien_auto_couches_sig_troncon_d();
+
+
+-------------------------------------------------------------------------------
+-- Fill index of evenements when created
+-------------------------------------------------------------------------------
+
+SELECT update_couches_sig_of_evenements(array_agg(id))
+FROM e_t_evenement
+WHERE kind NOT IN ('CITYEDGE', 'DISTRICTEDGE', 'RESTRICTEDAREAEDGE')
+  AND NOT EXISTS (SELECT 1 FROM f_r_evenement_couche_sig);
@@ -0,0 +1,50 @@
+from StringIO import StringIO
+
+from django.conf import settings
+from django.contrib.gis.geos import LineString, Polygon, MultiPolygon
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from geotrek.core.factories import PathFactory, TopologyFactory
+from geotrek.zoning.models import City, CityEdge, RestrictedAreaEdge, TopologyZoning
+from geotrek.zoning.factories import RestrictedAreaFactory
+
+
+class UpdateZoningTest(TestCase):
+    def setUp(self):
+        self.path = PathFactory.create(geom=LineString((0, 0), (4, 0), srid=settings.SRID))
+        self.city = City.objects.create(code='005177', name='Trifouillis-les-oies',
+                                        geom=MultiPolygon(Polygon(((0, -1), (2, -1), (2, 1), (0, 1), (0, -1)),
+                                                                  srid=settings.SRID)))
+        self.area = RestrictedAreaFactory.create(geom=MultiPolygon(
+            Polygon(((2, -1), (4, -1), (4, 1), (2, 1), (2, -1)), srid=settings.SRID)))
+
+    def test_unknown_layer_fails(self):
+        self.assertRaises(CommandError, call_command, 'update_zoning', layers=['country'])
+
+    def test_edges_are_created_again(self):
+        CityEdge.objects.all().delete()
+        RestrictedAreaEdge.objects.all().delete()
+        output = StringIO()
+        call_command('update_zoning', stdout=output)
+        self.assertIn('1/1 paths processed', output.getvalue())
+        self.assertIn('2 edges created', output.getvalue())
+        edge = self.city.cityedge_set.get()
+        self.assertEqual(edge.aggregations.get().path, self.path)
+        self.assertAlmostEqual(edge.aggregations.get().end_position, 0.5)
+        self.assertEqual(self.area.restrictedareaedge_set.count(), 1)
+
+    def test_only_given_layers_are_created_again(self):
+        area_edge = self.area.restrictedareaedge_set.get()
+        call_command('update_zoning', layers=['city'], verbosity=0)
+        self.assertEqual(self.city.cityedge_set.count(), 1)
+        self.assertEqual(self.area.restrictedareaedge_set.get(), area_edge)
+
+    def test_topologies_zones_are_updated(self):
+        topology = TopologyFactory.create(no_path=True)
+        topology.add_path(self.path, start=0.25, end=0.75)
+        TopologyZoning.objects.all().delete()
+        self.assertEqual(topology.cities, [])
+        call_command('update_zoning', verbosity=0)
+        self.assertEqual(topology.cities, [self.city])
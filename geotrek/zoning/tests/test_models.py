@@ -1,11 +1,12 @@
 from django.test import TestCase
 from django.conf import settings
+from django.db import connection
 from django.contrib.gis.geos import LineString, Polygon, MultiPolygon
 
 from geotrek.core.models import Topology
-from geotrek.core.factories import PathFactory
+from geotrek.core.factories import PathFactory, TopologyFactory
 from geotrek.land.tests.test_views import EdgeHelperTest
-from geotrek.zoning.models import City
+from geotrek.zoning.models import City, TopologyZoning
 from geotrek.zoning.factories import (DistrictEdgeFactory, CityEdgeFactory,
                                       RestrictedAreaFactory, RestrictedAreaEdgeFactory)
 
@@ -87,6 +88,28 @@ class LandLayersUpdateTest(TestCase):
         self.assertEquals(p3.aggregations.count(), 1)
         self.assertEquals(p4.aggregations.count(), 2)
 
+    def test_unchanged_geometry_keeps_troncons_link(self):
+        PathFactory.create(geom=LineString((0, 0), (1, 1)))
+        city = City.objects.create(code='005177', name='Trifouillis-les-oies',
+                                   geom=MultiPolygon(Polygon(((0, 0), (2, 0), (2, 2), (0, 2), (0, 0)),
+                                                             srid=settings.SRID)))
+        edge = city.cityedge_set.get()
+        city.name = 'Trifouillis-les-canards'
+        city.save()
+        self.assertEqual(city.cityedge_set.get(), edge)
+
+    def test_new_zone_keeps_troncons_link_of_others(self):
+        PathFactory.create(geom=LineString((0, 0), (4, 0)))
+        city = City.objects.create(code='005177', name='Trifouillis-les-oies',
+                                   geom=MultiPolygon(Polygon(((0, -1), (2, -1), (2, 1), (0, 1), (0, -1)),
+                                                             srid=settings.SRID)))
+        edge = city.cityedge_set.get()
+        other = City.objects.create(code='005179', name='Trifouillis-les-poules',
+                                    geom=MultiPolygon(Polygon(((2, -1), (4, -1), (4, 1), (2, 1), (2, -1)),
+                                                              srid=settings.SRID)))
+        self.assertEqual(city.cityedge_set.get(), edge)
+        self.assertEqual(other.cityedge_set.count(), 1)
+
     def test_couches_sig_link(self):
         # Fake restricted areas
         ra1 = RestrictedAreaFactory.create(geom=MultiPolygon(
@@ -168,3 +191,81 @@ class LandLayersUpdateTest(TestCase):
         self.assertEquals(Topology.objects.filter(pk=t_ra1.pk).count(), 0)
         self.assertEquals(ra2.restrictedareaedge_set.count(), 0)
         self.assertEquals(Topology.objects.filter(pk=t_ra2.pk).count(), 0)
+
+
+class TopologyZoningTest(TestCase):
+
+    def setUp(self):
+        self.path = PathFactory.create(geom=LineString((1, 1), (9, 1)))
+        self.city1 = City.objects.create(code='005177', name='Trifouillis-les-oies',
+                                         geom=MultiPolygon(Polygon(((0, 0), (5, 0), (5, 2), (0, 2), (0, 0)),
+                                                                   srid=settings.SRID)))
+        self.city2 = City.objects.create(code='005179', name='Trifouillis-les-poules',
+                                         geom=MultiPolygon(Polygon(((5, 0), (10, 0), (10, 2), (5, 2), (5, 0)),
+                                                                   srid=settings.SRID)))
+        self.area = RestrictedAreaFactory.create(geom=MultiPolygon(
+            Polygon(((6, 0), (7, 0), (7, 2), (6, 2), (6, 0)), srid=settings.SRID)))
+
+    def test_zones_are_sorted_by_progression(self):
+        topology = TopologyFactory.create(no_path=True)
+        topology.add_path(self.path)
+        self.assertEqual(topology.cities, [self.city1, self.city2])
+        self.assertEqual(topology.areas, [self.area])
+        self.assertEqual(topology.districts, [])
+
+        topology = TopologyFactory.create(no_path=True)
+        topology.add_path(self.path, start=1, end=0)
+        self.assertEqual(topology.cities, [self.city2, self.city1])
+
+    def test_zones_follow_topology_changes(self):
+        topology = TopologyFactory.create(no_path=True)
+        topology.add_path(self.path, start=0, end=0.25)
+        self.assertEqual(topology.cities, [self.city1])
+        other = TopologyFactory.create(no_path=True)
+        other.add_path(self.path, start=0.75, end=1)
+        topology.mutate(other)
+        self.assertEqual(Topology.objects.get(pk=topology.pk).cities, [self.city2])
+
+    def test_zones_follow_layers_changes(self):
+        topology = TopologyFactory.create(no_path=True)
+        topology.add_path(self.path)
+        self.city2.geom = MultiPolygon(Polygon(((20, 0), (30, 0), (30, 2), (20, 2), (20, 0)),
+                                               srid=settings.SRID))
+        self.city2.save()
+        self.assertEqual(topology.cities, [self.city1])
+        self.city1.delete()
+        self.assertEqual(topology.cities, [])
+
+    def test_unchanged_topology_keeps_zones(self):
+        topology = TopologyFactory.create(no_path=True)
+        topology.add_path(self.path)
+        zoning = list(topology.zoning.values_list('pk', flat=True))
+        topology.save()
+        self.assertEqual(list(topology.zoning.values_list('pk', flat=True)), zoning)
+
+    def test_zones_of_deleted_layer_are_removed(self):
+        topology = TopologyFactory.create(no_path=True)
+        topology.add_path(self.path)
+        cursor = connection.cursor()
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        cursor.execute("DELETE FROM l_commune WHERE insee = %s", [self.city1.code])
+        self.assertEqual(topology.cities, [self.city2])
+        self.assertEqual(self.path.aggregations.filter(topo_object__kind='CITYEDGE').count(), 1)
+
+    def test_zones_follow_path_changes(self):
+        topology = TopologyFactory.create(no_path=True)
+        topology.add_path(self.path)
+        self.path.geom = LineString((1, 1), (4, 1))
+        self.path.save()
+        self.assertEqual(topology.cities, [self.city1])
+        self.assertEqual(topology.areas, [])
+
+    def test_zones_can_be_prefetched(self):
+        topology = TopologyFactory.create(no_path=True)
+        topology.add_path(self.path)
+        topologies = Topology.objects.filter(pk=topology.pk).prefetch_related(*TopologyZoning.PREFETCH)
+        topology = list(topologies)[0]
+        with self.assertNumQueries(0):
+            self.assertEqual(topology.cities, [self.city1, self.city2])
+            self.assertEqual(topology.areas, [self.area])
+            self.assertEqual(topology.districts, [])